@@ -11,7 +11,7 @@
 from qgis.core import QgsProject, QgsApplication
 from qgis.core import Qgis, QgsMessageLog
 
-from qgis.PyQt.QtCore import QCoreApplication, Qt, QThreadPool
+from qgis.PyQt.QtCore import QCoreApplication, Qt, QThreadPool, QTimer
 from qgis.PyQt.QtGui import QIcon
 from qgis.PyQt.QtWidgets import QAction
 from qgis.PyQt.QtWidgets import QProgressBar
@@ -45,10 +45,13 @@ from .xyz_qgis.loader import (
     ManualInterrupt,
     InitUploadLayerController,
     LoadLayerController,
+    PartitionedLoadLayerController,
     UploadLayerController,
     EditSyncController,
     TileLayerLoader,
     LiveTileLayerLoader,
+    LoadFeatureController,
+    feature_form_loader,
 )
 
 from .xyz_qgis.layer.edit_buffer import EditBuffer
@@ -62,17 +65,21 @@ from .xyz_qgis.layer.layer_utils import (
 )
 
 from .xyz_qgis.layer import tile_utils, XYZLayer
+from .xyz_qgis.layer import cache_maintenance
 from .xyz_qgis.layer.layer_props import QProps
 
 from .xyz_qgis.network import net_handler
 from .xyz_qgis.network.network import NetManager
+from .xyz_qgis.network.tile_cache import tile_cache
+from .xyz_qgis.network.concurrency import limiters
+from .xyz_qgis.network.shared_network import shared_network
 from .xyz_qgis.network.net_utils import CookieUtils, PlatformSettings
 from .xyz_qgis.iml.loader import (
     IMLTileLayerLoader,
     IMLLiveTileLayerLoader,
     IMLUploadLayerController,
     IMLInitUploadLayerController,
-    IMLLayerLoader,
+    IMLPartitionedLayerLoader,
     IMLEditSyncController,
 )
 from .xyz_qgis.iml.loader.iml_auth_loader import HomeProjectNotFound, AuthenticationError
@@ -104,6 +111,8 @@ class XYZHubConnector(object):
 
     """base plugin"""
 
+    RELOAD_TILE_DELAY = 300  # ms, tiles are reloaded once the extent stops changing
+
     def __init__(self, iface):
         """init"""
         import sys
@@ -267,6 +276,13 @@ class XYZHubConnector(object):
             self.cb_progress_busy
         )  # , Qt.QueuedConnection
         self.con_man.ld_pool.signal.finished.connect(self.cb_progress_done)
+        # cache maintenance waits for loaders to finish
+        cache_maintenance.scheduler.set_busy_check(lambda: self.con_man.ld_pool.count_active() > 0)
+        tile_cache.load_settings()
+        limiters.load_settings()
+        shared_network.load_settings()
+        limiters.add_listener(self.cb_parallel_window)
+        feature_form_loader.config(self.load_feature_form)
 
         QgsProject.instance().cleared.connect(self.new_session)
         QgsProject.instance().layersWillBeRemoved["QStringList"].connect(
@@ -281,7 +297,12 @@ class XYZHubConnector(object):
 
         canvas = self.iface.mapCanvas()
         self.lastRect = bbox_utils.extent_to_rect(bbox_utils.get_bounding_box(canvas))
-        self.iface.mapCanvas().extentsChanged.connect(self.reload_tile, Qt.QueuedConnection)
+        # extent changes are debounced, e.g. rapid pan and zoom
+        self.reload_tile_timer = QTimer()
+        self.reload_tile_timer.setSingleShot(True)
+        self.reload_tile_timer.setInterval(self.RELOAD_TILE_DELAY)
+        self.reload_tile_timer.timeout.connect(self.reload_tile)
+        self.iface.mapCanvas().extentsChanged.connect(self.schedule_reload_tile)
 
         # handle move, delete xyz layer group
         self.pending_delete_qnodes = dict()
@@ -308,10 +329,18 @@ class XYZHubConnector(object):
         self.edit_buffer.unload_connection()
 
         self.con_man.unload()
+        cache_maintenance.scheduler.cancel_all()
+        cache_maintenance.scheduler.set_busy_check(lambda: False)
+        tile_cache.close()
+        limiters.remove_listener(self.cb_parallel_window)
+        shared_network.log_stats()
+        shared_network.clear()
+        feature_form_loader.clear()
 
         self.iface.currentLayerChanged.disconnect(self.cb_layer_selected)  # UNCOMMENT
 
-        self.iface.mapCanvas().extentsChanged.disconnect(self.reload_tile)
+        self.iface.mapCanvas().extentsChanged.disconnect(self.schedule_reload_tile)
+        self.reload_tile_timer.stop()
 
         disconnect_silent(
             QgsProject.instance().layerTreeRoot().willRemoveChildren, self.cb_qnodes_deleting
@@ -524,6 +553,16 @@ class XYZHubConnector(object):
         self.flag_pb_show = True
         self.cb_progress_refresh()
 
+    def cb_parallel_window(self, host, window):
+        print_qgis("parallel requests", host, window)
+        if not self.hasGuiInitialized:
+            return
+        self.pb.setToolTip(
+            "\n".join(
+                "%s: %s parallel requests" % (h, n) for h, n in limiters.get_windows().items()
+            )
+        )
+
     def cb_progress_done(self):
         self.flag_pb_show = False
         self.cb_progress_refresh()
@@ -700,6 +739,24 @@ class XYZHubConnector(object):
 
         # con.signal.results.connect( self.layer_man.add_args) # IMPORTANT
 
+    def load_feature_form(self, form, vlayer, xyz_id):
+        """load all properties of the feature of an opened form, if the layer is loaded
+        with a property selection"""
+        con_load = self.con_man.get_loader(QProps.get_iid(vlayer))
+        if con_load is None or not con_load.is_auto_selection():
+            return
+        layer = con_load.layer
+        api_type = self.get_api_type_from_conn_info(layer.get_conn_info())
+        con = self.make_loader_from_api_type("feature", api_type)
+        self.con_man.add_on_demand_controller(con, show_progress=False)
+        con.signal.results.connect(
+            lambda *a: feature_form_loader.refresh_form(
+                form, vlayer, xyz_id, layer.get_writer_thread(vlayer)
+            )
+        )
+        con.signal.error.connect(self.cb_handle_error_msg)
+        con.start(layer, vlayer, [xyz_id])
+
     def start_load_tile(self, args):
         # unused
         # rect = (-180,-90,180,90)
@@ -794,6 +851,9 @@ class XYZHubConnector(object):
         else:
             return "unknown"
 
+    def schedule_reload_tile(self):
+        self.reload_tile_timer.start()
+
     def reload_tile(self):
         canvas = self.iface.mapCanvas()
         rect = bbox_utils.extent_to_rect(bbox_utils.get_bounding_box(canvas))
@@ -810,7 +870,8 @@ class XYZHubConnector(object):
         for con in lst_con:
             print_qgis(con.status)
             print_qgis("loading tile", level, rect)
-            con.restart(**kw)
+            # tiles still visible keep loading, the others are canceled
+            con.update_tiles(**kw)
 
     def _get_lst_reloading_con(self):
         """Return list of loader to be reload, that has
@@ -869,10 +930,15 @@ class XYZHubConnector(object):
     def import_project(self):
         self.init_all_layer_loader()
 
-        # # restart static loader once
-        # for con in self.con_man.get_all_static_loader():
-        #     # truncate all feature
-        #     con.restart()
+        # resume static loaders interrupted before the end, e.g. qgis was closed
+        for con in self.con_man.get_all_static_loader():
+            if not con.has_checkpoint():
+                continue
+            try:
+                con.restart()
+            except Exception as e:
+                self.show_err_msgbar(e)
+                self.log_err_traceback(e)
 
     def make_loader_from_api_type(self, key, api_type, **kw_loader):
         network = self.api_network_mapping[api_type]
@@ -883,11 +949,13 @@ class XYZHubConnector(object):
                 "init_upload": InitUploadLayerController,
                 "load": LoadLayerController,  # unused
                 "tile": TileLayerLoader,  # unused
+                "feature": LoadFeatureController,
             },
             API_TYPES.PLATFORM: {
                 "edit": IMLEditSyncController,
                 "upload": IMLUploadLayerController,
                 "init_upload": IMLInitUploadLayerController,
+                "feature": LoadFeatureController,
             },
         }
         C = cls_mapping[api_type][key]
@@ -917,7 +985,7 @@ class XYZHubConnector(object):
                             self.make_cb_success_args("Tiles loaded", dt=2),
                         ),
                         (
-                            LoadLayerController,
+                            PartitionedLoadLayerController,
                             self.con_man.add_static_loader,
                             self.make_cb_success_args("Loading finish", dt=3),
                         ),
@@ -940,7 +1008,7 @@ class XYZHubConnector(object):
                             self.make_cb_success_args("Tiles loaded", dt=2),
                         ),
                         (
-                            IMLLayerLoader,
+                            IMLPartitionedLayerLoader,
                             self.con_man.add_static_loader,
                             self.make_cb_success_args("Loading finish", dt=3),
                         ),
@@ -8,7 +8,10 @@
 #
 ###############################################################################
 
+import time
+
 from qgis.PyQt.QtCore import QThreadPool, QTimer
+from qgis.PyQt.QtNetwork import QNetworkReply, QNetworkRequest
 from qgis.core import QgsProject
 
 from .. import make_exception_obj
@@ -73,27 +76,68 @@ class WorkerFun(AsyncFun):
 
 
 class NetworkFun(AsyncFun):
-    def __init__(self, fun: Callable):
+    """wrapper for network request (QNetworkReply)
+
+    If limiters (HostLimiters) is given, requests in flight are counted and latency and
+    status of replies are reported to the limiter of the host, whose window can be used
+    to adapt the number of requests in flight (see ParallelLoop._adapt_parallel).
+    """
+
+    # aborted by a timer (e.g. get_statistics) or by a transfer timeout
+    TIMEOUT_ERRORS = (
+        QNetworkReply.OperationCanceledError,
+        getattr(QNetworkReply, "TimeoutError", QNetworkReply.OperationCanceledError),
+    )
+
+    def __init__(self, fun: Callable, limiters=None):
         super().__init__(fun)
         self._replies = dict()
+        self._sent = dict()  # reply idx: (limiter, time sent)
+        self._canceled = set()
+        self.limiters = limiters
+        self.limiter = None  # limiter of the host of the last request
 
     def _emit(self, output: QtArgs):
         self.signal.results.emit(output)
         self.signal.finished.emit()
 
+    def set_host(self, host: str):
+        """limiter of the host of next requests, known before the first request"""
+        if self.limiters is not None:
+            self.limiter = self.limiters.get(host)
+
     def _emitter(self, reply_idx: int) -> Callable:
         def _fn():
             if reply_idx not in self._replies:
                 return
             reply = self._replies.pop(reply_idx)
+            self._observe(reply_idx, reply)
             self._emit(output_to_qt_args(reply))
 
         return _fn
 
+    def _observe(self, reply_idx, reply):
+        sent = self._sent.pop(reply_idx, None)
+        if sent is not None:
+            sent[0].release()
+        if reply_idx in self._canceled:
+            self._canceled.discard(reply_idx)
+            return  # canceled, not a timeout
+        if sent is None:
+            return
+        limiter, t_sent = sent
+        status = reply.attribute(QNetworkRequest.HttpStatusCodeAttribute)
+        is_timeout = reply.error() in self.TIMEOUT_ERRORS
+        limiter.on_reply(t_sent, time.monotonic(), status, is_timeout)
+
     def _save_reply(self, reply):
         idx = hash(reply)
         # assert idx not in self._replies
         self._replies[idx] = reply
+        if self.limiters is not None:
+            self.limiter = self.limiters.get(reply.url().host())
+            self.limiter.reserve()
+            self._sent[idx] = (self.limiter, time.monotonic())
         return idx
 
     def reset(self):
@@ -101,6 +145,17 @@ class NetworkFun(AsyncFun):
             k, reply = self._replies.popitem()
             reply.abort()
         self._replies.clear()
+        for limiter, _ in self._sent.values():
+            limiter.release()
+        self._sent.clear()
+        self._canceled.clear()
+
+    def abort(self, fn_filter: Callable):
+        """abort replies in flight, for which fn_filter(reply) is True"""
+        for k, reply in list(self._replies.items()):
+            if fn_filter(reply):
+                self._canceled.add(k)
+                reply.abort()  # finished, then emitted with an error
 
     def call(self, args: QtArgs) -> None:
         a, kw = parse_qt_args(args)
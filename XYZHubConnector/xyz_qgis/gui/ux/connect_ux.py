@@ -112,7 +112,15 @@ class ConnectUX(SpaceUX):
             btn.setToolTip(msg)
         self.lineEdit_max_feat.setToolTip("Maximum limit of features to be loaded")
         self.lineEdit_limit.setToolTip("Number of features loaded per request")
-        self.lineEdit_selection.setToolTip("Load only the selected properties of features")
+        self.lineEdit_selection.setToolTip(
+            "\n".join(
+                [
+                    "Load only the selected properties of features. ",
+                    "*: properties used by style, labels, filter and form of the layer, "
+                    "e.g. *,name",
+                ]
+            )
+        )
         self.btn_filter.setToolTip("Query features by property")
 
     def _get_loading_mode(self) -> str:
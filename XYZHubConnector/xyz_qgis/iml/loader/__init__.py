@@ -12,6 +12,7 @@ from .iml_layer_loader import (
     IMLTileLayerLoader,
     IMLLiveTileLayerLoader,
     IMLLayerLoader,
+    IMLPartitionedLayerLoader,
     IMLUploadLayerController,
     IMLInitUploadLayerController,
     IMLEditSyncController,
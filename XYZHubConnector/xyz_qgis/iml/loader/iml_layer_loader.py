@@ -9,6 +9,7 @@
 ###############################################################################
 
 from .iml_auth_loader import IMLProjectScopedAuthLoader, AuthenticationError
+from .iml_space_loader import IMLStatSpaceController
 from ...layer import queue
 from ...loader.layer_loader import (
     TileLayerLoader,
@@ -18,6 +19,7 @@ from ...loader.layer_loader import (
     UploadLayerController,
     LiveTileLayerLoader,
     LoadLayerController,
+    PartitionedLoadLayerController,
     EditSyncController,
 )
 from ...network.net_handler import NetworkResponse, NetworkError
@@ -91,7 +93,9 @@ class IMLTileLayerLoader(IMLAuthExtension, TileLayerLoader):
     def __init__(self, network, *a, **kw):
         TileLayerLoader.__init__(self, network, *a, **kw)
         IMLAuthExtension.__init__(self, network, *a, **kw)
-        self.params_queue = queue.SimpleRetryQueue(key="tile_id")
+        self.params_queue = queue.ViewportTileQueue(
+            key="tile_id", reload_loaded=self.RELOAD_LOADED_TILES
+        )
         self.network = network
 
     def _start(self, **kw):
@@ -132,6 +136,25 @@ class IMLLayerLoader(IMLAuthExtension, LoadLayerController):
         self.con_auth.start(self.get_conn_info())
 
 
+class IMLPartitionedLayerLoader(IMLLayerLoader, PartitionedLoadLayerController):
+    CLS_STAT_CONTROLLER = IMLStatSpaceController
+
+    def __init__(self, network, *a, **kw):
+        PartitionedLoadLayerController.__init__(self, network, *a, **kw)
+        IMLAuthExtension.__init__(self, network, *a, **kw)
+        self.network = network
+
+    def _retry_with_auth(self, reply):
+        # retried params, partition (bbox) or page (handle)
+        keys = ["limit", "handle", "bbox"]
+        params = dict(zip(keys, NetworkResponse(reply).get_qt_property(keys)))
+        if params["bbox"] is None:
+            params.pop("bbox")
+        self.params_queue.gen_retry_params(**params)
+        # try to reauth, then continue run loop
+        self.con_auth.start(self.get_conn_info())
+
+
 class IMLInitUploadLayerController(InitUploadLayerController):
     CLS_PARAMS_QUEUE = queue.SimpleRetryQueue
 
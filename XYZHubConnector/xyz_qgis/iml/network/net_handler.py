@@ -10,8 +10,10 @@
 
 from qgis.PyQt.QtCore import QByteArray
 from ...controller import make_qt_args
+from ...network import mvt_decoder
 
 from ...network.net_handler import (
+    FEATURE_REPLY_TAGS,
     NetworkHandler,
     NetworkResponse,
     NetworkTimeout,
@@ -59,6 +61,11 @@ class IMLNetworkHandler(NetworkHandler):
             raw = QByteArray()
             txt = ""
             obj = {}
+        elif response.is_streamed() or response.get_reply_tag() in FEATURE_REPLY_TAGS:
+            # body text of large feature response is only built on demand (error log)
+            raw = QByteArray()
+            txt = ""
+            obj = response.get_body_json()
         else:
             raw = response.get_body_qbytearray()
             txt = response.get_body_txt()
@@ -92,7 +99,7 @@ class IMLNetworkHandler(NetworkHandler):
                 or layer.get("layerType") == layerType
             ]
             args = [conn_info, lst_layer_meta]
-        elif reply_tag in ("tile", "bbox", "iterate", "search"):
+        elif reply_tag in FEATURE_REPLY_TAGS:
             print_qgis(txt[:100])
             print_qgis(txt[-10:])
 
@@ -105,9 +112,24 @@ class IMLNetworkHandler(NetworkHandler):
 
             args = [obj]
             if reply_tag == "tile":
-                kw = dict(limit=limit, tile_schema=tile_schema, tile_id=tile_id)
+                # geojson body of mvt request, e.g. server without mvt support
+                tile_format = (
+                    mvt_decoder.TILE_FORMAT_MVT
+                    if response.is_mvt_decoded
+                    else mvt_decoder.TILE_FORMAT_GEOJSON
+                )
+                kw = dict(
+                    limit=limit, tile_schema=tile_schema, tile_id=tile_id, tile_format=tile_format
+                )
             else:
-                kw = dict(handle=handle, limit=limit)
+                kw = dict(
+                    handle=handle,
+                    limit=limit,
+                    body_size=response.get_body_size(),
+                    n_batched=response.n_batched,
+                )
+                if reply_tag == "bbox":
+                    (kw["bbox"],) = response.get_qt_property(["bbox"])
 
         elif reply_tag in ("init_layer",):
             print_qgis(txt[:100])
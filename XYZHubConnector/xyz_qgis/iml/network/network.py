@@ -33,6 +33,7 @@ print_qgis = make_print_qgis("iml.network")
 
 class IMLNetworkManager(NetManager):
     TIMEOUT_COUNT = 10000
+    NETWORK_KEY = "platform"
 
     API_GROUP_INTERACTIVE = "interactive"
     API_GROUP_CONFIG = "config"
@@ -81,6 +82,7 @@ class IMLNetworkManager(NetManager):
         "load_features_search": "/catalogs/{catalog_hrn}/layers/{layer_id}/search",
         "load_features_tile": "/catalogs/{catalog_hrn}/layers/{layer_id}/tile/{tile_schema}/{"
         "tile_id}",
+        "load_features_by_id": "/catalogs/{catalog_hrn}/layers/{layer_id}/features",
         "add_features": "/catalogs/{catalog_hrn}/layers/{layer_id}/features",
         "del_features": "/catalogs/{catalog_hrn}/layers/{layer_id}/features",
         "get_project": "/resources/{catalog_hrn}/projects",
@@ -105,6 +107,7 @@ class IMLNetworkManager(NetManager):
         "load_features_iterate": API_GROUP_INTERACTIVE,
         "load_features_search": API_GROUP_INTERACTIVE,
         "load_features_tile": API_GROUP_INTERACTIVE,
+        "load_features_by_id": API_GROUP_INTERACTIVE,
         "add_features": API_GROUP_INTERACTIVE,
         "del_features": API_GROUP_INTERACTIVE,
         "get_project": API_GROUP_AUTH,
@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+# Copyright (c) 2019 HERE Europe B.V.
+#
+# SPDX-License-Identifier: MIT
+# License-Filename: LICENSE
+#
+###############################################################################
+
+"""Schema maintenance and space reclaim of the GeoPackage cache of xyz layers.
+
+Missing unique id index (and obsolete unique id trigger) are looked up in sqlite_master
+(cheap) and created (dropped) without VACUUM. Free pages are reclaimed only when they
+pass a threshold, in a cancellable QgsTask scheduled when no loader is active.
+"""
+
+import sqlite3
+from typing import Callable, Iterable, List, Tuple
+
+from qgis.PyQt.QtCore import QTimer
+from qgis.core import QgsApplication, QgsTask
+
+from .gpkg_writer import ID_COLUMN, SQL_DROP_TRIGGER_UNIQUE_ID, SQL_INDEX_UNIQUE_ID
+from ..common.signal import make_print_qgis
+
+print_qgis = make_print_qgis("cache_maintenance")
+
+# reclaim free pages when they are both a fraction of the db and a size in bytes
+VACUUM_FREE_RATIO = 0.2
+VACUUM_FREE_BYTES = 32 * 1024 * 1024
+# pages freed per incremental_vacuum step (progress, cancel granularity)
+INCREMENTAL_VACUUM_STEP = 2048
+# sqlite auto_vacuum mode
+AUTO_VACUUM_INCREMENTAL = 2
+# sqlite VM instructions between checks of cancel
+PROGRESS_HANDLER_STEP = 100000
+
+
+def missing_schema(conn, layer_name: str, id_column: str = ID_COLUMN) -> List[str]:
+    """returns sql statements of unique id index missing in db, or of unique id trigger
+    to drop (features are upserted by GpkgBulkWriter)"""
+    kw = dict(layer_name=layer_name, id_column=id_column)
+    names = set(
+        name
+        for (name,) in conn.execute(
+            'SELECT "name" FROM "sqlite_master" WHERE "tbl_name" = ?', (layer_name,)
+        )
+    )
+    lst_sql = list()
+    if layer_name not in names:
+        return lst_sql  # no table
+    if "idx_{layer_name}_{id_column}".format(**kw) not in names:
+        lst_sql.append(SQL_INDEX_UNIQUE_ID.format(**kw))
+    if "trigger_{layer_name}_{id_column}_insert".format(**kw) in names:
+        lst_sql.append(SQL_DROP_TRIGGER_UNIQUE_ID.format(**kw))
+    return lst_sql
+
+
+def ensure_schema(conn, layer_name: str, id_column: str = ID_COLUMN) -> int:
+    """create missing unique id index, drop unique id trigger, no VACUUM
+
+    :return: number of statements applied
+    """
+    lst_sql = missing_schema(conn, layer_name, id_column)
+    if lst_sql:
+        conn.executescript("BEGIN;" + "".join(lst_sql) + "COMMIT;")
+    return len(lst_sql)
+
+
+def freelist_stats(conn) -> Tuple[int, int, int, int]:
+    """returns (free pages, total pages, page size, auto_vacuum mode) of db"""
+    (free_pages,) = conn.execute("PRAGMA freelist_count").fetchone()
+    (page_count,) = conn.execute("PRAGMA page_count").fetchone()
+    (page_size,) = conn.execute("PRAGMA page_size").fetchone()
+    (auto_vacuum,) = conn.execute("PRAGMA auto_vacuum").fetchone()
+    return free_pages, page_count, page_size, auto_vacuum
+
+
+def need_vacuum(
+    free_pages: int,
+    page_count: int,
+    page_size: int,
+    free_ratio: float = VACUUM_FREE_RATIO,
+    free_bytes: int = VACUUM_FREE_BYTES,
+) -> bool:
+    if not page_count:
+        return False
+    return free_pages >= free_ratio * page_count and free_pages * page_size >= free_bytes
+
+
+def set_incremental_vacuum(fname: str):
+    """switch db to incremental auto_vacuum, e.g. for a newly created (small) db.
+    Changing auto_vacuum of an existing db only takes effect after a VACUUM.
+    """
+    conn = sqlite3.connect(fname, timeout=30, isolation_level=None)
+    try:
+        (auto_vacuum,) = conn.execute("PRAGMA auto_vacuum").fetchone()
+        if auto_vacuum != AUTO_VACUUM_INCREMENTAL:
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+
+def reclaim_free_pages(
+    conn,
+    is_canceled: Callable[[], bool] = lambda: False,
+    set_progress: Callable[[float], None] = lambda p: None,
+    step: int = INCREMENTAL_VACUUM_STEP,
+) -> bool:
+    """reclaim free pages of db, incrementally if db is in incremental auto_vacuum,
+    otherwise with a single VACUUM that also switches db to incremental auto_vacuum.
+
+    :param set_progress: callback with progress in [0, 1]
+    :return: False if canceled
+    """
+    free_pages, _, _, auto_vacuum = freelist_stats(conn)
+    if auto_vacuum == AUTO_VACUUM_INCREMENTAL:
+        remaining = free_pages
+        while remaining > 0:
+            if is_canceled():
+                return False
+            # rows must be fetched, each step of the pragma frees one page
+            conn.execute("PRAGMA incremental_vacuum(%d)" % step).fetchall()
+            previous = remaining
+            (remaining,) = conn.execute("PRAGMA freelist_count").fetchone()
+            if remaining >= previous:
+                break  # pages freed by concurrent writes, reclaim later
+            set_progress(max(0, 1 - remaining / free_pages))
+    else:
+        conn.set_progress_handler(lambda: 1 if is_canceled() else 0, PROGRESS_HANDLER_STEP)
+        try:
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")
+        except sqlite3.OperationalError:
+            if is_canceled():
+                return False
+            raise
+        finally:
+            conn.set_progress_handler(None, 0)
+    # shrink wal file
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+    set_progress(1)
+    return True
+
+
+class CacheMaintenanceTask(QgsTask):
+    """Ensure unique id index of layers in a db and reclaim free pages if needed"""
+
+    def __init__(self, fname: str, layer_names: Iterable[str], id_column: str = ID_COLUMN):
+        super().__init__("XYZ Hub cache maintenance: %s" % fname, QgsTask.CanCancel)
+        self.fname = fname
+        self.layer_names = sorted(layer_names)
+        self.id_column = id_column
+        self.exception = None
+
+    def run(self):
+        try:
+            return self._run()
+        except Exception as e:
+            if not self.isCanceled():
+                self.exception = e
+            return False
+
+    def _run(self):
+        conn = sqlite3.connect(self.fname, timeout=30, isolation_level=None)
+        try:
+            n = len(self.layer_names)
+            conn.set_progress_handler(lambda: 1 if self.isCanceled() else 0, PROGRESS_HANDLER_STEP)
+            for i, layer_name in enumerate(self.layer_names):
+                if self.isCanceled():
+                    return False
+                ensure_schema(conn, layer_name, self.id_column)
+                self.setProgress(20 * (i + 1) / n)
+            conn.set_progress_handler(None, 0)
+
+            free_pages, page_count, page_size, _ = freelist_stats(conn)
+            if need_vacuum(free_pages, page_count, page_size):
+                print_qgis("reclaim", free_pages * page_size, "bytes", self.fname)
+                return reclaim_free_pages(
+                    conn, self.isCanceled, lambda p: self.setProgress(20 + 80 * p)
+                )
+            self.setProgress(100)
+            return True
+        finally:
+            conn.close()
+
+    def finished(self, result):
+        if self.exception is not None:
+            print_qgis("maintenance error", self.fname, repr(self.exception))
+        elif not result:
+            print_qgis("maintenance canceled", self.fname)
+
+
+class CacheMaintenanceScheduler(object):
+    """Collect layers to maintain and run CacheMaintenanceTask (one per db) in
+    QgsTaskManager once no loader is active for IDLE_DELAY ms.
+    """
+
+    IDLE_DELAY = 5000
+
+    def __init__(self):
+        self._pending = dict()  # fname: set of layer_name
+        self._tasks = dict()  # fname: task
+        self._timer = None
+        self._is_busy = lambda: False
+
+    def set_busy_check(self, is_busy: Callable[[], bool]):
+        """:param is_busy: returns True while loading, maintenance is postponed"""
+        self._is_busy = is_busy
+
+    def schedule(self, fname: str, layer_name: str):
+        self._pending.setdefault(fname, set()).add(layer_name)
+        if self._timer is None:
+            self._timer = QTimer()
+            self._timer.setSingleShot(True)
+            self._timer.timeout.connect(self._run_pending)
+        self._timer.start(self.IDLE_DELAY)
+
+    def _run_pending(self):
+        if self._is_busy():
+            self._timer.start(self.IDLE_DELAY)
+            return
+        for fname in list(self._pending):
+            if fname in self._tasks:
+                continue  # re-scheduled after the running task
+            layer_names = self._pending.pop(fname)
+            task = CacheMaintenanceTask(fname, layer_names)
+            task.taskCompleted.connect(self._make_cb_done(fname))
+            task.taskTerminated.connect(self._make_cb_done(fname))
+            self._tasks[fname] = task
+            QgsApplication.taskManager().addTask(task)
+
+    def _make_cb_done(self, fname):
+        def _cb():
+            self._tasks.pop(fname, None)
+            if self._pending:
+                self._timer.start(self.IDLE_DELAY)
+
+        return _cb
+
+    def cancel_all(self):
+        if self._timer is not None:
+            self._timer.stop()
+        self._pending = dict()
+        for task in list(self._tasks.values()):
+            task.cancel()
+        self._tasks = dict()
+
+
+scheduler = CacheMaintenanceScheduler()
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+# Copyright (c) 2019 HERE Europe B.V.
+#
+# SPDX-License-Identifier: MIT
+# License-Filename: LICENSE
+#
+###############################################################################
+
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+TABLE_NAME = "xyz_feature_count"
+
+
+class FeatureCounter(object):
+    """Feature count of a vlayer table, maintained by render and clear of features.
+
+    The count is persisted in a table of the same db as the vlayer. It is reconciled
+    with COUNT(*) only when it is unknown, e.g. after the vlayer is edited outside of
+    the render path (invalidate).
+
+    The count is updated in the writer thread (GpkgWriterThread), in the transaction of
+    the written features (conn), and read in the main thread without a write lock on the
+    db, guarded by a lock.
+    """
+
+    def __init__(self, fname: str, layer_name: str):
+        """
+        :param fname: path of gpkg/sqlite db
+        :param layer_name: name of the table corresponds to vlayer in db
+        """
+        self.fname = fname
+        self.layer_name = layer_name
+        self._cnt = None
+        self._n_pending = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._version = 0  # changed when the count is dropped, see get
+
+    def _connect(self):
+        # shared by calls without conn (main thread), closed in the writer thread
+        with self._lock:
+            if self._conn is None:
+                self._conn = sqlite3.connect(self.fname, timeout=10, check_same_thread=False)
+            return self._conn
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    @contextmanager
+    def _transaction(self, conn=None):
+        """yields conn of the caller in a transaction (committed by the caller), else the
+        shared connection in a new transaction, with the lock held.
+        The db is locked before the lock, as in the writer thread, not to deadlock."""
+        if conn is not None:
+            with self._lock:
+                yield conn
+            return
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            with self._lock:
+                yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        else:
+            conn.commit()
+
+    def init(self):
+        sql = """
+        CREATE TABLE IF NOT EXISTS "{table}" (
+            "layer_name" TEXT NOT NULL PRIMARY KEY,
+            "feat_cnt" INTEGER NOT NULL
+        );
+        """.format(
+            table=TABLE_NAME
+        )
+        self._connect().executescript(sql)
+
+    def get(self) -> int:
+        """returns feature count, from memory, else from db, else by COUNT(*).
+        Committed rows are read without a write lock, the count is saved by the next add"""
+        with self._lock:
+            if self._cnt is not None:
+                return self._cnt
+            version = self._version
+        cnt = self._read(self._connect())
+        with self._lock:
+            # not to override the count of a write in progress, or a dropped count
+            if self._cnt is None and self._version == version:
+                self._cnt = cnt
+        return cnt
+
+    def get_pending(self) -> int:
+        """returns number of features submitted to the writer thread, not yet counted"""
+        with self._lock:
+            return self._n_pending
+
+    def add_pending(self, n: int):
+        """update number of features submitted to (n), or done in (-n) the writer thread"""
+        with self._lock:
+            self._n_pending += n
+
+    def add(self, n: int, conn=None):
+        """update count by n added (or -n removed) features, called after the change
+
+        :param conn: connection in the transaction of the change, e.g.
+            GpkgBulkWriter.transaction, the caller commits (else discard)
+        """
+        if not n:
+            return
+        with self._transaction(conn) as conn:
+            if self._cnt is None and not self._is_saved(conn):
+                # COUNT(*) in the transaction includes the change
+                self._save(conn, self._read(conn))
+                return
+            self._save(conn, self._get(conn) + n)
+
+    def reset(self, cnt: int = 0, conn=None):
+        """set count, e.g. table is (re)created or truncated"""
+        with self._transaction(conn) as conn:
+            self._save(conn, cnt)
+
+    def invalidate(self, conn=None):
+        """count is unknown, e.g. features are added/removed outside of render"""
+        with self._transaction(conn) as conn:
+            self._cnt = None
+            self._version += 1
+            conn.execute(
+                'DELETE FROM "{table}" WHERE "layer_name" = ?'.format(table=TABLE_NAME),
+                (self.layer_name,),
+            )
+
+    def discard(self):
+        """drop the count in memory, read again from db, e.g. the transaction of add is
+        rolled back"""
+        with self._lock:
+            self._cnt = None
+            self._version += 1
+
+    def _get(self, conn):
+        if self._cnt is None:
+            self._cnt = self._read(conn)
+        return self._cnt
+
+    def _read(self, conn) -> int:
+        """saved count, else COUNT(*). Rows are fetched all, so that no read lock is kept"""
+        rows = conn.execute(
+            'SELECT "feat_cnt" FROM "{table}" WHERE "layer_name" = ?'.format(table=TABLE_NAME),
+            (self.layer_name,),
+        ).fetchall()
+        if not rows:
+            rows = conn.execute('SELECT COUNT(*) FROM "%s"' % self.layer_name).fetchall()
+        return rows[0][0]
+
+    def _is_saved(self, conn):
+        row = conn.execute(
+            'SELECT 1 FROM "{table}" WHERE "layer_name" = ?'.format(table=TABLE_NAME),
+            (self.layer_name,),
+        ).fetchone()
+        return row is not None
+
+    def _save(self, conn, cnt):
+        conn.execute(
+            'INSERT OR REPLACE INTO "{table}" VALUES (?, ?)'.format(table=TABLE_NAME),
+            (self.layer_name, max(0, cnt)),
+        )
+        self._cnt = cnt
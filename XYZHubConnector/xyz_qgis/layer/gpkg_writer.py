@@ -0,0 +1,319 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+# Copyright (c) 2019 HERE Europe B.V.
+#
+# SPDX-License-Identifier: MIT
+# License-Filename: LICENSE
+#
+###############################################################################
+
+"""Bulk write of features into a table of the GeoPackage cache, bypassing OGR.
+
+Features are upserted by xyz_id (INSERT ... ON CONFLICT DO UPDATE) in a single
+transaction per batch. The rtree triggers of GDAL maintain the spatial index (with the
+ST_* functions registered on the connection). The schema is updated once per connection:
+
+- the unique index on xyz_id is created if missing
+- the unique id trigger of former writes through OGR (SQL_TRIGGER_UNIQUE_ID) is dropped,
+  it deleted the row of an existing xyz_id before the conflict, i.e. no update in place
+- the rtree update trigger of GDAL < 3.6 (INSERT OR REPLACE, which fails in the DO UPDATE
+  branch of an upsert) is replaced by the update triggers of GDAL >= 3.6
+"""
+
+import re
+import sqlite3
+import struct
+from contextlib import contextmanager
+from typing import Iterable, Sequence
+
+ID_COLUMN = "xyz_id"
+
+# sqlite default max number of host parameters (SQLITE_MAX_VARIABLE_NUMBER)
+SQL_MAX_VARIABLE = 999
+
+SQL_TRIGGER_UNIQUE_ID = """
+CREATE TRIGGER IF NOT EXISTS "trigger_{layer_name}_{id_column}_insert"
+BEFORE INSERT ON "{layer_name}" BEGIN DELETE FROM "{layer_name}"
+WHERE "{id_column}" = NEW."{id_column}"; END;
+"""
+
+SQL_DROP_TRIGGER_UNIQUE_ID = """
+DROP TRIGGER IF EXISTS "trigger_{layer_name}_{id_column}_insert";
+"""
+
+SQL_INDEX_UNIQUE_ID = """
+CREATE UNIQUE INDEX IF NOT EXISTS "idx_{layer_name}_{id_column}"
+ON "{layer_name}" ("{id_column}");
+"""
+
+# update trigger of GDAL < 3.6, replaced by update6 and update7 (as GDAL >= 3.6 does)
+_REGEX_RTREE_UPDATE1_LEGACY = re.compile(r"INSERT\s+OR\s+REPLACE", re.IGNORECASE)
+SQL_UPGRADE_RTREE_UPDATE1 = [
+    'DROP TRIGGER "{rtree}_update1"',
+    """CREATE TRIGGER "{rtree}_update6" AFTER UPDATE OF "{geom}" ON "{t}"
+    WHEN OLD."{pk}" = NEW."{pk}" AND
+    (NEW."{geom}" NOTNULL AND NOT ST_IsEmpty(NEW."{geom}")) AND
+    (OLD."{geom}" NOTNULL AND NOT ST_IsEmpty(OLD."{geom}"))
+    BEGIN UPDATE "{rtree}" SET minx = ST_MinX(NEW."{geom}"), maxx = ST_MaxX(NEW."{geom}"),
+    miny = ST_MinY(NEW."{geom}"), maxy = ST_MaxY(NEW."{geom}") WHERE id = NEW."{pk}"; END""",
+    """CREATE TRIGGER "{rtree}_update7" AFTER UPDATE OF "{geom}" ON "{t}"
+    WHEN OLD."{pk}" = NEW."{pk}" AND
+    (NEW."{geom}" NOTNULL AND NOT ST_IsEmpty(NEW."{geom}")) AND
+    (OLD."{geom}" ISNULL OR ST_IsEmpty(OLD."{geom}"))
+    BEGIN INSERT INTO "{rtree}" VALUES (NEW."{pk}", ST_MinX(NEW."{geom}"), ST_MaxX(NEW."{geom}"),
+    ST_MinY(NEW."{geom}"), ST_MaxY(NEW."{geom}")); END""",
+]
+
+# rows inserted by an upsert (not updated), counted in the connection only (TEMP)
+SQL_FUNCTION_COUNT_INSERT = "xyz_count_insert"
+SQL_TEMP_TRIGGER_COUNT_INSERT = """
+CREATE TEMP TRIGGER IF NOT EXISTS "count_{layer_name}_insert"
+AFTER INSERT ON main."{layer_name}" BEGIN SELECT {fun}(); END;
+"""
+
+PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-65536",  # KiB
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA temp_store=MEMORY",
+]
+
+# GeoPackage binary header, http://www.geopackage.org/spec/#gpb_format
+_GPB_HEAD = struct.Struct("<2sBBi")
+_GPB_ENVELOPE_XY = struct.Struct("<4d")
+_GPB_LITTLE_ENDIAN = 0x01
+_GPB_EMPTY = 0x10
+
+
+def make_gpkg_blob(wkb: bytes, srs_id: int, envelope: Sequence[float] = None) -> bytes:
+    """GeoPackage geometry blob of (ISO) wkb
+
+    :param envelope: (minx, maxx, miny, maxy), None for empty geometry
+    """
+    if envelope is None:
+        head = _GPB_HEAD.pack(b"GP", 0, _GPB_LITTLE_ENDIAN | _GPB_EMPTY, srs_id)
+        return head + wkb
+    head = _GPB_HEAD.pack(b"GP", 0, _GPB_LITTLE_ENDIAN | (1 << 1), srs_id)
+    return head + _GPB_ENVELOPE_XY.pack(*envelope) + wkb
+
+
+def _gpb_flags(blob):
+    if not blob or len(blob) < _GPB_HEAD.size or blob[:2] != b"GP":
+        return None
+    return blob[3]
+
+
+def _gpb_envelope(blob):
+    """returns (minx, maxx, miny, maxy) of gpkg blob, None if empty or unknown"""
+    flags = _gpb_flags(blob)
+    if flags is None or flags & _GPB_EMPTY:
+        return None
+    indicator = (flags >> 1) & 0x07
+    endian = "<" if flags & _GPB_LITTLE_ENDIAN else ">"
+    if indicator > 0:
+        return struct.unpack_from(endian + "4d", blob, _GPB_HEAD.size)
+    # no envelope (e.g. point written by GDAL): read coordinates of a wkb point
+    wkb = blob[_GPB_HEAD.size :]
+    wkb_endian = "<" if wkb[0] == 1 else ">"
+    (wkb_type,) = struct.unpack_from(wkb_endian + "I", wkb, 1)
+    if wkb_type % 1000 != 1 and wkb_type & 0xFF != 1:
+        return None
+    x, y = struct.unpack_from(wkb_endian + "2d", wkb, 5)
+    return x, x, y, y
+
+
+def _st_is_empty(blob):
+    flags = _gpb_flags(blob)
+    if flags is None:
+        return None
+    return 1 if flags & _GPB_EMPTY else 0
+
+
+def _make_st_envelope_fun(i):
+    def fun(blob):
+        envelope = _gpb_envelope(blob)
+        return envelope[i] if envelope is not None else None
+
+    return fun
+
+
+# functions used by the rtree triggers of GeoPackage (registered by GDAL/spatialite)
+SQL_FUNCTIONS = [
+    ("ST_IsEmpty", _st_is_empty),
+    ("ST_MinX", _make_st_envelope_fun(0)),
+    ("ST_MaxX", _make_st_envelope_fun(1)),
+    ("ST_MinY", _make_st_envelope_fun(2)),
+    ("ST_MaxY", _make_st_envelope_fun(3)),
+]
+
+
+class GpkgBulkWriter(object):
+    """Bulk upsert of rows into a feature table of a GeoPackage.
+    The connection is kept open, statements are prepared once per set of columns
+    (sqlite3 statement cache). It may be used from another thread than the one
+    that created it (e.g. GpkgWriterThread), as long as calls are serialized.
+    """
+
+    def __init__(self, fname: str, layer_name: str, id_column: str = ID_COLUMN):
+        """
+        :param fname: path of gpkg db
+        :param layer_name: name of the feature table in db
+        """
+        self.fname = fname
+        self.layer_name = layer_name
+        self.id_column = id_column
+        self.conn: sqlite3.Connection = None
+        self.geom_column: str = None
+        self.srs_id: int = 0
+        self.pk_column = "fid"
+        self.rtree: str = None
+        self._map_sql = dict()
+        self._in_transaction = False
+        self._n_inserted = 0
+
+    def connect(self):
+        if self.conn is not None:
+            return self.conn
+        conn = sqlite3.connect(
+            self.fname, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        for name, fun in SQL_FUNCTIONS:
+            conn.create_function(name, 1, fun)
+        conn.create_function(SQL_FUNCTION_COUNT_INSERT, 0, self._count_insert)
+        row = conn.execute(
+            'SELECT "column_name", "srs_id" FROM "gpkg_geometry_columns" WHERE "table_name" = ?',
+            (self.layer_name,),
+        ).fetchone()
+        if row is not None:
+            self.geom_column, self.srs_id = row
+            rtree = "rtree_{}_{}".format(self.layer_name, self.geom_column)
+            if conn.execute('SELECT 1 FROM "sqlite_master" WHERE "name" = ?', (rtree,)).fetchone():
+                self.rtree = rtree
+        for _, name, _, _, _, pk in conn.execute('PRAGMA table_info("%s")' % self.layer_name):
+            if pk:
+                self.pk_column = name
+        self.conn = conn
+        self._update_schema()
+        conn.execute(
+            SQL_TEMP_TRIGGER_COUNT_INSERT.format(
+                layer_name=self.layer_name, fun=SQL_FUNCTION_COUNT_INSERT
+            )
+        )
+        return conn
+
+    def _update_schema(self):
+        """unique index for the upsert, without unique id trigger, rtree update trigger
+        of GDAL >= 3.6, see module doc"""
+        kw = dict(layer_name=self.layer_name, id_column=self.id_column)
+        with self.transaction() as conn:
+            conn.execute(SQL_INDEX_UNIQUE_ID.format(**kw))
+            conn.execute(SQL_DROP_TRIGGER_UNIQUE_ID.format(**kw))
+            if self.rtree is None:
+                return
+            row = conn.execute(
+                'SELECT "sql" FROM "sqlite_master" WHERE "type" = \'trigger\' AND "name" = ?',
+                (self.rtree + "_update1",),
+            ).fetchone()
+            if row is None or not _REGEX_RTREE_UPDATE1_LEGACY.search(row[0]):
+                return
+            for sql in SQL_UPGRADE_RTREE_UPDATE1:
+                conn.execute(
+                    sql.format(
+                        rtree=self.rtree,
+                        geom=self.geom_column,
+                        t=self.layer_name,
+                        pk=self.pk_column,
+                    )
+                )
+
+    def _count_insert(self):
+        self._n_inserted += 1
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+        self.conn = None
+        self._map_sql = dict()
+
+    def make_blob(self, wkb: bytes, envelope: Sequence[float] = None) -> bytes:
+        return make_gpkg_blob(wkb, self.srs_id, envelope)
+
+    def _make_sql(self, columns: Sequence[str]) -> str:
+        key = tuple(columns)
+        sql = self._map_sql.get(key)
+        if sql is None:
+            if self.geom_column is not None:
+                columns = [self.geom_column] + list(columns)
+            sql = (
+                'INSERT INTO "{layer_name}" ({columns}) VALUES ({params}) '
+                'ON CONFLICT("{id_column}") DO UPDATE SET {updates}'
+            ).format(
+                layer_name=self.layer_name,
+                id_column=self.id_column,
+                columns=",".join('"%s"' % c for c in columns),
+                params=",".join("?" * len(columns)),
+                updates=",".join('"{0}"=excluded."{0}"'.format(c) for c in columns),
+            )
+            self._map_sql[key] = sql
+        return sql
+
+    @contextmanager
+    def transaction(self):
+        """yields the connection in a write transaction, committed at the end (rolled back
+        on error). Writes of nested upsert/delete, or other tables of the db (e.g.
+        TileOwnershipIndex), are committed together"""
+        conn = self.connect()
+        if self._in_transaction:
+            yield conn
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        self._in_transaction = True
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+        finally:
+            self._in_transaction = False
+
+    def upsert(self, columns: Sequence[str], rows: Iterable[Sequence]) -> int:
+        """insert or update rows by id_column in a single transaction
+
+        :param columns: attribute columns, must contain id_column
+        :param rows: (geometry blob, *values of columns), geometry blob is omitted
+            if the table has no geometry
+        :return: number of rows inserted, i.e. rows of new id_column values
+        """
+        self.connect()
+        sql = self._make_sql(columns)
+        with self.transaction() as conn:
+            self._n_inserted = 0  # counted by the temp trigger
+            conn.executemany(sql, rows)
+            cnt = self._n_inserted
+        return cnt
+
+    def delete(self, lst_id: Sequence[str]) -> int:
+        """delete rows by id_column in a single transaction
+
+        :return: number of rows deleted
+        """
+        lst_id = list(lst_id)
+        cnt = 0
+        with self.transaction() as conn:
+            for i in range(0, len(lst_id), SQL_MAX_VARIABLE):
+                chunk = lst_id[i : i + SQL_MAX_VARIABLE]
+                cnt += conn.execute(
+                    'DELETE FROM "{layer_name}" WHERE "{id_column}" IN ({params})'.format(
+                        layer_name=self.layer_name,
+                        id_column=self.id_column,
+                        params=",".join("?" * len(chunk)),
+                    ),
+                    chunk,
+                ).rowcount
+        return cnt
@@ -30,8 +30,13 @@ from qgis.PyQt.QtXml import QDomDocument
 
 from . import parser
 from .layer_props import QProps
+from .tile_index import TileOwnershipIndex
+from .feat_counter import FeatureCounter
+from .load_checkpoint import LoadCheckpoint
+from .gpkg_writer import GpkgBulkWriter
+from .writer_thread import GpkgWriterThread, ogr_busy_timeout
+from . import cache_maintenance
 from .layer_utils import (
-    get_feat_cnt_from_src,
     get_customProperty_str,
     load_json_default,
     is_xyz_supported_layer,
@@ -82,6 +87,13 @@ class XYZLayer(object):
 
         self.map_vlayer = dict()
         self.map_fields = dict()
+        self.map_fields_cache = dict()
+        self.map_fields_remap = dict()
+        self.map_tile_index = dict()
+        self.map_bulk_writer = dict()
+        self.map_feat_counter = dict()
+        self.map_writer_thread = dict()
+        self.load_checkpoint: LoadCheckpoint = None
         self.qgroups = dict()
         self.callbacks = dict()
 
@@ -268,11 +280,23 @@ class XYZLayer(object):
             signal.connect(self.callbacks[name])
         # vlayer.editingStopped.connect(self.callbacks["end_editing"])
 
+        # fields used by the vlayer might change, see layer_usage
+        if "usage_changed" in self.callbacks:
+            for signal in self._usage_signals(vlayer):
+                signal.connect(self.callbacks["usage_changed"])
+
         cb_style_loaded = self.callbacks.setdefault("style_loaded", dict()).setdefault(
             vlayer.id(), self._make_cb_args(self._refresh_meta_vlayer, vlayer)
         )
         vlayer.styleLoaded.connect(cb_style_loaded)
 
+        # features edited outside of render, feature count is reconciled on next get
+        cb_edit_committed = self.callbacks.setdefault("edit_committed", dict()).setdefault(
+            vlayer.id(), self._make_cb_args(self._cb_edit_committed, vlayer)
+        )
+        vlayer.committedFeaturesAdded.connect(cb_edit_committed)
+        vlayer.committedFeaturesRemoved.connect(cb_edit_committed)
+
     def _disconnect_cb_vlayer(self, vlayer):
         cb_delete_vlayer = self.callbacks.pop(vlayer.id(), None)
         if cb_delete_vlayer:
@@ -286,10 +310,25 @@ class XYZLayer(object):
             signal.disconnect(self.callbacks[name])
         # vlayer.editingStopped.disconnect(self.callbacks["end_editing"])
 
+        if "usage_changed" in self.callbacks:
+            for signal in self._usage_signals(vlayer):
+                signal.disconnect(self.callbacks["usage_changed"])
+
         cb_style_loaded = self.callbacks.get("style_loaded", dict()).pop(vlayer.id(), None)
         if cb_style_loaded:
             vlayer.styleLoaded.disconnect(cb_style_loaded)
 
+        cb_edit_committed = self.callbacks.get("edit_committed", dict()).pop(vlayer.id(), None)
+        if cb_edit_committed:
+            vlayer.committedFeaturesAdded.disconnect(cb_edit_committed)
+            vlayer.committedFeaturesRemoved.disconnect(cb_edit_committed)
+
+    def _usage_signals(self, vlayer):
+        return [vlayer.rendererChanged, vlayer.styleChanged, vlayer.subsetStringChanged]
+
+    def _cb_edit_committed(self, vlayer, *a):
+        self.get_feat_counter(vlayer).invalidate()
+
     def iter_layer(self):
         for lst in self.map_vlayer.values():
             for vlayer in lst:
@@ -413,13 +452,119 @@ class XYZLayer(object):
         """returns reference to existing mutable map_fields"""
         return self.map_fields
 
+    def get_map_fields_cache(self):
+        """returns reference to fields selection cache (parser.FieldsCache) of map_fields"""
+        return self.map_fields_cache
+
+    def get_fields_remap_cache(self, vlayer) -> parser.FieldsRemapCache:
+        """returns cache of attribute remapping to provider fields of vlayer"""
+        return self.map_fields_remap.setdefault(vlayer.id(), parser.FieldsRemapCache())
+
+    def get_tile_index(self, vlayer) -> TileOwnershipIndex:
+        """returns index of features owned by each tile of vlayer, stored in the db of vlayer"""
+        tile_index = self.map_tile_index.get(vlayer.id())
+        if tile_index is None:
+            geom_str, idx = self.geom_str_idx_from_vlayer(vlayer)
+            tile_index = TileOwnershipIndex(
+                self._base_uri_from_vlayer(vlayer), self._db_layer_name(geom_str, idx)
+            )
+            tile_index.init()
+            self.map_tile_index[vlayer.id()] = tile_index
+        return tile_index
+
+    def get_bulk_writer(self, vlayer) -> GpkgBulkWriter:
+        """returns bulk writer of the GeoPackage table of vlayer, None if not a GeoPackage"""
+        if self.ext != "gpkg":
+            return None
+        writer = self.map_bulk_writer.get(vlayer.id())
+        if writer is None:
+            geom_str, idx = self.geom_str_idx_from_vlayer(vlayer)
+            writer = GpkgBulkWriter(
+                self._base_uri_from_vlayer(vlayer),
+                self._db_layer_name(geom_str, idx),
+                id_column=parser.QGS_XYZ_ID,
+            )
+            self.map_bulk_writer[vlayer.id()] = writer
+        return writer
+
+    def get_feat_counter(self, vlayer) -> FeatureCounter:
+        """returns feature count of vlayer maintained by render, stored in the db of vlayer"""
+        feat_counter = self.map_feat_counter.get(vlayer.id())
+        if feat_counter is None:
+            geom_str, idx = self.geom_str_idx_from_vlayer(vlayer)
+            feat_counter = FeatureCounter(
+                self._base_uri_from_vlayer(vlayer), self._db_layer_name(geom_str, idx)
+            )
+            feat_counter.init()
+            self.map_feat_counter[vlayer.id()] = feat_counter
+        return feat_counter
+
+    def get_writer_thread(self, vlayer) -> GpkgWriterThread:
+        """returns writer thread of the GeoPackage of vlayer (shared by vlayers in the same
+        db), None if not a GeoPackage"""
+        if self.ext != "gpkg":
+            return None
+        fname = self._base_uri_from_vlayer(vlayer)
+        writer_thread = self.map_writer_thread.get(fname)
+        if writer_thread is None:
+            writer_thread = GpkgWriterThread(fname)
+            self.map_writer_thread[fname] = writer_thread
+        return writer_thread
+
+    def get_load_checkpoint(self) -> LoadCheckpoint:
+        """returns checkpoint of static loading stored in the db of the layer, None if not
+        a GeoPackage"""
+        if self.ext != "gpkg":
+            return None
+        if self.load_checkpoint is None:
+            fname = make_fixed_full_path(self._layer_fname(), ext=self.ext)
+            self.load_checkpoint = LoadCheckpoint(fname)
+        return self.load_checkpoint
+
+    def get_db_layer_names(self) -> List[str]:
+        return [self._db_layer_name(*self.geom_str_idx_from_vlayer(v)) for v in self.iter_layer()]
+
+    def update_checkpoint(self, checkpoint: dict = None):
+        """keep checkpoint of static loading in loader params (saved in project),
+        None to remove it"""
+        if checkpoint is None:
+            self.loader_params.pop("checkpoint", None)
+        else:
+            self.loader_params["checkpoint"] = checkpoint
+        qnode = self.qgroups.get("main")
+        if qnode:
+            self._save_params_to_node(qnode)
+
+    def barrier(self, callback):
+        """call callback() in the main thread once the writes submitted to all writer
+        threads are committed, see GpkgWriterThread.barrier"""
+        lst_writer_thread = list(self.map_writer_thread.values())
+        n_pending = [len(lst_writer_thread)]
+
+        def _committed():
+            n_pending[0] -= 1
+            if n_pending[0] == 0:
+                callback()
+
+        if not lst_writer_thread:
+            callback()
+        for writer_thread in lst_writer_thread:
+            writer_thread.barrier(_committed)
+
     def get_conn_info(self):
         return self.conn_info
 
-    def get_feat_cnt(self):
+    def get_feat_cnt(self, pending=False):
+        """returns feature count of vlayers
+
+        :param pending: include features submitted to the writer threads, not yet written
+        """
         cnt = 0
         for vlayer in self.iter_layer():
-            cnt += get_feat_cnt_from_src(vlayer)
+            feat_counter = self.get_feat_counter(vlayer)
+            cnt += feat_counter.get()
+            if pending:
+                cnt += feat_counter.get_pending()
         return cnt
 
     def update_loader_params(self, **loader_params):
@@ -551,6 +696,18 @@ class XYZLayer(object):
 
     def _remove_layer(self, geom_str, idx):
         """Remove vlayer from the internal map without messing the index"""
+        vlayer = self.map_vlayer[geom_str][idx]
+        if vlayer is not None:
+            self.map_fields_remap.pop(vlayer.id(), None)
+            self.map_tile_index.pop(vlayer.id(), None)
+            feat_counter = self.map_feat_counter.pop(vlayer.id(), None)
+            writer = self.map_bulk_writer.pop(vlayer.id(), None)
+            writer_thread = self.map_writer_thread.get(self._base_uri_from_vlayer(vlayer))
+            for obj in [writer, feat_counter]:
+                if obj is not None and writer_thread is not None:
+                    writer_thread.submit(obj.close)  # after pending writes
+                elif obj is not None:
+                    obj.close()
         self.map_vlayer[geom_str][idx] = None
         self.map_fields[geom_str][idx] = parser.new_fields_gpkg()
 
@@ -601,19 +758,36 @@ class XYZLayer(object):
         if err[0] == QgsVectorFileWriter.ErrCreateDataSource:
             options.actionOnExistingFile = QgsVectorFileWriter.CreateOrOverwriteFile
             err = self._write_vector_file(vlayer, fname, options)
+            if err[0] == QgsVectorFileWriter.NoError:
+                # new db, free pages can be reclaimed later without full VACUUM
+                cache_maintenance.set_incremental_vacuum(fname)
 
         if err[0] != QgsVectorFileWriter.NoError:
             raise Exception("%s: %s" % err)
 
         self._update_constraint_trigger(fname, db_layer_name)
+        # layer table is (re)created, ownership of tiles is obsolete
+        tile_index = TileOwnershipIndex(fname, db_layer_name)
+        tile_index.init()
+        tile_index.reset()
+        feat_counter = FeatureCounter(fname, db_layer_name)
+        feat_counter.init()
+        feat_counter.reset(0)
+        feat_counter.close()
 
         uri = "%s|layername=%s" % (fname, db_layer_name)
-        vlayer = QgsVectorLayer(uri, layer_name, "ogr")
+        with ogr_busy_timeout():
+            vlayer = QgsVectorLayer(uri, layer_name, "ogr")
         self._save_meta_vlayer(vlayer)
 
         return vlayer
 
     def _write_vector_file(self, vlayer, fname, options):
+        # db may be written by a writer thread, wait for its running transaction only
+        with ogr_busy_timeout():
+            return self._write_vector_file_ogr(vlayer, fname, options)
+
+    def _write_vector_file_ogr(self, vlayer, fname, options):
         if hasattr(QgsVectorFileWriter, "writeAsVectorFormatV3"):
             err = QgsVectorFileWriter.writeAsVectorFormatV3(
                 vlayer, fname, vlayer.transformContext(), options
@@ -627,26 +801,14 @@ class XYZLayer(object):
         return err
 
     def update_constraint_trigger(self, geom_str, idx):
+        """schedule maintenance of the db table of vlayer, see cache_maintenance"""
         fname = make_fixed_full_path(self._layer_fname(), ext=self.ext)
         db_layer_name = self._db_layer_name(geom_str, idx)
-        self._update_constraint_trigger(fname, db_layer_name)
+        cache_maintenance.scheduler.schedule(fname, db_layer_name)
 
     def _update_constraint_trigger(self, fname, layer_name):
-        sql_trigger = """
-        CREATE TRIGGER IF NOT EXISTS "trigger_{layer_name}_{id_column}_insert"
-        BEFORE INSERT ON "{layer_name}" BEGIN DELETE FROM "{layer_name}"
-        WHERE "{id_column}" = NEW."{id_column}"; END;
-
-        CREATE UNIQUE INDEX IF NOT EXISTS "idx_{layer_name}_{id_column}"
-        ON "{layer_name}" ("{id_column}");
-        VACUUM;
-        """.format(
-            layer_name=layer_name, id_column=parser.QGS_XYZ_ID
-        )
         conn = sqlite3.connect(fname)
-        cur = conn.cursor()
-        cur.executescript(sql_trigger)
-        conn.commit()
+        cache_maintenance.ensure_schema(conn, layer_name, parser.QGS_XYZ_ID)
         conn.close()
 
     def update_z_geom(self, geom_str, idx, vlayer):
@@ -663,7 +825,8 @@ class XYZLayer(object):
         conn.commit()
         conn.close()
         # set to the same data source to apply changes
-        vlayer.setDataSource(vlayer.source(), vlayer.sourceName(), "ogr")
+        with ogr_busy_timeout():
+            vlayer.setDataSource(vlayer.source(), vlayer.sourceName(), "ogr")
 
 
 """ Available vector format for QgsVectorFileWriter
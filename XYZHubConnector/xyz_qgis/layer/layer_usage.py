@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+# Copyright (c) 2019 HERE Europe B.V.
+#
+# SPDX-License-Identifier: MIT
+# License-Filename: LICENSE
+#
+###############################################################################
+
+"""Properties needed by the vlayers of a xyz layer (selection "*").
+
+Only the properties used by the style, labels, filter (subset string) and
+attribute-form configuration of the vlayers are loaded, plus an optional allow-list,
+e.g. selection "*,name,height".
+"""
+
+import re
+from typing import Iterable, List, Set
+
+from qgis.core import (
+    QgsAttributeEditorContainer,
+    QgsAttributeEditorField,
+    QgsEditFormConfig,
+    QgsExpression,
+    QgsRenderContext,
+)
+
+from . import parser
+
+AUTO_SELECTION = "*"
+# xyz namespace (tags, timestamps) is always loaded
+ALWAYS_SELECTED = tuple(parser.XYZ_SPECIAL_KEYS)
+
+_REGEX_SQL_STRING = re.compile(r"'(?:[^']|'')*'")
+# quoted name, or unquoted word that is not a number or a function
+_REGEX_SQL_NAME = re.compile(r'"([^"]+)"|(?<![\w.])([A-Za-z_]\w*)(?!\w)(?!\s*\()')
+_SQL_KEYWORDS = frozenset(
+    """and or not in is null like ilike glob regexp match between escape true false
+    case when then else end cast as collate distinct exists
+    integer int real numeric text date datetime""".split()
+)
+
+
+def parse_selection(selection: str) -> (bool, List[str]):
+    """returns whether selection is automatic ("*") and the listed properties"""
+    lst = [p.strip() for p in (selection or "").split(",")]
+    is_auto = AUTO_SELECTION in lst
+    return is_auto, [p for p in lst if p and p != AUTO_SELECTION]
+
+
+def is_auto_selection(selection: str) -> bool:
+    return parse_selection(selection)[0]
+
+
+def fields_to_properties(names: Iterable[str]) -> Set[str]:
+    """xyz property names of qgis field names, see parser.rename_special_props"""
+    return set(
+        parser.normal_field_name(name)
+        for name in names
+        if name and name.lower() not in parser.QGS_SPECIAL_KEYS
+    )
+
+
+def _expression_fields(expression: str) -> Set[str]:
+    if not expression:
+        return set()
+    return set(QgsExpression(expression).referencedColumns())
+
+
+def _renderer_fields(vlayer, context) -> Set[str]:
+    renderer = vlayer.renderer()
+    if renderer is None:
+        return set()
+    return set(renderer.usedAttributes(context))
+
+
+def _label_fields(vlayer, context) -> Set[str]:
+    labeling = vlayer.labeling()
+    if labeling is None or not vlayer.labelsEnabled():
+        return set()
+    names = set()
+    for provider_id in labeling.subProviders():
+        settings = labeling.settings(provider_id)
+        if settings is None:
+            continue
+        if settings.isExpression:
+            names.update(_expression_fields(settings.fieldName))
+        elif settings.fieldName:
+            names.add(settings.fieldName)
+        names.update(
+            settings.dataDefinedProperties().referencedFields(context.expressionContext())
+        )
+    return names
+
+
+def _subset_fields(vlayer) -> Set[str]:
+    """fields of the provider filter (sql): quoted names and unquoted words other than
+    sql keywords, including properties that are not loaded yet"""
+    subset = vlayer.subsetString()
+    if not subset:
+        return set()
+    names = set()
+    for quoted, word in _REGEX_SQL_NAME.findall(_REGEX_SQL_STRING.sub("''", subset)):
+        if quoted:
+            names.add(quoted)
+        elif word.lower() not in _SQL_KEYWORDS:
+            names.add(word)
+    return names
+
+
+def _form_fields(vlayer) -> Set[str]:
+    """fields of the display expression and of a designed (drag and drop) form.
+    The generated form shows all fields, the other properties are loaded when the form
+    of a feature is opened, see FeatureFormLoader"""
+    names = _expression_fields(vlayer.displayExpression())
+    config = vlayer.editFormConfig()
+    if config.layout() != QgsEditFormConfig.TabLayout:
+        return names
+    lst = [config.invisibleRootContainer()]
+    while lst:
+        element = lst.pop()
+        if isinstance(element, QgsAttributeEditorField):
+            names.add(element.name())
+        elif isinstance(element, QgsAttributeEditorContainer):
+            lst.extend(element.children())
+    return names
+
+
+def used_fields(vlayer) -> Set[str]:
+    """names of the fields used by style, labels, filter and form of vlayer"""
+    context = QgsRenderContext()
+    return set().union(
+        _renderer_fields(vlayer, context),
+        _label_fields(vlayer, context),
+        _subset_fields(vlayer),
+        _form_fields(vlayer),
+    )
+
+
+def needed_properties(lst_vlayer: Iterable, allow_list: Iterable[str] = tuple()) -> List[str]:
+    """sorted properties needed by the vlayers and allow_list, None if all properties are
+    needed (e.g. expression using all attributes)"""
+    names = set()
+    for vlayer in lst_vlayer:
+        names.update(used_fields(vlayer))
+    if QgsExpression.ALL_ATTRIBUTES in names:
+        return None
+    return sorted(fields_to_properties(names).union(ALWAYS_SELECTED, allow_list))
+
+
+def resolve_selection(selection: str, lst_vlayer: Iterable) -> str:
+    """selection of properties to be loaded, "*" is replaced by the needed properties
+    ("" loads all properties)"""
+    is_auto, allow_list = parse_selection(selection)
+    if not is_auto:
+        return selection
+    props = needed_properties(lst_vlayer, allow_list)
+    return "" if props is None else ",".join(props)
+
+
+def is_selection_covered(selection: str, loaded_selection: str) -> bool:
+    """True if the properties of selection are loaded by loaded_selection ("": all)"""
+    if not loaded_selection:
+        return True
+    if not selection:
+        return False
+    return set(parse_selection(selection)[1]) <= set(parse_selection(loaded_selection)[1])
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+# Copyright (c) 2019 HERE Europe B.V.
+#
+# SPDX-License-Identifier: MIT
+# License-Filename: LICENSE
+#
+###############################################################################
+
+import json
+import os
+import sqlite3
+from typing import Iterable, Sequence, Set
+
+TABLE_NAME = "xyz_load_checkpoint"
+SQL_MAX_VARIABLE = 999
+
+
+def make_checkpoint_key(params: dict) -> str:
+    """key of the query of a load (e.g. tags, filters, selection), a checkpoint is only
+    resumed by a load of the same query"""
+    return json.dumps(params, sort_keys=True, ensure_ascii=False)
+
+
+class LoadCheckpoint(object):
+    """Last committed page of an iterate load: handle of the next page, limit and number
+    of features loaded so far.
+
+    The checkpoint is persisted in a table of the db of the xyz layer. It is saved in the
+    writer thread of the db after the features of the page, so that it never gets ahead
+    of the committed features.
+    """
+
+    def __init__(self, fname: str):
+        """
+        :param fname: path of gpkg/sqlite db
+        """
+        self.fname = fname
+
+    def _connect(self):
+        return sqlite3.connect(self.fname, timeout=10)
+
+    def _exists(self):
+        # db is created with the first vlayer, see XYZLayer._init_ext_layer
+        return os.path.isfile(self.fname)
+
+    def _init(self, conn):
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS "{table}" (
+                "key" TEXT NOT NULL PRIMARY KEY,
+                "handle" TEXT NOT NULL,
+                "lim" INTEGER NOT NULL,
+                "feat_cnt" INTEGER NOT NULL
+            );
+            """.format(
+                table=TABLE_NAME
+            )
+        )
+
+    def get(self, key: str) -> dict:
+        """returns checkpoint of the load of key, None if there is none"""
+        if not self._exists():
+            return None
+        conn = self._connect()
+        try:
+            self._init(conn)
+            row = conn.execute(
+                'SELECT "handle", "lim", "feat_cnt" FROM "{table}" WHERE "key" = ?'.format(
+                    table=TABLE_NAME
+                ),
+                (key,),
+            ).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        handle, limit, feat_cnt = row
+        return dict(key=key, handle=handle, limit=limit, feat_cnt=feat_cnt)
+
+    def is_empty(self) -> bool:
+        if not self._exists():
+            return True
+        conn = self._connect()
+        try:
+            self._init(conn)
+            row = conn.execute('SELECT 1 FROM "{table}" LIMIT 1'.format(table=TABLE_NAME))
+            return row.fetchone() is None
+        finally:
+            conn.close()
+
+    def save(self, checkpoint: dict):
+        """save checkpoint (key, handle, limit, feat_cnt), e.g. in the writer thread"""
+        conn = self._connect()
+        try:
+            with conn:
+                self._init(conn)
+                conn.execute(
+                    'INSERT OR REPLACE INTO "{table}" VALUES (?, ?, ?, ?)'.format(
+                        table=TABLE_NAME
+                    ),
+                    (
+                        checkpoint["key"],
+                        str(checkpoint["handle"]),
+                        checkpoint["limit"],
+                        checkpoint["feat_cnt"],
+                    ),
+                )
+        finally:
+            conn.close()
+
+    def clear(self, key: str):
+        """remove checkpoint of the load of key, e.g. the load is complete"""
+        if not self._exists():
+            return
+        conn = self._connect()
+        try:
+            with conn:
+                self._init(conn)
+                conn.execute(
+                    'DELETE FROM "{table}" WHERE "key" = ?'.format(table=TABLE_NAME), (key,)
+                )
+        finally:
+            conn.close()
+
+    def find_written(
+        self, layer_names: Iterable[str], lst_id: Sequence[str], id_column: str
+    ) -> Set[str]:
+        """returns ids of features already written in the tables of layer_names,
+        e.g. to skip them when a load resumes after the checkpoint"""
+        lst_id = [i for i in lst_id if i is not None]
+        written = set()
+        if not lst_id or not self._exists():
+            return written
+        conn = self._connect()
+        try:
+            for layer_name in layer_names:
+                for i in range(0, len(lst_id), SQL_MAX_VARIABLE):
+                    chunk = lst_id[i : i + SQL_MAX_VARIABLE]
+                    written.update(
+                        row[0]
+                        for row in conn.execute(
+                            'SELECT "{id_column}" FROM "{layer_name}" '
+                            'WHERE "{id_column}" IN ({params})'.format(
+                                layer_name=layer_name,
+                                id_column=id_column,
+                                params=",".join("?" * len(chunk)),
+                            ),
+                            chunk,
+                        )
+                    )
+        finally:
+            conn.close()
+        return written
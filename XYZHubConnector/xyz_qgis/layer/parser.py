@@ -9,7 +9,7 @@
 ###############################################################################
 
 import json
-import math
+from typing import List
 
 from osgeo import ogr
 from qgis.PyQt.QtCore import QVariant
@@ -23,8 +23,11 @@ from qgis.core import (
     QgsFields,
     QgsGeometry,
     QgsJsonUtils,
+    QgsWkbTypes,
+    NULL,
 )
 
+from . import wkb_utils
 from ..common.signal import make_print_qgis, print_error
 
 print_qgis = make_print_qgis("parser")
@@ -54,50 +57,68 @@ def make_lst_removed_ids(removed_ids):
     return [removed_ids[i : i + chunk_size] for i in range(0, len(removed_ids), chunk_size)]
 
 
-def estimate_chunk_size(byt):
-    chunk_size = PAYLOAD_LIMIT // len(byt)  # round down
-    return chunk_size
+class PayloadTooLargeError(Exception):
+    """features larger than the payload limit, impossible to upload"""
 
+    def __init__(self, lst_idx, lst_id, limit):
+        super().__init__(lst_idx, lst_id, limit)
+
+    def __repr__(self):
+        lst_idx, lst_id, limit = self.args
+        return "{classname}(cnt={cnt}, limit={limit}, ids={ids})".format(
+            classname=self.__class__.__name__,
+            cnt=len(lst_idx),
+            limit=limit,
+            ids=[k if k is not None else "#%s" % i for i, k in zip(lst_idx, lst_id)][:10],
+        )
+
+    def __str__(self):
+        return self.__repr__()
+
+
+# FeatureCollection payload as in make_payload (json.dumps default separators)
+_COLLECTION_HEAD = b'{"type": "FeatureCollection", "features": ['
+_COLLECTION_SEP = b", "
+_COLLECTION_TAIL = b"]}"
+
+
+def _iter_payload(lst_byt, limit):
+    """greedily pack serialized features into FeatureCollection payloads of max limit bytes"""
+    size_empty = len(_COLLECTION_HEAD) + len(_COLLECTION_TAIL)
+    chunk, siz = list(), size_empty
+    for byt in lst_byt:
+        n = len(byt) + (len(_COLLECTION_SEP) if chunk else 0)
+        if chunk and siz + n > limit:
+            yield _COLLECTION_HEAD + _COLLECTION_SEP.join(chunk) + _COLLECTION_TAIL
+            chunk, siz = list(), size_empty
+            n = len(byt)
+        chunk.append(byt)
+        siz += n
+    if chunk:
+        yield _COLLECTION_HEAD + _COLLECTION_SEP.join(chunk) + _COLLECTION_TAIL
 
-def estimate_upload_chunk_single(lst):
-    # CAREFUL estimate chunk size using 1 feature not works everytime
-    # each feature has different size !!!
-    b = json.dumps(lst[0]).encode("utf-8")
-    chunk_size = estimate_chunk_size(b)
-    if len(b) > PAYLOAD_LIMIT:
-        print_qgis("impossible to upload. 1 feature is larger than API LIMIT")
-    print_qgis(
-        "Features size: %s. Chunk size: %s. N: %s"
-        % (len(lst), chunk_size, math.ceil(len(lst) / chunk_size))
-    )
-    return chunk_size
 
+def make_lst_feature_collection(features, limit=PAYLOAD_LIMIT) -> List[bytes]:
+    """
+    Make list of FeatureCollection payloads (utf-8 bytes, at most `limit` bytes each)
+    to be uploaded via NetManager.add_features. Each feature is serialized only once.
 
-def make_lst_feature_collection(features):
+    :raises PayloadTooLargeError: if any single feature is larger than limit
+    """
+    features = list(filter(None, features))
     if len(features) == 0:
         return list()
-    chunk_size = estimate_upload_chunk_single(features)
-
-    def _filter(features):
-        return list(filter(None, features))
-
-    def _iter_collection(features):
-        i0, i1 = 0, 0
-        while i1 < len(features):
-            siz = PAYLOAD_LIMIT + 1
-            i1 = i0 + (chunk_size * 2)
-            while siz > PAYLOAD_LIMIT:
-                step = (i1 - i0) // 2
-                i1 = i0 + step
-                obj = feature_collection(features[i0:i1])
-                siz = len(json.dumps(obj).encode("utf-8"))
-            if step == 0:
-                print_qgis("impossible to upload. 1 feature is larger than API LIMIT")
-                return
-            yield obj
-            i0 = i1
-
-    return list(_iter_collection(_filter(features)))
+    lst_byt = [json.dumps(ft, ensure_ascii=False).encode("utf-8") for ft in features]
+
+    size_empty = len(_COLLECTION_HEAD) + len(_COLLECTION_TAIL)
+    lst_idx = [i for i, byt in enumerate(lst_byt) if len(byt) + size_empty > limit]
+    if lst_idx:
+        print_qgis("impossible to upload. %s feature is larger than API LIMIT" % len(lst_idx))
+        raise PayloadTooLargeError(lst_idx, [features[i].get(XYZ_ID) for i in lst_idx], limit)
+
+    lst_payload = list(_iter_payload(lst_byt, limit))
+    print_qgis("Features size: %s. N: %s" % (len(features), len(lst_payload)))
+    return lst_payload
 
 
 def split_feature_collection(collection, size_first=1):
@@ -136,10 +157,16 @@ def make_transformer(crs_src, crs_dst):
     return QgsCoordinateTransform(crs_src, crs_dst, QgsProject.instance())
 
 
+def _fill_null_coordinates(coords):
+    return [
+        0.0 if c is None else _fill_null_coordinates(c) if isinstance(c, list) else c
+        for c in coords
+    ]
+
+
 def make_valid_xyz_json_geom(geom: dict):
-    coord_str = json.dumps(geom["coordinates"])
-    coord = json.loads(coord_str.replace("null", "0.0"))
-    geom["coordinates"] = coord
+    """replace null coordinates by 0.0"""
+    geom["coordinates"] = _fill_null_coordinates(geom["coordinates"])
     return geom
 
 
@@ -151,71 +178,118 @@ def check_non_expression_fields(fields):
     return all(fields.fieldOrigin(i) != fields.OriginExpression for i, f in enumerate(fields))
 
 
-def feature_to_xyz_json(features, is_new=False, ignore_null=True, is_livemap=False):
-    def _xyz_props(props, ignore_keys=tuple()):
-        # convert from qgs case insensitive fields back to json properties
-        # convert from json string to json object
-        new_props = dict()
-        for t in props.keys():
-            if ignore_null and props[t] is None:
-                continue
-            k = normal_field_name(t)
+# attribute of these types is exported as is, other types via QgsJsonUtils.exportAttributes
+EXPORT_SIMPLE_TYPES = (
+    QVariant.Int,
+    QVariant.UInt,
+    QVariant.LongLong,
+    QVariant.ULongLong,
+    QVariant.Double,
+    QVariant.String,
+    QVariant.Bool,
+)
+
+
+class FeatureExportPlan(object):
+    """Plan to export attributes of features with the same fields to xyz json properties.
 
-            if k in ignore_keys:
+    Computed once per fields: attribute index, output property name, whether the value
+    might be a json string (String fields). qgis special fields, expression fields and
+    @ fields are skipped.
+    """
+
+    def __init__(self, fields: QgsFields):
+        self.fields = fields
+        self.idx_xyz_id = fields.indexFromName(QGS_XYZ_ID)
+        expression_field_names = [
+            f.name()
+            for i, f in enumerate(fields)
+            if fields.fieldOrigin(i) == fields.OriginExpression
+        ]
+        self.items = list()  # (idx, field name, output name, might be json string)
+        for idx, f in enumerate(fields):
+            name = f.name()
+            if name in (QGS_ID, QGS_XYZ_ID):
+                continue
+            k = normal_field_name(name)
+            if k in expression_field_names or k.startswith("@"):
                 continue
-            new_props[k] = props[t]
+            is_string = f.type() == QVariant.String or f.type() not in EXPORT_SIMPLE_TYPES
+            self.items.append((idx, name, k, is_string))
+        lst_idx = [idx for idx, _, _, _ in self.items] + [self.idx_xyz_id]
+        self.is_simple = all(
+            fields.at(idx).type() in EXPORT_SIMPLE_TYPES for idx in lst_idx if idx > -1
+        )
 
+    def _values(self, feat: QgsFeature):
+        """returns xyz_id and list of attribute values (None for null) in order of items"""
+        if self.is_simple:
+            attrs = feat.attributes()
+            xyz_id = _py_value(attrs[self.idx_xyz_id]) if self.idx_xyz_id > -1 else None
+            return xyz_id, [_py_value(attrs[idx]) for idx, _, _, _ in self.items]
+        props = json.loads(QgsJsonUtils.exportAttributes(feat))
+        return props.get(QGS_XYZ_ID), [props.get(name) for _, name, _, _ in self.items]
+
+    def export(self, feat: QgsFeature, ignore_null=True):
+        """returns xyz_id and xyz json properties of feature"""
+        xyz_id, values = self._values(feat)
+        props = dict()
+        for (_, _, k, is_string), v in zip(self.items, values):
+            if v is None and ignore_null:
+                continue
+            if isinstance(v, float) and v.is_integer():
+                # as QgsJsonUtils.exportAttributes, integral double is exported as integer
+                v = int(v)
             # always handle json string in props
-            new_props[k] = try_parse_json_string(new_props[k])
-        return new_props
+            props[k] = try_parse_json_string(v) if is_string else v
+        return xyz_id, props
+
+
+def _py_value(v):
+    return None if isinstance(v, QVariant) and v.isNull() else v
 
-    def _livemap_props(props, xyz_id=None):
+
+def feature_to_xyz_json(features, is_new=False, ignore_null=True, is_livemap=False):
+    def _livemap_props(xyz_id=None):
         # handle editing of delta layer
         delta = {"changeState": "CREATED", "reviewState": "UNPUBLISHED", "taskGridId": ""}
         if xyz_id:
             delta.update({"changeState": "UPDATED", "originId": xyz_id})
         return {"@ns:com:here:mom:delta": delta}
 
-    def _clean_props(props):
-        # drop @ fields for upload
-        ignored_special_keys = [k for k in props.keys() if k.startswith("@")]
-        for k in ignored_special_keys:
-            props.pop(k, None)
-        return props
+    def _export_plan(fields):
+        # features of a layer share the same fields, plan is computed once
+        if plans and plans[-1].fields == fields:
+            return plans[-1]
+        plan = next((p for p in plans if p.fields == fields), None)
+        if plan is None:
+            plan = FeatureExportPlan(fields)
+        else:
+            plans.remove(plan)
+        plans.append(plan)
+        return plan
 
     def _single_feature(feat):
         # existing feature json
         if feat is None:
             return None
         obj = {"type": "Feature"}
-        json_str = QgsJsonUtils.exportAttributes(feat)
-        props = json.loads(json_str)
-        props.pop(QGS_ID, None)
-        v = props.pop(QGS_XYZ_ID, None)
+        v, props = _export_plan(feat.fields()).export(feat, ignore_null)
         if v is not None and v != "":
             if v in exist_feat_id:
                 return None
             exist_feat_id.add(v)
             if not is_new:
                 obj[XYZ_ID] = v
-        fields = feat.fields()
-        expression_field_names = [
-            f.name()
-            for i, f in enumerate(fields)
-            if fields.fieldOrigin(i) == fields.OriginExpression
-        ]
-        # print({k.name(): fields.fieldOrigin(i) for i, k in enumerate(fields)})
-        props = _xyz_props(props, ignore_keys=expression_field_names)
-        livemap_props = _livemap_props(props, xyz_id=obj.get(XYZ_ID)) if is_livemap else dict()
-        props = _clean_props(props)
+        livemap_props = _livemap_props(xyz_id=obj.get(XYZ_ID)) if is_livemap else dict()
         obj["properties"] = dict(props, **livemap_props)
 
-        geom = feat.geometry()
-        geom_ = json.loads(geom.asJson())
+        geom_str = feat.geometry().asJson()
+        geom_ = json.loads(geom_str)
         if geom_ is None:
             # print_qgis(obj)
             return obj
-        obj["geometry"] = make_valid_xyz_json_geom(geom_)
+        obj["geometry"] = make_valid_xyz_json_geom(geom_) if "null" in geom_str else geom_
 
         # bbox = geom.boundingBox() # print_qgis("bbox: %s"%bbox.toString()) if bbox.isEmpty():
         # if "coordinates" in geom_: obj["bbox"] = list(geom_["coordinates"]) * 2 else: obj[
@@ -225,6 +299,7 @@ def feature_to_xyz_json(features, is_new=False, ignore_null=True, is_livemap=Fal
 
     assert isinstance(features, (list, tuple))
     exist_feat_id = set()
+    plans = list()
     return [_single_feature(ft) for ft in features]
 
 
@@ -261,6 +336,46 @@ def make_field(k, val):
     return QgsField(k, qtype, f_typeName)
 
 
+# widening order of column types, see infer_value_type
+_COLUMN_TYPE_RANK = {
+    QVariant.Int: 0,
+    QVariant.LongLong: 1,
+    QVariant.Double: 2,
+    QVariant.String: 3,
+}
+_INT32_RANGE = (-(2**31), 2**31 - 1)
+_INT64_RANGE = (-(2**63), 2**63 - 1)
+
+
+def make_field_from_type(k, qtype):
+    return QgsField(k, qtype, valid_fieldTypes.get(qtype, "String"))
+
+
+def infer_value_type(v):
+    """
+    QVariant type of a python attribute value (see _attrs), without QVariant probing.
+    Returns None for value that is not stored (null, boolean as in xyz_json_to_feature)
+    """
+    if v is None or isinstance(v, bool):
+        return None
+    if isinstance(v, int):
+        if _INT32_RANGE[0] <= v <= _INT32_RANGE[1]:
+            return QVariant.Int
+        if _INT64_RANGE[0] <= v <= _INT64_RANGE[1]:
+            return QVariant.LongLong
+        return QVariant.String
+    if isinstance(v, float):
+        return QVariant.Double
+    return QVariant.String
+
+
+def widen_type(qtype1, qtype2):
+    """common column type of 2 value types: Int -> LongLong -> Double -> String"""
+    if qtype1 is None or qtype1 == qtype2:
+        return qtype2
+    return max(qtype1, qtype2, key=lambda t: _COLUMN_TYPE_RANK.get(t, 3))
+
+
 def try_parse_json_string(v):
     if isinstance(v, str) and ("{" in v or "[" in v):
         # print_qgis(json.dumps(dict(v=v), ensure_ascii=False))
@@ -326,6 +441,11 @@ def fields_similarity(ref_names, orig_names, names) -> int:
     same_names = set(ref_names).intersection(names)
     n1, n2 = map(len, [ref_names, names])
     x = len(same_names)
+    return _similarity_score(x, n1, n2)
+
+
+def _similarity_score(x, n1, n2) -> int:
+    """similarity score given count of same names x and count of names n1, n2"""
     # if n1 == 0 or n2 == 0: return 1 # handle empty, variant 1
     if n1 == 0 and n2 == 0:
         return 100  # handle empty, variant 2
@@ -371,9 +491,49 @@ def _attrs(props):
         yield k, o
 
 
-def xyz_json_to_feature(feat_json, fields):
+def make_geometry_ogr(geom: dict) -> QgsGeometry:
+    """Make QgsGeometry from geojson geometry via ogr (slow path, supports all geometries)"""
+    s = json.dumps(geom)
+    return QgsGeometry.fromWkt(ogr.CreateGeometryFromJson(s).ExportToWkt())
+
+
+def make_geometry(geom: dict, wkb: bytes = None) -> QgsGeometry:
+    """Make QgsGeometry from geojson geometry.
+
+    :param geom: geojson geometry
+    :param wkb: optional WKB of geom, precomputed by wkb_utils.geojson_to_wkb_batch
+    """
+    if wkb is None:
+        wkb = wkb_utils.geojson_to_wkb(geom)
+    if wkb is not None:
+        geom_ = QgsGeometry()
+        geom_.fromWkb(wkb)
+        if not geom_.isNull():
+            return geom_
+    return make_geometry_ogr(geom)
+
+
+def dissolve_geometry(geom: dict) -> dict:
+    """Union of the parts of a Multi- geometry, e.g. parts of a feature clipped by tiles
+    (see mvt_decoder.TilePartMerger). Polygons sharing an edge are dissolved, connected
+    lines are merged. The result is kept Multi-.
+    """
+    g = make_geometry(geom)
+    if g.type() == QgsWkbTypes.LineGeometry:
+        union = g.mergeLines()
+    else:
+        union = QgsGeometry.unaryUnion([g])
+    if union.isNull() or union.isEmpty():
+        return geom
+    union.convertToMultiType()
+    return json.loads(union.asJson())
+
+
+def xyz_json_to_feature(feat_json, fields, wkb: bytes = None):
     """
     Convert xyz geojson to feature, given fields
+
+    :param wkb: optional WKB of the feature geometry, see make_geometry
     """
 
     names = set(fields.names())
@@ -415,9 +575,7 @@ def xyz_json_to_feature(feat_json, fields):
 
     geom = feat_json.get("geometry")
     if geom is not None:
-        s = json.dumps(geom)
-        geom_ = QgsGeometry.fromWkt(ogr.CreateGeometryFromJson(s).ExportToWkt())
-        feat.setGeometry(geom_)
+        feat.setGeometry(make_geometry(geom, wkb))
 
     return feat
 
@@ -439,15 +597,15 @@ def check_same_fields(fields1: QgsFields, fields2: QgsFields):
     return len_ok and name_ok and field_origin_ok
 
 
-def update_feature_fields(feat: QgsFeature, fields: QgsFields, ref: QgsFields):
+def make_fields_remap(old_fields: QgsFields, fields: QgsFields, ref: QgsFields):
     """
-    Update fields of feature and its data (QgsAttributes)
+    Make remapping plan of attributes from old fields to new fields
 
-    :param feat: QgsFeature
-    :param fields: new QgsFields
-    :return: new QgsFeature with updated fields
+    :param old_fields: QgsFields of feature
+    :param fields: new QgsFields, super set of old_fields
+    :return: list of index in old_fields for each field in fields (-1 if not in old_fields),
+        None if fields is not a super set of old_fields
     """
-    old_fields = feat.fields()
     names, old_names = fields.names(), old_fields.names()
     try:
         assert set(names).issuperset(set(old_names)), (
@@ -460,37 +618,164 @@ def update_feature_fields(feat: QgsFeature, fields: QgsFields, ref: QgsFields):
         print_error(e)
         return
 
+    remap = [-1] * len(fields)
+    for i, k in enumerate(old_names):
+        remap[fields.lookupField(k)] = i
+    return remap
+
+
+class FieldsRemapCache(object):
+    """Cache of remapping plans (make_fields_remap) from fields of parsed features
+    to the provider fields of a vlayer. Cleared when provider fields is changed.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self._fields = None
+        self._map_remap = dict()  # old_fields.size(): list of (old_fields, remap)
+
+    def sync(self, fields: QgsFields):
+        """clear cache if provider fields is changed"""
+        if self._fields is None or not self._fields == fields:
+            self.clear()
+            self._fields = QgsFields(fields)
+
+    def get_remap(self, old_fields: QgsFields, fields: QgsFields, ref: QgsFields):
+        lst = self._map_remap.setdefault(old_fields.size(), list())
+        for f, remap in lst:
+            if f == old_fields:
+                return remap
+        remap = make_fields_remap(old_fields, fields, ref)
+        if remap is not None:
+            lst.append((QgsFields(old_fields), remap))
+        return remap
+
+
+def update_feature_fields(
+    feat: QgsFeature, fields: QgsFields, ref: QgsFields, remap_cache: FieldsRemapCache = None
+):
+    """
+    Update fields of feature and its data (QgsAttributes)
+
+    :param feat: QgsFeature
+    :param fields: new QgsFields
+    :param remap_cache: FieldsRemapCache of fields, reused across features
+    :return: new QgsFeature with updated fields
+    """
+    old_fields = feat.fields()
+    if remap_cache is not None:
+        remap = remap_cache.get_remap(old_fields, fields, ref)
+    else:
+        remap = make_fields_remap(old_fields, fields, ref)
+    if remap is None:
+        return
+
+    attrs = feat.attributes()
     ft = QgsFeature(fields)
-    for k in old_fields.names():
-        ft.setAttribute(k, feat.attribute(k))
+    ft.setAttributes([attrs[i] if i > -1 else NULL for i in remap])
     ft.setGeometry(feat.geometry())
     return ft
 
 
-def prepare_fields(feat_json, lst_fields, threshold=DEFAULT_SIMILARITY_THRESHOLD):
+class FieldsCache(object):
+    """Cache of fields selection (prepare_fields) of a list of fields (same geometry).
+
+    Selected fields index is cached per signature of properties names,
+    so that features of a repeated schema skip the similarity scoring.
+    Cache misses are scored through an inverted index: field name -> fields index.
+    Cache is cleared whenever the list of fields is changed.
+    """
+
+    def __init__(self):
+        self._names = list()  # snapshot of fields names, to detect changes
+        self.clear()
+
+    def clear(self):
+        self._selected = dict()
+        self._index = None
+        self._n_names = None
+
+    def sync(self, lst_fields):
+        """clear cache if lst_fields is changed outside of the parser, e.g. refresh_map_fields"""
+        names = [tuple(fields.names()) for fields in lst_fields]
+        if names != self._names:
+            self._names = names
+            self.clear()
+
+    def update_fields(self, idx, fields):
+        """notify that fields at idx is updated (fields only grow) or added"""
+        if idx < len(self._names) and len(self._names[idx]) == fields.size():
+            return
+        names = tuple(fields.names())
+        if idx < len(self._names):
+            self._names[idx] = names
+        else:
+            self._names.append(names)
+        self.clear()
+
+    def get(self, key):
+        return self._selected.get(key)
+
+    def put(self, key, idx):
+        self._selected[key] = idx
+
+    def _build_index(self, lst_fields):
+        self._index = dict()
+        self._n_names = list()
+        for idx, fields in enumerate(lst_fields):
+            if fields.size() <= 1:
+                self._n_names.append(-1)  # mark empty fields
+                continue
+            ref_names = filter_props_names([f.name() for f in non_expression_fields(fields)])
+            self._n_names.append(len(ref_names))
+            for name in ref_names:
+                self._index.setdefault(name, list()).append(idx)
+
+    def score(self, lst_fields, props_names):
+        """similarity score of props_names against each fields in lst_fields,
+        equivalent to fields_similarity, -1 for empty fields
+        """
+        if self._index is None:
+            self._build_index(lst_fields)
+        names = set(filter_props_names(props_names))
+        lst_x = [0] * len(self._n_names)
+        for name in names:
+            for idx in self._index.get(name, tuple()):
+                lst_x[idx] += 1
+        n2 = len(names)
+        return [
+            _similarity_score(x, n1, n2) if n1 > -1 else -1 for x, n1 in zip(lst_x, self._n_names)
+        ]
+
+
+def prepare_fields(
+    feat_json, lst_fields, threshold=DEFAULT_SIMILARITY_THRESHOLD, fields_cache: FieldsCache = None
+):
     """
     Decide to merge fields or create new fields based on fields similarity score [0..1].
     Score lower than threshold will result in creating new fields instead of merging fields
+
+    :param fields_cache: FieldsCache of lst_fields, reused across features
     """
     # adapt to existing fields
     props = feat_json.get("properties")
     if not isinstance(props, dict):
-        orig_props_names = list()
-        props_names = list()
-    else:
-        orig_props_names = [k for k, v in props.items() if v is not None]
-        props = rename_special_props(props)  # rename fid in props
-        props_names = [k for k, v in props.items() if v is not None]
-    lst_score = [
-        fields_similarity(
-            [f.name() for f in non_expression_fields(fields)],
-            orig_props_names,
-            props_names,
-        )
-        if fields.size() > 1
-        else -1  # mark empty fields
-        for fields in lst_fields
-    ]
+        props = dict()
+    signature = frozenset(k for k, v in props.items() if v is not None)
+    key = (signature, threshold)
+
+    if fields_cache is None:
+        fields_cache = FieldsCache()
+    idx = fields_cache.get(key)
+    if idx is not None and idx < len(lst_fields):
+        return lst_fields[idx], idx
+
+    props = rename_special_props(props)  # rename fid in props
+    props_names = [k for k, v in props.items() if v is not None]
+    lst_score = fields_cache.score(lst_fields, props_names)
+
     idx, score = max(enumerate(lst_score), key=lambda x: x[1], default=[0, 0])
     idx_min, score_min = min(enumerate(lst_score), key=lambda x: x[1], default=[0, 0])
 
@@ -498,6 +783,8 @@ def prepare_fields(feat_json, lst_fields, threshold=DEFAULT_SIMILARITY_THRESHOLD
         idx = len(lst_fields)
         fields = new_fields_gpkg()
         lst_fields.append(fields)
+        fields_cache.update_fields(idx, fields)
+        return fields, idx
     elif score_min == -1:  # select empty fields
         idx = idx_min
         fields = lst_fields[idx]
@@ -506,11 +793,40 @@ def prepare_fields(feat_json, lst_fields, threshold=DEFAULT_SIMILARITY_THRESHOLD
     # print("len prop", len(props_names), idx, "score", lst_score, "lst_fields", len(lst_fields))
     # print("len fields", [f.size() for f in lst_fields])
 
+    fields_cache.put(key, idx)
     return fields, idx
 
 
+def _retype_fields(fields: QgsFields, column_types: dict) -> QgsFields:
+    """copy of fields, with type of columns in column_types replaced"""
+    out = QgsFields()
+    for i, f in enumerate(fields):
+        name = f.name()
+        if name in column_types:
+            out.append(make_field_from_type(name, column_types[name]))
+        else:
+            out.append(f, fields.fieldOrigin(i), fields.fieldOriginIndex(i))
+    return out
+
+
+def _json_to_attrs(feat_json) -> dict:
+    """attributes of xyz json feature as python values, None and unsupported values excluded"""
+    attrs = {QGS_XYZ_ID: feat_json.get(XYZ_ID, "")}
+    props = feat_json.get("properties")
+    if isinstance(props, dict):
+        props = rename_special_props(props)  # rename fid in props
+        for k, v in _attrs(props):
+            if infer_value_type(v) is not None:
+                attrs[k] = v
+    return attrs
+
+
 def xyz_json_to_feature_map(
-    obj, map_fields=None, similarity_threshold=DEFAULT_SIMILARITY_THRESHOLD
+    obj,
+    map_fields=None,
+    similarity_threshold=DEFAULT_SIMILARITY_THRESHOLD,
+    map_fields_cache=None,
+    batch=True,
 ):
     """
     xyz json to feature, organize in to map of geometry,
@@ -521,9 +837,26 @@ def xyz_json_to_feature_map(
         :param similarity_threshold: percentage threshold of fields similarity from [0-100]
             0: map_fields should have 1 fields/geom
             100: map_fields should have as many as possible fields/geom
+        :param map_fields_cache: dict[geom] = FieldsCache, fields selection cache of map_fields
+        :param batch: infer type of new columns from all features of obj (widening
+            Integer -> Integer64 -> Double -> String), instead of the first value seen
+            by xyz_json_to_feature. Existing fields keep their type.
     """
 
-    def _single_feature_map(feat_json, map_feat_, map_fields_):
+    def _fields_cache(g, lst_fields):
+        cache = map_fields_cache.setdefault(g, FieldsCache())
+        if g not in synced:
+            cache.sync(lst_fields)
+            synced.add(g)
+        return cache
+
+    def _append_feat(map_feat_, g, idx, n_fields, feat):
+        lst_feat = map_feat_.setdefault(g, list())
+        while len(lst_feat) < n_fields:
+            lst_feat.append(list())
+        lst_feat[idx].append(feat)
+
+    def _single_feature_map(feat_json, wkb, map_feat_, map_fields_):
         geom = feat_json.get("geometry")
         g = geom["type"] if geom is not None else None
 
@@ -531,24 +864,84 @@ def xyz_json_to_feature_map(
         # if g is not None and not g.startswith("Multi"): g = "Multi" + g
 
         lst_fields = map_fields_.setdefault(g, list())
-        fields, idx = prepare_fields(feat_json, lst_fields, similarity_threshold)
+        fields_cache = _fields_cache(g, lst_fields)
+        fields, idx = prepare_fields(feat_json, lst_fields, similarity_threshold, fields_cache)
 
-        feat = xyz_json_to_feature(feat_json, fields)
+        feat = xyz_json_to_feature(feat_json, fields, wkb)
         lst_fields[idx] = feat.fields()
         # FIX: as fields is modified during processing, reassign it to lst_fields
-
-        lst_feat = map_feat_.setdefault(g, list())
-        while len(lst_feat) < len(lst_fields):
-            lst_feat.append(list())
-        lst_feat[idx].append(feat)
+        fields_cache.update_fields(idx, lst_fields[idx])
+
+        _append_feat(map_feat_, g, idx, len(lst_fields), feat)
+
+    def _batch_feature_map(lst_feat_json, lst_wkb, map_feat_, map_fields_):
+        # 1st pass: select fields, collect column names and widen types of new columns
+        groups = dict()  # (g, idx) -> [names, column_types, [(attrs, geom, wkb)]]
+        for feat_json, wkb in zip(lst_feat_json, lst_wkb):
+            geom = feat_json.get("geometry")
+            g = geom["type"] if geom is not None else None
+
+            lst_fields = map_fields_.setdefault(g, list())
+            fields_cache = _fields_cache(g, lst_fields)
+            fields, idx = prepare_fields(feat_json, lst_fields, similarity_threshold, fields_cache)
+
+            group = groups.get((g, idx))
+            if group is None:
+                group = groups[(g, idx)] = [set(fields.names()), dict(), list()]
+            names, column_types, rows = group
+
+            attrs = _json_to_attrs(feat_json)
+            is_new_column = False
+            for k, v in attrs.items():
+                if k in column_types:
+                    column_types[k] = widen_type(column_types[k], infer_value_type(v))
+                elif k not in names:
+                    names.add(k)
+                    column_types[k] = infer_value_type(v)
+                    # placeholder type, so that next features are scored against new names
+                    fields.append(make_field_from_type(k, QVariant.String))
+                    is_new_column = True
+            if is_new_column:
+                fields_cache.update_fields(idx, fields)
+            rows.append((attrs, geom, wkb))
+
+        # 2nd pass: build features with final fields and attribute vectors
+        for (g, idx), (_, column_types, rows) in groups.items():
+            lst_fields = map_fields_[g]
+            fields = lst_fields[idx]
+            if column_types:
+                fields = lst_fields[idx] = _retype_fields(fields, column_types)
+                map_fields_cache[g].update_fields(idx, fields)
+            lookup = {name: i for i, name in enumerate(fields.names())}
+            n_attrs = fields.size()
+            for attrs, geom, wkb in rows:
+                vec = [NULL] * n_attrs
+                for k, v in attrs.items():
+                    if column_types.get(k) == QVariant.String and not isinstance(v, str):
+                        v = str(v)
+                    vec[lookup[k]] = v
+                feat = QgsFeature(fields)
+                feat.setAttributes(vec)
+                if geom is not None:
+                    feat.setGeometry(make_geometry(geom, wkb))
+                _append_feat(map_feat_, g, idx, len(lst_fields), feat)
 
     lst_all_feat = obj["features"]
     if map_fields is None:
         map_fields = dict()
+    if map_fields_cache is None:
+        map_fields_cache = dict()
+    synced = set()
     # map_feat = dict()
     map_feat = dict((k, [list() for _ in enumerate(v)]) for k, v in map_fields.items())
 
-    for ft in lst_all_feat:
-        _single_feature_map(ft, map_feat, map_fields)
+    # convert geometry of the whole response at once
+    lst_wkb = wkb_utils.geojson_to_wkb_batch([ft.get("geometry") for ft in lst_all_feat])
+
+    if batch:
+        _batch_feature_map(lst_all_feat, lst_wkb, map_feat, map_fields)
+    else:
+        for ft, wkb in zip(lst_all_feat, lst_wkb):
+            _single_feature_map(ft, wkb, map_feat, map_fields)
 
     return map_feat, map_fields
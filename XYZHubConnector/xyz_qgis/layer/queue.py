@@ -8,8 +8,9 @@
 #
 ###############################################################################
 
+import math
 from collections import deque
-from . import bbox_utils
+from . import bbox_utils, tile_utils
 from typing import Dict, List
 from ..common.utils import get_current_millis_time
 
@@ -38,6 +39,9 @@ class ParamsQueue(object):
     def gen_retry_params(self, **params):
         pass
 
+    def set_response_size(self, limit: int, n_feat: int, size: int):
+        pass
+
     def has_retry(self) -> bool:
         return False
 
@@ -133,6 +137,90 @@ class TimeCachedQueue(ParamsQueue):
         self._cache.clear()
 
 
+class ViewportTileQueue(ParamsQueue):
+    """Tile params queue of the viewport, ordered by distance to the view centre.
+    When the view changes, tiles in flight that are still visible keep loading,
+    loaded tiles are skipped (unless reload_loaded) and the others are queued.
+    """
+
+    def __init__(self, key="tile_id", reload_loaded=False, **kw):
+        """
+        :param reload_loaded: queue loaded tiles again when the view changes, e.g. live
+        """
+        self._key = key
+        self.reload_loaded = reload_loaded
+        self._queue = deque()
+        self._inflight = set()
+        self._loaded = set()
+        self._last = None
+
+    def has_next(self):
+        return len(self._queue) > 0
+
+    def get_params(self):
+        params = self._queue.popleft()
+        self._inflight.add(params[self._key])
+        self._last = params
+        return params
+
+    def retry_params(self):
+        """queue the last params again, e.g. after re-authentication"""
+        if self._last is not None and self._last[self._key] in self._inflight:
+            self._inflight.discard(self._last[self._key])
+            self._queue.appendleft(self._last)
+        self._last = None
+
+    def set_params(self, lst: list):
+        """new view, tiles in flight and loaded are forgotten (e.g. restart)"""
+        self.forget()
+        self._queue = deque(self._sort_by_distance(lst))
+
+    def update_view(self, lst: list) -> List[str]:
+        """queue tiles of the new view that are not in flight nor loaded
+
+        :return: keys of tiles in flight that left the view, to be canceled
+        """
+        keys = set(p[self._key] for p in lst)
+        lst_cancel = [k for k in self._inflight if k not in keys]
+        self._inflight.intersection_update(keys)
+        skip = self._inflight if self.reload_loaded else self._inflight | self._loaded
+        self._queue = deque(self._sort_by_distance([p for p in lst if p[self._key] not in skip]))
+        return lst_cancel
+
+    def set_done(self, key):
+        self._inflight.discard(key)
+        if not self.reload_loaded:
+            self._loaded.add(key)
+
+    def set_failed(self, key):
+        self._inflight.discard(key)
+
+    def forget(self):
+        """tiles in flight and loaded are unknown, e.g. loading stopped"""
+        self._inflight.clear()
+        self._loaded.clear()
+        self._last = None
+
+    def count_inflight(self):
+        return len(self._inflight)
+
+    def count_queued(self):
+        return len(self._queue)
+
+    def _sort_by_distance(self, lst: list) -> list:
+        try:
+            lst_pos = [tile_utils.parse_tile_id(p[self._key]) for p in lst]
+        except (ValueError, AttributeError):
+            return list(lst)  # unknown tile schema, keep order
+        if not lst_pos:
+            return list()
+        # view centre is the centre of its tiles
+        col = sum(t["col"] for t in lst_pos) / len(lst_pos)
+        row = sum(t["row"] for t in lst_pos) / len(lst_pos)
+        lst_dist = [(t["col"] - col) ** 2 + (t["row"] - row) ** 2 for t in lst_pos]
+        return [p for _, p in sorted(zip(lst_dist, lst), key=lambda x: x[0])]
+
+
 class DequeParamsQueue(ParamsQueue):
     def __init__(self, params: list, **kw):
         self._queue = deque(params)
@@ -286,6 +374,133 @@ class ParamsQueue_deque_smart(ParamsQueue_deque_v2):
         return params
 
 
-# if API gives estimate byteSize of 1 features
-# then params queue can use that for an optimal limit
-# gen_retry_params should not change the optimal limit
+# API does not give an estimate byteSize of 1 feature,
+# so it is measured from the responses (set_response_size)
+# and used for an optimal limit
+class ByteSizeParamsQueue(ParamsQueue_deque_v2):
+    """Iterate params queue, whose limit targets a response size in bytes.
+    Bytes per feature are measured from each response: the limit widens by at most
+    GROW_FACTOR per page, shrinks at once when features get larger or a response is close
+    to the payload limit, and is halved on error (gen_retry_params).
+    """
+
+    TARGET_SIZE = 8 * 1024 * 1024
+    RESPONSE_LIMIT = int(1e7)  # same as parser.PAYLOAD_LIMIT
+    DANGER_RATIO = 0.8  # of RESPONSE_LIMIT
+    GROW_FACTOR = 2.0
+    # weight of a new sample, when features get smaller
+    SIZE_ALPHA = 0.3
+    MIN_LIMIT = 1
+    MAX_LIMIT = 100000
+
+    def __init__(self, params, buffer_size=1, target_size=TARGET_SIZE):
+        super().__init__(params, buffer_size)
+        self.target_size = target_size
+        self.byte_per_feat: float = None
+        if params.get("handle"):
+            # resume from the handle of a page, e.g. checkpoint
+            self.handle = params["handle"]
+            self._queue = deque([dict(limit=self.limit, handle=self.handle)])
+
+    def set_response_size(self, limit: int, n_feat: int, size: int):
+        """
+        :param limit: limit of the request
+        :param n_feat: number of features in the response
+        :param size: size of the uncompressed response body in bytes
+        """
+        if not n_feat or not size:
+            return
+        sample = size / n_feat
+        if self.byte_per_feat is None or sample > self.byte_per_feat:
+            self.byte_per_feat = sample
+        else:
+            self.byte_per_feat += self.SIZE_ALPHA * (sample - self.byte_per_feat)
+
+        new_limit = self.target_size / self.byte_per_feat
+        if size < self.DANGER_RATIO * self.RESPONSE_LIMIT:
+            new_limit = min(new_limit, max(limit or 1, self.limit) * self.GROW_FACTOR)
+        self.limit = self._clamp(new_limit)
+
+    def gen_retry_params(self, **params):
+        self.limit = self._clamp(min(self.limit, params.get("limit") or 1) // 2)
+        super().gen_retry_params(**params)
+
+    def get_params(self):
+        params = super().get_params()
+        if params.get("limit", 0) > self.limit:
+            # same handle with smaller limit, next page continues from its end
+            params = dict(params, limit=self.limit)
+        return params
+
+    def _clamp(self, limit) -> int:
+        return int(max(self.MIN_LIMIT, min(self.MAX_LIMIT, limit)))
+
+
+class BboxPartitionQueue(ParamsQueue):
+    """Params queue of bbox partitions of a space extent, to be loaded concurrently.
+    The extent is split in a grid of partitions of about feat_per_part features each,
+    assuming uniform density. Where features are denser, e.g. a response is full (limit
+    reached) or fails, split_params refines the partition in 4.
+    """
+
+    MIN_SIZE = 1e-6  # degree, partitions are not split further
+
+    def __init__(self, rect, count: int, limit: int, feat_per_part: int):
+        """
+        :param rect: extent of the space (x_min, y_min, x_max, y_max)
+        :param count: number of features of the space
+        :param limit: limit of each request
+        """
+        self.limit = limit
+        self.retries = 0
+        n = max(1, math.ceil(math.sqrt(count / max(1, feat_per_part))))
+        self._queue = deque(
+            dict(limit=limit, bbox=self._make_bbox(r)) for r in _split_rect(rect, n, n)
+        )
+        self.n_part = len(self._queue)
+
+    def has_next(self):
+        return len(self._queue) > 0
+
+    def get_params(self):
+        self.retries = max(0, self.retries - 1)
+        return self._queue.popleft()
+
+    def has_retry(self):
+        return self.retries
+
+    def gen_retry_params(self, **params):
+        """request the same partition again, e.g. after re-authentication"""
+        self._queue.appendleft(dict(limit=params["limit"], bbox=params["bbox"]))
+        self.retries += 1
+
+    def split_params(self, **params) -> bool:
+        """queue the 4 parts of the partition (bbox) first
+
+        :return: False if the partition is too small to be split
+        """
+        rect = bbox_utils.bbox_to_rect(params["bbox"])
+        if min(rect[2] - rect[0], rect[3] - rect[1]) < 2 * self.MIN_SIZE:
+            return False
+        lst = [dict(limit=self.limit, bbox=self._make_bbox(r)) for r in _split_rect(rect, 2, 2)]
+        self._queue.extendleft(reversed(lst))
+        self.n_part += len(lst)
+        return True
+
+    def _make_bbox(self, rect):
+        return dict(zip(["west", "south", "east", "north"], rect))
+
+
+def _split_rect(rect, nx, ny):
+    x_min, y_min, x_max, y_max = rect
+    dx, dy = (x_max - x_min) / nx, (y_max - y_min) / ny
+    return [
+        (
+            x_min + dx * i,
+            y_min + dy * j,
+            x_max if i == nx - 1 else x_min + dx * (i + 1),
+            y_max if j == ny - 1 else y_min + dy * (j + 1),
+        )
+        for j in range(ny)
+        for i in range(nx)
+    ]
@@ -7,18 +7,27 @@
 # License-Filename: LICENSE
 #
 ###############################################################################
+from contextlib import contextmanager
 from typing import List
 
+from qgis.PyQt.QtCore import QDate, QDateTime, QTime, QVariant, Qt
 from qgis.core import (
+    QgsGeometry,
     QgsWkbTypes,
     QgsFeatureRequest,
     QgsCoordinateReferenceSystem,
     QgsFields,
     QgsFeature,
+    QgsExpression,
 )
 from qgis.utils import iface
 
 from . import parser
+from .feat_counter import FeatureCounter
+from .gpkg_writer import GpkgBulkWriter
+from .tile_index import TileOwnershipIndex
+from .vlayer_scheduler import VLayerUpdateScheduler
+from .writer_thread import GpkgWriterThread, ogr_busy_timeout
 from ..common.signal import make_print_qgis
 
 print_qgis = make_print_qgis("render")
@@ -75,19 +84,23 @@ class RenderFeaturesError(RenderError):
 
 
 # mixed-geom
-def parse_feature(obj, map_fields, similarity_threshold=None, **kw_params):
-    map_feat, map_fields = parser.xyz_json_to_feature_map(obj, map_fields, similarity_threshold)
+def parse_feature(obj, map_fields, similarity_threshold=None, map_fields_cache=None, **kw_params):
+    map_feat, map_fields = parser.xyz_json_to_feature_map(
+        obj, map_fields, similarity_threshold, map_fields_cache
+    )
     return map_feat, map_fields, kw_params
 
 
-def truncate_add_render(vlayer, feat, new_fields):
+def truncate_add_render(vlayer, feat, new_fields, remap_cache=None, feat_counter=None):
     pr = vlayer.dataProvider()
     if pr.truncate():
         vlayer.updateExtents()
-    return add_feature_render(vlayer, feat, new_fields)
+        if feat_counter is not None:
+            feat_counter.reset(0)
+    return add_feature_render(vlayer, feat, new_fields, remap_cache, feat_counter=feat_counter)
 
 
-def clear_features_in_extent(vlayer, extent):
+def clear_features_in_extent(vlayer, extent, feat_counter: FeatureCounter = None):
     pr = vlayer.dataProvider()
 
     crs_src = "EPSG:4326"
@@ -101,11 +114,177 @@ def clear_features_in_extent(vlayer, extent):
         QgsFeatureRequest(extent).setSubsetOfAttributes([0]).setFlags(QgsFeatureRequest.NoGeometry)
     )
     lst_fid = [ft.id() for ft in it]
-    pr.deleteFeatures(lst_fid)
-    vlayer.updateExtents()
+    _delete_features(vlayer, lst_fid, feat_counter)
+
+
+def delete_features_by_xyz_id(
+    vlayer,
+    lst_xyz_id,
+    chunk_size=500,
+    feat_counter: FeatureCounter = None,
+    bulk_writer: GpkgBulkWriter = None,
+    writer_thread: GpkgWriterThread = None,
+    update_scheduler: VLayerUpdateScheduler = None,
+):
+    """delete features of vlayer given xyz_id (attribute index lookup, no spatial query)
+
+    :param bulk_writer, writer_thread, update_scheduler: see add_feature_render
+    """
+    if not lst_xyz_id:
+        return
+    if bulk_writer is not None and writer_thread is not None:
+        writer_thread.submit(
+            _bulk_delete_features,
+            bulk_writer,
+            list(lst_xyz_id),
+            feat_counter,
+            on_committed=lambda cnt: reload_vlayer(vlayer, update_scheduler),
+        )
+        return
+    pr = vlayer.dataProvider()
+    lst_fid = list()
+    for i in range(0, len(lst_xyz_id), chunk_size):
+        expr = "{name} IN ({values})".format(
+            name=QgsExpression.quotedColumnRef(parser.QGS_XYZ_ID),
+            values=",".join(QgsExpression.quotedValue(k) for k in lst_xyz_id[i : i + chunk_size]),
+        )
+        it = pr.getFeatures(
+            QgsFeatureRequest()
+            .setFilterExpression(expr)
+            .setSubsetOfAttributes([])
+            .setFlags(QgsFeatureRequest.NoGeometry)
+        )
+        lst_fid.extend(ft.id() for ft in it)
+    _delete_features(vlayer, lst_fid, feat_counter, update_scheduler)
+
+
+def _delete_features(vlayer, lst_fid, feat_counter: FeatureCounter = None, update_scheduler=None):
+    pr = vlayer.dataProvider()
+    ok = pr.deleteFeatures(lst_fid)
+    if feat_counter is not None:
+        if ok:
+            feat_counter.add(-len(lst_fid))
+        else:
+            feat_counter.invalidate()
+    if update_scheduler is not None:
+        update_scheduler.mark(vlayer, update_scheduler.EXTENT)
+    else:
+        vlayer.updateExtents()
+
+
+@contextmanager
+def _bulk_transaction(bulk_writer: GpkgBulkWriter, feat_counter: FeatureCounter = None):
+    """transaction of bulk_writer, in which feat_counter is updated. The count in memory
+    is discarded if it is rolled back"""
+    try:
+        with bulk_writer.transaction() as conn:
+            yield conn
+    except BaseException:
+        if feat_counter is not None:
+            feat_counter.discard()
+        raise
+
+
+def _bulk_delete_features(bulk_writer: GpkgBulkWriter, lst_xyz_id, feat_counter=None):
+    with _bulk_transaction(bulk_writer, feat_counter) as conn:
+        cnt = bulk_writer.delete(lst_xyz_id)
+        if feat_counter is not None:
+            feat_counter.add(-cnt, conn=conn)
+    return cnt
+
+
+def _submit_bulk_write(
+    writer_thread: GpkgWriterThread, feat_counter: FeatureCounter, feat, fn, *a, on_committed
+):
+    """submit fn(*a) writing feat to writer_thread, feat are pending in feat_counter until
+    the job is done"""
+    if feat_counter is not None:
+        feat_counter.add_pending(len(feat))
+    writer_thread.submit(_run_pending, feat_counter, len(feat), fn, *a, on_committed=on_committed)
+
+
+def _run_pending(feat_counter: FeatureCounter, n_pending, fn, *a):
+    try:
+        return fn(*a)
+    finally:
+        if feat_counter is not None:
+            feat_counter.add_pending(-n_pending)
+
+
+def replace_tile_features(
+    vlayer,
+    tile_index: TileOwnershipIndex,
+    tile_id,
+    lst_xyz_id,
+    feat_counter: FeatureCounter = None,
+    bulk_writer: GpkgBulkWriter = None,
+    writer_thread: GpkgWriterThread = None,
+    update_scheduler: VLayerUpdateScheduler = None,
+):
+    """set features owned by tile_id, delete features no longer owned by any tile
+
+    :param bulk_writer, writer_thread, update_scheduler: see add_feature_render
+    """
+    if bulk_writer is not None and writer_thread is not None:
+        writer_thread.submit(
+            _bulk_replace_tile_features,
+            tile_index,
+            tile_id,
+            list(lst_xyz_id),
+            bulk_writer,
+            feat_counter,
+            on_committed=lambda cnt: reload_vlayer(vlayer, update_scheduler) if cnt else None,
+        )
+        return
+    removed_ids = tile_index.replace(tile_id, lst_xyz_id)
+    delete_features_by_xyz_id(
+        vlayer, removed_ids, feat_counter=feat_counter, update_scheduler=update_scheduler
+    )
 
 
-def add_feature_render(vlayer, feat, new_fields):
+def _bulk_replace_tile_features(
+    tile_index, tile_id, lst_xyz_id, bulk_writer, feat_counter, feat=None, fields=None
+):
+    """replace ownership of tile_id, delete features no longer owned and upsert feat
+    in a single transaction of bulk_writer
+
+    :return: number of features deleted or inserted
+    """
+    with _bulk_transaction(bulk_writer, feat_counter) as conn:
+        removed_ids = tile_index.replace(tile_id, lst_xyz_id, conn=conn)
+        cnt = _bulk_delete_features(bulk_writer, removed_ids, feat_counter) if removed_ids else 0
+        if feat:
+            cnt += bulk_write_features(bulk_writer, feat, fields, feat_counter)
+    return cnt
+
+
+def add_feature_render(
+    vlayer,
+    feat,
+    new_fields,
+    remap_cache: parser.FieldsRemapCache = None,
+    bulk_writer: GpkgBulkWriter = None,
+    feat_counter: FeatureCounter = None,
+    writer_thread: GpkgWriterThread = None,
+    update_scheduler: VLayerUpdateScheduler = None,
+    tile_index: TileOwnershipIndex = None,
+    tile_id=None,
+):
+    """Add features to vlayer, adding new fields to the provider if needed
+
+    :param remap_cache: cache of attribute remapping to provider fields of vlayer,
+        e.g. XYZLayer.get_fields_remap_cache
+    :param bulk_writer: upsert features directly into the GeoPackage table of vlayer
+        instead of provider addFeatures, e.g. XYZLayer.get_bulk_writer
+    :param feat_counter: feature count of vlayer to be updated, e.g. XYZLayer.get_feat_counter
+    :param writer_thread: with bulk_writer, features are upserted in the writer thread of
+        the GeoPackage (e.g. XYZLayer.get_writer_thread) and vlayer is reloaded once they
+        are committed. Fields are still added in the calling (main) thread.
+    :param update_scheduler: vlayer fields and extent are updated by the scheduler
+        (coalesced) instead of immediately
+    :param tile_index, tile_id: with bulk_writer and writer_thread, features owned by
+        tile_id are replaced by feat in the same transaction, see replace_tile_features
+    """
     pr = vlayer.dataProvider()
     geom_type = QgsWkbTypes.geometryType(pr.wkbType())
 
@@ -136,24 +315,78 @@ def add_feature_render(vlayer, feat, new_fields):
     # reset fid value (deprecated thanks to unique field name)
     # for i,f in enumerate(feat): f.setAttribute(parser.QGS_ID,None)
 
-    attribute_ok = pr.addAttributes(diff_fields)
+    # schema is written by the provider in main thread, waiting for the writer thread:
+    # provider is opened with busy_timeout (XYZLayer), as is a reopening in update mode
+    with ogr_busy_timeout():
+        attribute_ok = pr.addAttributes(diff_fields)
     if not attribute_ok:
         raise RenderFieldsError(vlayer.name(), diff_fields)
+    if diff_fields and remap_cache is not None:
+        remap_cache.clear()  # provider schema changed
 
-    vlayer.updateFields()
+    if update_scheduler is None:
+        vlayer.updateFields()
+    elif diff_fields:
+        update_scheduler.mark(vlayer, update_scheduler.FIELDS)
 
     # assert parser.check_same_fields(new_fields, pr.fields()) # validate addAttributes
 
     # always update feature fields according to provider fields
+    fields = pr.fields()
+    if remap_cache is not None:
+        remap_cache.sync(fields)
     feat = filter(
-        None, (parser.update_feature_fields(ft, pr.fields(), new_fields) for ft in feat if ft)
+        None,
+        (parser.update_feature_fields(ft, fields, new_fields, remap_cache) for ft in feat if ft),
     )
 
-    ok, out_feat = pr.addFeatures(feat)
+    if bulk_writer is not None and writer_thread is not None and tile_index is not None:
+        out_feat = list(feat)
+        _submit_bulk_write(
+            writer_thread,
+            feat_counter,
+            out_feat,
+            _bulk_replace_tile_features,
+            tile_index,
+            tile_id,
+            [ft.attribute(parser.QGS_XYZ_ID) for ft in out_feat],
+            bulk_writer,
+            feat_counter,
+            out_feat,
+            fields,
+            on_committed=lambda cnt: reload_vlayer(vlayer, update_scheduler),
+        )
+        return True, out_feat
+    elif bulk_writer is not None and writer_thread is not None:
+        out_feat = list(feat)
+        _submit_bulk_write(
+            writer_thread,
+            feat_counter,
+            out_feat,
+            bulk_write_features,
+            bulk_writer,
+            out_feat,
+            fields,
+            feat_counter,
+            on_committed=lambda cnt: reload_vlayer(vlayer, update_scheduler),
+        )
+        return True, out_feat
+    elif bulk_writer is not None:
+        out_feat = list(feat)
+        bulk_write_features(bulk_writer, out_feat, fields, feat_counter)
+        ok = True
+        pr.reloadData()  # provider is not aware of external writes
+    else:
+        ok, out_feat = pr.addFeatures(feat)
+        if ok and feat_counter is not None:
+            feat_counter.add(len(out_feat))
     if not ok:
         raise RenderFeaturesError(vlayer.name(), out_feat)
 
-    vlayer.updateExtents()  # will hide default progress bar
+    if update_scheduler is not None:
+        update_scheduler.mark(vlayer, update_scheduler.EXTENT)
+    else:
+        vlayer.updateExtents()  # will hide default progress bar
     # post_render(vlayer) # disable in order to keep default progress bar running
     # vlayer.reload() # comment out to have less crash when loading large geometries
     # TODO: should find a better place to reload() and not crash,
@@ -163,6 +396,130 @@ def add_feature_render(vlayer, feat, new_fields):
     return ok, out_feat
 
 
+class RenderQueue(object):
+    """Queue of parsed features per vlayer, committed together by flush.
+
+    Batches of many responses (e.g. tiles) rendered to the same vlayer are merged,
+    so that each flush costs one schema update and one addFeatures per vlayer.
+    """
+
+    def __init__(self, max_feat=10000):
+        self.max_feat = max_feat
+        self.clear()
+
+    def clear(self):
+        # vlayer.id(): [vlayer, feat, fields, names, kw of add_feature_render]
+        self._pending = dict()
+        self._cnt = 0
+
+    def size(self):
+        return self._cnt
+
+    def is_full(self):
+        return self._cnt >= self.max_feat
+
+    def put(
+        self,
+        vlayer,
+        feat,
+        new_fields,
+        remap_cache: parser.FieldsRemapCache = None,
+        bulk_writer: GpkgBulkWriter = None,
+        feat_counter: FeatureCounter = None,
+        writer_thread: GpkgWriterThread = None,
+        update_scheduler: VLayerUpdateScheduler = None,
+    ):
+        item = self._pending.get(vlayer.id())
+        if item is None:
+            fields = QgsFields(new_fields)
+            kw = dict(
+                remap_cache=remap_cache,
+                bulk_writer=bulk_writer,
+                feat_counter=feat_counter,
+                writer_thread=writer_thread,
+                update_scheduler=update_scheduler,
+            )
+            item = [vlayer, list(), fields, set(fields.names()), kw]
+            self._pending[vlayer.id()] = item
+        else:
+            # merge fields of batches, features are remapped to provider fields anyway
+            _, _, fields, names, _ = item
+            for f in new_fields:
+                if f.name() not in names:
+                    names.add(f.name())
+                    fields.append(f)
+        item[1].extend(feat)
+        self._cnt += len(feat)
+
+    def flush(self):
+        """add pending features to their vlayer, see add_feature_render
+
+        :return: list of flushed vlayer
+        """
+        pending = list(self._pending.values())
+        self.clear()
+        for vlayer, feat, fields, _, kw in pending:
+            add_feature_render(vlayer, feat, fields, **kw)
+        return [item[0] for item in pending]
+
+
+def bulk_write_features(
+    bulk_writer: GpkgBulkWriter, feat, fields, feat_counter: FeatureCounter = None
+):
+    """Upsert features (with provider fields) using bulk_writer, fid is assigned by db
+
+    :return: number of features inserted (not updated)
+    """
+    bulk_writer.connect()
+    has_geom = bulk_writer.geom_column is not None
+    lst_idx = [i for i, f in enumerate(fields) if f.name() != bulk_writer.pk_column]
+    columns = [fields.at(i).name() for i in lst_idx]
+
+    def _row(ft):
+        attrs = ft.attributes()
+        values = [_sql_value(attrs[i]) for i in lst_idx]
+        if not has_geom:
+            return values
+        geom = ft.geometry()
+        if geom.isNull():
+            return [None] + values
+        if not QgsWkbTypes.hasZ(geom.wkbType()):
+            # vlayer in xyz layer has z geometry, see XYZLayer._init_ext_layer
+            geom = QgsGeometry(geom)
+            geom.get().addZValue(0)
+        if geom.isEmpty():
+            return [bulk_writer.make_blob(bytes(geom.asWkb()))] + values
+        bbox = geom.boundingBox()
+        envelope = (bbox.xMinimum(), bbox.xMaximum(), bbox.yMinimum(), bbox.yMaximum())
+        return [bulk_writer.make_blob(bytes(geom.asWkb()), envelope)] + values
+
+    with _bulk_transaction(bulk_writer, feat_counter) as conn:
+        cnt = bulk_writer.upsert(columns, (_row(ft) for ft in feat))
+        if feat_counter is not None:
+            feat_counter.add(cnt, conn=conn)
+    return cnt
+
+
+def _sql_value(v):
+    if isinstance(v, QVariant):
+        return None if v.isNull() else v.value()
+    if isinstance(v, (QDate, QDateTime, QTime)):
+        return v.toString(Qt.ISODate)
+    return v
+
+
+def reload_vlayer(vlayer, update_scheduler: VLayerUpdateScheduler = None):
+    """reload vlayer after external writes to its db, e.g. by GpkgWriterThread"""
+    if update_scheduler is not None:
+        update_scheduler.mark(
+            vlayer, update_scheduler.RELOAD | update_scheduler.EXTENT | update_scheduler.REPAINT
+        )
+        return
+    vlayer.dataProvider().reloadData()
+    vlayer.updateExtents()
+    post_render(vlayer)
+
+
 def post_render(vlayer):
     # print_qgis("Feature count:", vlayer.featureCount())
 
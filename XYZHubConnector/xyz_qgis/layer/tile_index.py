@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+# Copyright (c) 2019 HERE Europe B.V.
+#
+# SPDX-License-Identifier: MIT
+# License-Filename: LICENSE
+#
+###############################################################################
+
+import sqlite3
+from typing import Iterable, List
+
+# sqlite default max number of host parameters (SQLITE_MAX_VARIABLE_NUMBER)
+SQL_MAX_VARIABLE = 999
+
+TABLE_NAME = "xyz_tile_ownership"
+
+
+class TileOwnershipIndex(object):
+    """Index of xyz_id of features loaded per tile_id of a vlayer (table in gpkg/sqlite db).
+
+    Stored in the same db as the vlayer, so that it persists with the layer.
+    A feature crossing tile borders is owned by several tiles (reference count),
+    it is only removed when the last owner tile is cleared.
+    """
+
+    def __init__(self, fname: str, layer_name: str):
+        """
+        :param fname: path of gpkg/sqlite db
+        :param layer_name: name of the table corresponds to vlayer in db
+        """
+        self.fname = fname
+        self.layer_name = layer_name
+
+    def _connect(self):
+        return sqlite3.connect(self.fname, timeout=10)
+
+    def init(self):
+        sql = """
+        CREATE TABLE IF NOT EXISTS "{table}" (
+            "layer_name" TEXT NOT NULL,
+            "tile_id" TEXT NOT NULL,
+            "xyz_id" TEXT NOT NULL,
+            PRIMARY KEY ("layer_name", "tile_id", "xyz_id")
+        ) WITHOUT ROWID;
+
+        CREATE INDEX IF NOT EXISTS "idx_{table}_xyz_id"
+        ON "{table}" ("layer_name", "xyz_id");
+        """.format(
+            table=TABLE_NAME
+        )
+        conn = self._connect()
+        conn.executescript(sql)
+        conn.commit()
+        conn.close()
+
+    def reset(self):
+        """remove all ownership of the vlayer, e.g. vlayer table is overwritten"""
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                'DELETE FROM "{table}" WHERE "layer_name" = ?'.format(table=TABLE_NAME),
+                (self.layer_name,),
+            )
+        conn.close()
+
+    def replace(self, tile_id: str, lst_xyz_id: Iterable[str], conn=None) -> List[str]:
+        """set features owned by tile_id
+
+        :param conn: connection to the db in a transaction (e.g.
+            GpkgBulkWriter.transaction), the caller commits. A new connection if None
+        :return: list of xyz_id no longer owned by any tile, to be removed from vlayer
+        """
+        if conn is not None:
+            return self._replace(conn, tile_id, lst_xyz_id)
+        conn = self._connect()
+        with conn:
+            removed_ids = self._replace(conn, tile_id, lst_xyz_id)
+        conn.close()
+        return removed_ids
+
+    def _replace(self, conn, tile_id, lst_xyz_id):
+        tile_id = str(tile_id)
+        new_ids = set(str(k) for k in lst_xyz_id if k)
+        cur = conn.execute(
+            'SELECT "xyz_id" FROM "{table}" WHERE "layer_name" = ? AND "tile_id" = ?'.format(
+                table=TABLE_NAME
+            ),
+            (self.layer_name, tile_id),
+        )
+        removed_ids = [k for (k,) in cur if k not in new_ids]
+        conn.execute(
+            'DELETE FROM "{table}" WHERE "layer_name" = ? AND "tile_id" = ?'.format(
+                table=TABLE_NAME
+            ),
+            (self.layer_name, tile_id),
+        )
+        conn.executemany(
+            'INSERT OR IGNORE INTO "{table}" VALUES (?, ?, ?)'.format(table=TABLE_NAME),
+            ((self.layer_name, tile_id, k) for k in new_ids),
+        )
+        owned_ids = set(self._iter_owned(conn, removed_ids))
+        return [k for k in removed_ids if k not in owned_ids]
+
+    def clear(self, tile_id: str) -> List[str]:
+        """remove features owned by tile_id
+
+        :return: list of xyz_id no longer owned by any tile, to be removed from vlayer
+        """
+        return self.replace(tile_id, list())
+
+    def count_owner(self, xyz_id: str) -> int:
+        """returns number of tiles owning the feature"""
+        conn = self._connect()
+        (cnt,) = conn.execute(
+            'SELECT COUNT(*) FROM "{table}" WHERE "layer_name" = ? AND "xyz_id" = ?'.format(
+                table=TABLE_NAME
+            ),
+            (self.layer_name, str(xyz_id)),
+        ).fetchone()
+        conn.close()
+        return cnt
+
+    def _iter_owned(self, conn, lst_xyz_id):
+        """yields xyz_id in lst_xyz_id that are owned by any tile"""
+        chunk_size = SQL_MAX_VARIABLE - 1
+        for i in range(0, len(lst_xyz_id), chunk_size):
+            chunk = lst_xyz_id[i : i + chunk_size]
+            sql = (
+                'SELECT DISTINCT "xyz_id" FROM "{table}" '
+                'WHERE "layer_name" = ? AND "xyz_id" IN ({params})'
+            ).format(table=TABLE_NAME, params=",".join("?" * len(chunk)))
+            for (k,) in conn.execute(sql, [self.layer_name] + chunk):
+                yield k
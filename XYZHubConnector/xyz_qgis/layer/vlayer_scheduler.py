@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+# Copyright (c) 2019 HERE Europe B.V.
+#
+# SPDX-License-Identifier: MIT
+# License-Filename: LICENSE
+#
+###############################################################################
+
+import time
+from collections import OrderedDict
+
+from qgis.PyQt.QtCore import QTimer
+from qgis.utils import iface
+
+from .layer_utils import update_vlayer_editorWidgetSetup
+from ..common.signal import make_print_qgis
+
+print_qgis = make_print_qgis("vlayer_scheduler")
+
+
+class VLayerUpdateScheduler(object):
+    """Collect vlayers to be updated (reload, fields, extent, repaint) and update them
+    in the main thread at most once per frame interval.
+
+    A pass over the dirty vlayers is split into event loop ticks, each limited to a
+    time budget, so that the canvas stays responsive (e.g. panning) while loading.
+    A vlayer marked again after its update waits for the next pass.
+    """
+
+    RELOAD = 0x01  # provider reloadData, after external writes
+    FIELDS = 0x02  # updateFields
+    EXTENT = 0x04  # updateExtents
+    EDITOR_WIDGET = 0x08  # update_vlayer_editorWidgetSetup
+    REPAINT = 0x10  # triggerRepaint or canvas refresh
+
+    def __init__(self, interval=200, budget=20):
+        """
+        :param interval: min time between passes (ms)
+        :param budget: max time of a pass per event loop tick (ms)
+        """
+        self.interval = interval
+        self.budget = budget
+        self._dirty = OrderedDict()  # vlayer.id(): [vlayer, flags]
+        self._pass = list()  # vlayer.id() of the running pass
+        self._t_last_pass = 0.0
+        self._timer = None
+
+    def mark(self, vlayer, flags: int):
+        item = self._dirty.get(vlayer.id())
+        if item is None:
+            self._dirty[vlayer.id()] = [vlayer, flags]
+        else:
+            item[1] |= flags
+        self._schedule()
+
+    def count_pending(self) -> int:
+        return len(self._dirty)
+
+    def _schedule(self):
+        if self._timer is None:
+            self._timer = QTimer()
+            self._timer.setSingleShot(True)
+            self._timer.timeout.connect(self._run_tick)
+        if self._timer.isActive():
+            return
+        if self._pass:
+            self._timer.start(0)  # continue the running pass
+        else:
+            elapsed = (time.monotonic() - self._t_last_pass) * 1000
+            self._timer.start(int(max(0, self.interval - elapsed)))
+
+    def _run_tick(self):
+        if not self._pass:
+            self._pass = list(self._dirty.keys())
+        deadline = time.monotonic() + self.budget / 1000
+        refresh_canvas = False
+        while self._pass:
+            item = self._dirty.pop(self._pass.pop(0), None)
+            if item is not None:
+                refresh_canvas |= self._update(*item)
+            if time.monotonic() >= deadline:
+                break  # at least one vlayer per tick
+        if refresh_canvas:
+            iface.mapCanvas().refresh()
+        if not self._pass:
+            self._t_last_pass = time.monotonic()
+        if self._pass or self._dirty:
+            self._schedule()
+
+    def run_pending(self):
+        """update all dirty vlayers now, e.g. when loading is finished"""
+        if self._timer is not None:
+            self._timer.stop()
+        self._pass = list()
+        refresh_canvas = False
+        while self._dirty:
+            _, item = self._dirty.popitem(last=False)
+            refresh_canvas |= self._update(*item)
+        if refresh_canvas:
+            iface.mapCanvas().refresh()
+        self._t_last_pass = time.monotonic()
+
+    def _update(self, vlayer, flags) -> bool:
+        """:return: True if canvas has to be refreshed (canvas caching disabled)"""
+        try:
+            if flags & self.RELOAD:
+                vlayer.dataProvider().reloadData()
+            if flags & self.FIELDS:
+                vlayer.updateFields()
+            if flags & self.EXTENT:
+                vlayer.updateExtents()
+            if flags & self.EDITOR_WIDGET:
+                update_vlayer_editorWidgetSetup(vlayer)
+            if flags & self.REPAINT:
+                if not iface.mapCanvas().isCachingEnabled():
+                    return True
+                vlayer.triggerRepaint()
+        except RuntimeError as e:
+            # wrapped vlayer has been deleted
+            print_qgis("update", repr(e))
+        return False
+
+
+update_scheduler = VLayerUpdateScheduler()
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+# Copyright (c) 2019 HERE Europe B.V.
+#
+# SPDX-License-Identifier: MIT
+# License-Filename: LICENSE
+#
+###############################################################################
+
+"""Convert decoded GeoJSON geometry (dict of coordinate lists) directly to ISO WKB.
+
+Only Point, LineString, Polygon and their Multi variants are handled.
+Anything else (GeometryCollection, empty or null coordinates, invalid nesting)
+returns None, so that the caller can fall back to the OGR path.
+"""
+
+import struct
+from typing import List, Optional
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+WKB_POINT = 1
+WKB_LINESTRING = 2
+WKB_POLYGON = 3
+WKB_MULTIPOINT = 4
+WKB_MULTILINESTRING = 5
+WKB_MULTIPOLYGON = 6
+WKB_Z_OFFSET = 1000  # ISO WKB, e.g. PointZ = 1001
+
+# below this number of positions, struct packing is faster than numpy
+NUMPY_MIN_POINTS = 64
+
+_BYTE_ORDER = 1  # little endian
+_HEADER = struct.Struct("<BI")
+_COUNT = struct.Struct("<I")
+
+
+class UnsupportedGeometryError(Exception):
+    pass
+
+
+def _header(wkb_type, dim):
+    return _HEADER.pack(_BYTE_ORDER, wkb_type + (WKB_Z_OFFSET if dim == 3 else 0))
+
+
+def _position_dim(points) -> int:
+    """returns 3 if any position has z value, otherwise 2 (same as ogr)"""
+    n = max(map(len, points), default=0)
+    if n < 2:
+        raise UnsupportedGeometryError("empty position")
+    return 3 if n > 2 else 2
+
+
+def _pack_points_numpy(points, dim) -> Optional[bytes]:
+    try:
+        arr = np.asarray(points, dtype="<f8")
+    except (TypeError, ValueError):
+        return None
+    if arr.ndim != 2 or arr.shape[1] < 2 or np.isnan(arr).any():
+        return None
+    if arr.shape[1] < dim:
+        arr = np.hstack([arr, np.zeros((arr.shape[0], dim - arr.shape[1]), dtype="<f8")])
+    return np.ascontiguousarray(arr[:, :dim]).tobytes()
+
+
+def _pack_points(points, dim) -> bytes:
+    """pack list of positions as little endian doubles, missing z is set to 0"""
+    if np is not None and len(points) >= NUMPY_MIN_POINTS:
+        byt = _pack_points_numpy(points, dim)
+        if byt is not None:
+            return byt
+    flat = list()
+    for p in points:
+        n = len(p)
+        if n < 2:
+            raise UnsupportedGeometryError("invalid position: %s" % (p,))
+        flat.extend(p[:dim])
+        if n < dim:
+            flat.append(0.0)
+    try:
+        return struct.pack("<%dd" % len(flat), *flat)
+    except struct.error as e:
+        raise UnsupportedGeometryError(e)
+
+
+def _check_not_empty(lst):
+    if not isinstance(lst, (list, tuple)) or len(lst) == 0:
+        raise UnsupportedGeometryError("empty coordinates")
+    return lst
+
+
+def _wkb_point(coords, dim):
+    return _header(WKB_POINT, dim) + _pack_points([coords], dim)
+
+
+def _wkb_linestring(points, dim):
+    _check_not_empty(points)
+    return _header(WKB_LINESTRING, dim) + _COUNT.pack(len(points)) + _pack_points(points, dim)
+
+
+def _wkb_polygon(rings, dim):
+    _check_not_empty(rings)
+    parts = [_header(WKB_POLYGON, dim), _COUNT.pack(len(rings))]
+    for ring in rings:
+        _check_not_empty(ring)
+        parts.append(_COUNT.pack(len(ring)))
+        parts.append(_pack_points(ring, dim))
+    return b"".join(parts)
+
+
+def _wkb_multi(wkb_type, fn_part, lst_part, dim):
+    _check_not_empty(lst_part)
+    parts = [_header(wkb_type, dim), _COUNT.pack(len(lst_part))]
+    parts.extend(fn_part(p, dim) for p in lst_part)
+    return b"".join(parts)
+
+
+def _iter_positions(coords, depth):
+    """iterate through positions of nested coordinates of given depth"""
+    if depth == 0:
+        yield coords
+        return
+    for c in _check_not_empty(coords):
+        for p in _iter_positions(c, depth - 1):
+            yield p
+
+
+# geometry type: (position nesting depth, wkb encoder)
+_ENCODERS = {
+    "Point": (0, _wkb_point),
+    "LineString": (1, _wkb_linestring),
+    "Polygon": (2, _wkb_polygon),
+    "MultiPoint": (1, lambda c, dim: _wkb_multi(WKB_MULTIPOINT, _wkb_point, c, dim)),
+    "MultiLineString": (
+        2,
+        lambda c, dim: _wkb_multi(WKB_MULTILINESTRING, _wkb_linestring, c, dim),
+    ),
+    "MultiPolygon": (3, lambda c, dim: _wkb_multi(WKB_MULTIPOLYGON, _wkb_polygon, c, dim)),
+}
+
+
+def geojson_to_wkb(geom: dict) -> Optional[bytes]:
+    """Convert GeoJSON geometry object to ISO WKB.
+
+    :param geom: decoded GeoJSON geometry, e.g. {"type": "Point", "coordinates": [1, 2]}
+    :return: WKB bytes, or None if the geometry is not supported by the fast path
+    """
+    if not isinstance(geom, dict):
+        return None
+    encoder = _ENCODERS.get(geom.get("type"))
+    coords = geom.get("coordinates")
+    if encoder is None or not isinstance(coords, (list, tuple)):
+        return None
+    depth, fn = encoder
+    try:
+        dim = _position_dim(list(_iter_positions(coords, depth)))
+        return fn(coords, dim)
+    except (UnsupportedGeometryError, TypeError, ValueError, IndexError):
+        return None
+
+
+def _batch_points_numpy(lst_geom, lst_idx):
+    """pack all Point geometries of a response at once"""
+    try:
+        arr = np.asarray([lst_geom[i]["coordinates"] for i in lst_idx], dtype="<f8")
+    except (TypeError, ValueError):
+        return dict()
+    if arr.ndim != 2 or arr.shape[1] < 2 or np.isnan(arr).any():
+        return dict()
+    dim = 3 if arr.shape[1] > 2 else 2
+    data = np.ascontiguousarray(arr[:, :dim]).tobytes()
+    header = _header(WKB_POINT, dim)
+    step = 8 * dim
+    return {i: header + data[k * step : (k + 1) * step] for k, i in enumerate(lst_idx)}
+
+
+def geojson_to_wkb_batch(lst_geom: List[dict]) -> List[Optional[bytes]]:
+    """Convert list of GeoJSON geometries (e.g. of a whole response) to list of WKB.
+
+    Point geometries are packed together with numpy where available.
+    Unsupported geometries are returned as None.
+    """
+    packed = dict()
+    if np is not None:
+        lst_idx = [
+            i for i, g in enumerate(lst_geom) if isinstance(g, dict) and g.get("type") == "Point"
+        ]
+        if len(lst_idx) >= NUMPY_MIN_POINTS:
+            packed = _batch_points_numpy(lst_geom, lst_idx)
+    return [packed[i] if i in packed else geojson_to_wkb(g) for i, g in enumerate(lst_geom)]
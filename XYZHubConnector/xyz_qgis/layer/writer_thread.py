@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+# Copyright (c) 2019 HERE Europe B.V.
+#
+# SPDX-License-Identifier: MIT
+# License-Filename: LICENSE
+#
+###############################################################################
+
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable
+
+from qgis.PyQt.QtCore import QThreadPool
+from osgeo import gdal
+
+from ..common.error import make_exception_obj
+from ..common.signal import BasicSignal, make_print_qgis, print_error
+from ..controller.worker import Worker
+
+print_qgis = make_print_qgis("writer_thread")
+
+# ms, OGR waits for the transaction of a writer thread instead of failing (SQLITE_BUSY)
+OGR_BUSY_TIMEOUT = 10000
+
+
+@contextmanager
+def ogr_busy_timeout():
+    """OGR connections to a sqlite/gpkg db opened in the context (current thread), e.g. by
+    the provider of a vlayer or a schema change, wait for the writer thread (busy_timeout)"""
+    gdal.SetThreadLocalConfigOption("OGR_SQLITE_PRAGMA", "busy_timeout=%s" % OGR_BUSY_TIMEOUT)
+    try:
+        yield
+    finally:
+        gdal.SetThreadLocalConfigOption("OGR_SQLITE_PRAGMA", None)
+
+
+def _no_op():
+    pass
+
+
+class GpkgWriterThread(object):
+    """Single worker thread applying writes to one GeoPackage, off the main thread.
+
+    Jobs (e.g. GpkgBulkWriter.upsert) run one at a time in submission order, so writes
+    to the db are serialized, while the main thread keeps reading it (WAL).
+    The on_committed callback of a job is called in the main thread once it is done,
+    e.g. to reload and repaint the affected vlayer.
+
+    Supported signals are:
+
+    error
+        `exception` exception object of a failed job
+    """
+
+    def __init__(self, fname: str):
+        self.fname = fname
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(1)
+        self.pool.setExpiryTimeout(-1)  # keep the thread (and its connections)
+        self.signal = BasicSignal()
+        self.signal.error.connect(print_error)
+        self._done = deque()  # (callback, output) of finished jobs
+        self._n_pending = 0
+
+    def count_pending(self) -> int:
+        """number of jobs not yet committed (notified)"""
+        return self._n_pending
+
+    def submit(self, fn: Callable, *a, on_committed: Callable = None):
+        """run fn(*a) in the writer thread, then on_committed(output) in the main thread"""
+        worker = Worker(self._run_job, fn, a, on_committed)
+        # queued to the main thread, finished jobs are also drained by wait
+        worker.signal.finished.connect(self._drain)
+        self._n_pending += 1
+        self.pool.start(worker)
+
+    def barrier(self, on_committed: Callable):
+        """call on_committed() in the main thread once the jobs submitted before are done"""
+        self.submit(_no_op, on_committed=lambda _: on_committed())
+
+    def _run_job(self, fn, a, on_committed):
+        try:
+            output = fn(*a)
+        except Exception as e:
+            self._done.append((None, make_exception_obj(e)))
+        else:
+            self._done.append((on_committed, output))
+
+    def _drain(self):
+        while self._done:
+            callback, output = self._done.popleft()
+            self._n_pending -= 1
+            if callback is None:
+                self.signal.error.emit(output)
+                continue
+            try:
+                callback(output)
+            except RuntimeError as e:
+                # e.g. wrapped vlayer has been deleted
+                print_qgis("on_committed", repr(e))
+
+    def wait(self, msecs: int = -1) -> bool:
+        """block until all submitted jobs are done and notify them
+
+        :return: False if timed out
+        """
+        ok = self.pool.waitForDone(msecs)
+        self._drain()
+        return ok
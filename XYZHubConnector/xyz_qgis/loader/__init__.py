@@ -14,10 +14,13 @@ from .layer_loader import (
     EditSyncController,
     EmptyXYZSpaceError,
     InitUploadLayerController,
+    LoadFeatureController,
     LoadLayerController,
+    PartitionedLoadLayerController,
     UploadLayerController,
     TileLayerLoader,
     LiveTileLayerLoader,
     ManualInterrupt,
 )
 from .manager import LoaderManager
+from .feature_form import feature_form_loader
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+# Copyright (c) 2019 HERE Europe B.V.
+#
+# SPDX-License-Identifier: MIT
+# License-Filename: LICENSE
+#
+###############################################################################
+
+"""Attribute form of features of layers loaded with a property selection ("*").
+
+Only the properties needed by the layer are loaded (see layer_usage). When the
+attribute form of a feature is opened, all its properties are loaded (e.g. by
+LoadFeatureController) and the form shows them once they are written.
+"""
+
+from typing import Callable
+
+from qgis.core import QgsEditFormConfig, QgsFeatureRequest, QgsProject, QgsVectorLayer
+
+from ..layer import parser
+from ..layer.writer_thread import GpkgWriterThread
+
+from ..common.signal import make_print_qgis
+
+print_qgis = make_print_qgis("feature_form")
+
+# python init function of the form, imported by qgis (function from environment)
+FORM_INIT_FUNCTION = __name__ + ".open_feature_form"
+
+
+class FeatureFormLoader(object):
+    """Load all properties of a feature when its attribute form is opened"""
+
+    def __init__(self):
+        self._fn_load: Callable = None
+        self._vlayer_ids = set()  # vlayers with open_feature_form, see clear
+
+    def config(self, fn_load: Callable):
+        """
+        :param fn_load: fn_load(form, vlayer, xyz_id) loads all properties of the feature
+        """
+        self._fn_load = fn_load
+
+    def setup_vlayer(self, vlayer: QgsVectorLayer):
+        """open_feature_form is the form init function of vlayer, unless another one is
+        configured (e.g. by the user). It is removed again by clear"""
+        config = vlayer.editFormConfig()
+        if config.initFunction() not in ("", FORM_INIT_FUNCTION):
+            return
+        self._vlayer_ids.add(vlayer.id())
+        if config.initFunction():
+            return  # e.g. saved in the project
+        config.setInitCodeSource(QgsEditFormConfig.CodeSourceEnvironment)
+        config.setInitFunction(FORM_INIT_FUNCTION)
+        vlayer.setEditFormConfig(config)
+
+    def teardown_vlayer(self, vlayer: QgsVectorLayer):
+        """remove open_feature_form from the form config of vlayer, so that the form
+        does not call the plugin once it is unloaded"""
+        config = vlayer.editFormConfig()
+        if config.initFunction() != FORM_INIT_FUNCTION:
+            return
+        config.setInitFunction("")
+        config.setInitCodeSource(QgsEditFormConfig.CodeSourceNone)
+        vlayer.setEditFormConfig(config)
+
+    def open_form(self, form, vlayer: QgsVectorLayer, feature):
+        if self._fn_load is None or vlayer is None or vlayer.isEditable():
+            return
+        if not feature.isValid() or feature.fieldNameIndex(parser.QGS_XYZ_ID) < 0:
+            return  # e.g. new feature
+        xyz_id = feature.attribute(parser.QGS_XYZ_ID)
+        if not xyz_id:
+            return
+        self._fn_load(form, vlayer, xyz_id)
+
+    def refresh_form(
+        self, form, vlayer: QgsVectorLayer, xyz_id: str, writer_thread: GpkgWriterThread = None
+    ):
+        """show the loaded feature in form, once its write is committed"""
+        if writer_thread is not None:
+            writer_thread.barrier(lambda: self.refresh_form(form, vlayer, xyz_id))
+            return
+        expr = "\"{}\" = '{}'".format(parser.QGS_XYZ_ID, str(xyz_id).replace("'", "''"))
+        feature = next(vlayer.getFeatures(QgsFeatureRequest().setFilterExpression(expr)), None)
+        if feature is None:
+            return
+        try:
+            form.setFeature(feature)
+        except RuntimeError:
+            print_qgis("form is closed", xyz_id)  # form deleted
+
+    def clear(self):
+        """stop loading forms and remove open_feature_form from the vlayers, e.g. unload"""
+        self._fn_load = None
+        project = QgsProject.instance()
+        for layer_id in self._vlayer_ids:
+            vlayer = project.mapLayer(layer_id)
+            if isinstance(vlayer, QgsVectorLayer):
+                self.teardown_vlayer(vlayer)
+        self._vlayer_ids.clear()
+
+
+feature_form_loader = FeatureFormLoader()
+
+
+def open_feature_form(dialog, layer, feature):
+    """form init function of vlayers, see FeatureFormLoader.setup_vlayer"""
+    feature_form_loader.open_form(dialog, layer, feature)
@@ -11,11 +11,13 @@
 import copy
 from typing import Callable, Dict
 
-from qgis.PyQt.QtCore import QThreadPool
+from qgis.PyQt.QtCore import Qt, QThreadPool, QTimer
 from qgis.PyQt.QtNetwork import QNetworkReply
-from qgis.core import QgsVectorLayer, QgsRectangle
+from qgis.core import QgsFields, QgsVectorLayer
 
+from .feature_form import feature_form_loader
 from .loop_loader import BaseLoader, BaseLoop, ParallelFun
+from .space_loader import StatSpaceController
 from ..controller import (
     AsyncFun,
     ChainController,
@@ -23,16 +25,23 @@ from ..controller import (
     LoopController,
     NetworkFun,
     WorkerFun,
+    make_exception_obj,
+    make_fun_args,
     make_qt_args,
     parse_exception_obj,
+    parse_qt_args,
 )
-from ..layer import XYZLayer, layer_utils, queue, render, tile_utils
+from ..layer import XYZLayer, layer_usage, layer_utils, parser, queue, render
 from ..layer.edit_buffer import LayeredEditBuffer
-from ..layer.layer_utils import update_vlayer_editorWidgetSetup
+from ..layer.load_checkpoint import LoadCheckpoint, make_checkpoint_key
+from ..layer.vlayer_scheduler import update_scheduler
 from ..models import SpaceConnectionInfo
 from ..models.connection import mask_token
-from ..network import net_handler
+from ..network import mvt_decoder, net_handler
+from ..network.net_utils import make_upload_payload
+from ..network.concurrency import limiters
 from ..network.network import NetManager
+from ..network.shared_network import shared_network
 
 from ..common.signal import make_print_qgis
 
@@ -69,11 +78,14 @@ class LoadLayerController(BaseLoader):
     Stateful controller
     """
 
+    # features of a large response are rendered in batches, before it is received completely
+    STREAM_BATCH_FEAT = 5000
+
     def __init__(self, network: NetManager, layer: XYZLayer = None, n_parallel=1):
         BaseLoader.__init__(self)
 
         self.pool = QThreadPool()  # .globalInstance() will crash afterward
-        self.n_parallel = 1
+        self.n_parallel = n_parallel  # unless the window of the limiter of the host
         self.status = self.LOADING
 
         self.fixed_keys = ["tags", "filters", "selection"]
@@ -82,24 +94,75 @@ class LoadLayerController(BaseLoader):
         self.kw: dict = None
         self.fixed_params = dict()
         self.params_queue: queue.ParamsQueue = None
+        # vlayer fields, extent and repaint are coalesced per frame
+        self.update_scheduler = update_scheduler
+        # resumable iterate load, see LoadCheckpoint
+        self.checkpoint_key: str = None
+        self.feat_cnt_loaded = 0
+        self._page_checkpoint: dict = None
+        self._verify_written = False
 
         self._config(network)
 
         if layer:
             self._config_layer_callback(layer)
+            self._config_limiter(network, layer)
+
+    def _config_limiter(self, network: NetManager, layer: XYZLayer):
+        """limiter of the host of the layer, so that the first loops already run in parallel
+        up to its window, see get_n_parallel"""
+        self.set_host(network.get_host(layer.get_conn_info()))
 
     def post_render(self, *a, **kw):
         if self.is_not_running():
             return
+        self._commit_checkpoint()
         self._post_render()
 
     def _post_render(self):
         for v in self.layer.iter_layer():
-            update_vlayer_editorWidgetSetup(v)
-            v.triggerRepaint()
+            self.update_scheduler.mark(
+                v, self.update_scheduler.EDITOR_WIDGET | self.update_scheduler.REPAINT
+            )
 
     def _config_layer_callback(self, layer):
-        layer.config_callback(stop_loading=self.stop_loading)
+        layer.config_callback(stop_loading=self.stop_loading, usage_changed=self._cb_usage_changed)
+
+    def is_auto_selection(self) -> bool:
+        """True if only the properties needed by the layer are loaded, see layer_usage"""
+        return self.kw is not None and layer_usage.is_auto_selection(self.kw.get("selection"))
+
+    def _resolve_selection(self):
+        if not self.is_auto_selection():
+            return
+        for vlayer in self.layer.iter_layer():
+            feature_form_loader.setup_vlayer(vlayer)
+        selection = layer_usage.resolve_selection(self.kw["selection"], self.layer.iter_layer())
+        print_qgis("selection", selection)
+        self._set_selection(self.fixed_params, selection)
+
+    @staticmethod
+    def _set_selection(fixed_params: dict, selection: str):
+        if selection:
+            fixed_params["selection"] = selection
+        else:
+            fixed_params.pop("selection", None)
+
+    def _cb_usage_changed(self, *a):
+        """reload when the style, labels, filter or form of the layer need a property
+        that is not loaded yet. Loaded properties are kept until the next load."""
+        if not self.is_auto_selection() or self.status == self.STOPPED:
+            return
+        if any(vlayer.isEditable() for vlayer in self.layer.iter_layer()):
+            return  # selection is resolved when loading starts again
+        selection = layer_usage.resolve_selection(self.kw["selection"], self.layer.iter_layer())
+        if layer_usage.is_selection_covered(selection, self.fixed_params.get("selection")):
+            return
+        print_qgis("reload selection", selection)
+        self._reload_selection()
+
+    def _reload_selection(self):
+        self.restart()
 
     def start(self, conn_info: SpaceConnectionInfo, meta: Meta, **kw):
         tags = kw.get("tags", "")
@@ -134,26 +197,132 @@ class LoadLayerController(BaseLoader):
         self.kw = kw
         self.max_feat = kw.get("max_feat", None)
         self.fixed_params.update((k, kw[k]) for k in self.fixed_keys if k in kw)
+        self._resolve_selection()
 
         params = dict(
             limit=kw.get("limit") or 1,
             handle=kw.get("handle", 0),
         )
-        self.params_queue = queue.ParamsQueue_deque_smart(params, buffer_size=1)
+        self.checkpoint_key = make_checkpoint_key(self.fixed_params)
+        checkpoint = self._get_checkpoint(kw.get("checkpoint"))
+        self.feat_cnt_loaded = 0
+        self._page_checkpoint = None
+        self._verify_written = checkpoint is not None
+        if checkpoint is not None:
+            print_qgis("resume", checkpoint)
+            params.update(limit=checkpoint["limit"], handle=checkpoint["handle"])
+            self.feat_cnt_loaded = checkpoint["feat_cnt"]
+        self.params_queue = queue.ByteSizeParamsQueue(params, buffer_size=1)
+
+    def has_checkpoint(self) -> bool:
+        """True if the last load of the layer, with its query, is unfinished, see restart"""
+        if self.layer is None:
+            return False
+        params = self.layer.get_loader_params()
+        key = self._make_checkpoint_key(params)
+        return self._get_checkpoint(params.get("checkpoint"), key) is not None
+
+    def _make_checkpoint_key(self, kw: dict) -> str:
+        """key of the query of a load of params kw, same as checkpoint_key after reset"""
+        fixed_params = dict(self.fixed_params)
+        fixed_params.update((k, kw[k]) for k in self.fixed_keys if k in kw)
+        if layer_usage.is_auto_selection(kw.get("selection")):
+            selection = layer_usage.resolve_selection(kw["selection"], self.layer.iter_layer())
+            self._set_selection(fixed_params, selection)
+        return make_checkpoint_key(fixed_params)
+
+    def _get_checkpoint(self, saved: dict = None, key: str = None) -> dict:
+        """checkpoint of the unfinished load of the same query, committed in the db of the
+        layer, else saved in loader params (project). None if features were removed since.
+
+        :param key: key of the query, defaults to checkpoint_key
+        """
+        key = self.checkpoint_key if key is None else key
+        store = self.layer.get_load_checkpoint()
+        checkpoint = store.get(key) if store is not None else None
+        if checkpoint is None and saved and saved.get("key") == key:
+            checkpoint = saved
+        if checkpoint is None:
+            return None
+        if self.layer.get_feat_cnt() < checkpoint["feat_cnt"]:
+            return None
+        return checkpoint
+
+    def _commit_checkpoint(self):
+        """checkpoint the rendered page, once its features are committed"""
+        checkpoint, self._page_checkpoint = self._page_checkpoint, None
+        if checkpoint is None:
+            return
+        store = self.layer.get_load_checkpoint()
+        vlayer = next(self.layer.iter_layer(), None)
+        writer_thread = self.layer.get_writer_thread(vlayer) if vlayer is not None else None
+        if store is None or writer_thread is None:
+            # features are written already
+            self.layer.update_checkpoint(checkpoint)
+            return
+        writer_thread.submit(
+            store.save,
+            checkpoint,
+            on_committed=lambda _: self.layer.update_checkpoint(checkpoint),
+        )
+
+    def _clear_checkpoint(self):
+        store = self.layer.get_load_checkpoint()
+        if store is not None:
+            store.clear(self.checkpoint_key)
+        self.layer.update_checkpoint(None)
 
     def _config(self, network: NetManager):
         self.config_fun(
             [
-                NetworkFun(network.load_features_iterate),
+                NetworkFun(self.fn_load_features(network)),
                 WorkerFun(network.on_received, self.pool),
                 AsyncFun(self._process_render),
-                WorkerFun(render.parse_feature, self.pool),
+                WorkerFun(self._parse_feature, self.pool),
                 AsyncFun(self._dispatch_render),
                 ParallelFun(self._render_single),
                 AsyncFun(self.post_render),
             ]
         )
 
+    def fn_load_features(self, network: NetManager) -> Callable:
+        def load_features(conn_info: SpaceConnectionInfo, **kw):
+            return self._stream_reply(network.load_features_iterate(conn_info, **kw))
+
+        return load_features
+
+    def _stream_reply(self, reply: QNetworkReply) -> QNetworkReply:
+        """body of the reply is decoded while it is received, see ReplyStream.
+        Features are parsed in batches of STREAM_BATCH_FEAT and rendered before
+        the reply is finished (see _render_batch), the rest is rendered in the chain.
+        Pages of a resumed load are not rendered in batches, see _skip_written"""
+        if not isinstance(reply, QNetworkReply) or reply.isFinished():
+            return reply
+        fn_batch = None if self._verify_written else self._make_batch_parser()
+        stream = net_handler.ReplyStream(reply, self.pool, self.STREAM_BATCH_FEAT, fn_batch)
+        stream.signal.results.connect(make_fun_args(self._render_batch), Qt.QueuedConnection)
+        return reply
+
+    def _make_batch_parser(self) -> Callable:
+        """render.parse_feature of a batch of features (in worker thread), with the args
+        resolved in main thread"""
+        a, kw = parse_qt_args(self._make_parse_args(dict()))
+        map_fields, similarity_threshold = a[1:]
+
+        def parse_batch(features: list):
+            obj = dict(type="FeatureCollection", features=features)
+            return render.parse_feature(obj, map_fields, similarity_threshold, **kw)
+
+        return parse_batch
+
+    def _render_batch(self, map_feat, map_fields, kw_params):
+        """render a batch of features of a reply that is not finished (main thread)"""
+        if self.is_not_running():
+            return
+        for args in self._dispatch_render(map_feat, map_fields, kw_params):
+            self._render_single(*args)
+        self._post_render()
+
     def _check_status(self):
         if self.status == self.FINISHED:
             self._try_finish()
@@ -168,7 +337,8 @@ class LoadLayerController(BaseLoader):
         elif self.status == self.MAX_FEAT:
             self._try_finish()
             return False
-        feat_cnt = self.get_feat_cnt()
+        # features pending in the writer thread are included, not to overshoot max_feat
+        feat_cnt = self.layer.get_feat_cnt(pending=True)
         if self.max_feat is not None and feat_cnt >= self.max_feat:
             self.status = self.MAX_FEAT
             self._try_finish()
@@ -193,6 +363,14 @@ class LoadLayerController(BaseLoader):
 
     def _emit_finish(self):
         BaseLoop._emit_finish(self)
+        # features are written in the writer thread, results once the last ones are committed
+        self.layer.barrier(self._emit_results)
+
+    def _emit_results(self):
+        if self.status != self.FINISHED:
+            return  # loading is restarted
+        self._clear_checkpoint()  # load is complete
+        self.update_scheduler.run_pending()
         token, space_id = self.get_conn_info().get_xyz_space()
         name = self.layer.get_name()
         msg = "%s features loaded. " % (self.get_feat_cnt()) + "Layer: %s. Token: %s" % (
@@ -207,16 +385,58 @@ class LoadLayerController(BaseLoader):
         # check if all feat fetched
         # feat_cnt = len(obj["features"])
         # total_cnt = self.get_feat_cnt()
+        features = obj.get("features") or list()
+        # features rendered in batches are counted as well, see _stream_reply
+        n_feat = len(features) + kw.pop("n_batched", 0)
+        self.params_queue.set_response_size(kw.get("limit"), n_feat, kw.get("body_size"))
+        self.feat_cnt_loaded += n_feat
         if "handle" in obj:
             handle = obj["handle"]
             if not self.params_queue.has_next():
                 self.params_queue.gen_params(handle=handle)
+            self._page_checkpoint = dict(
+                key=self.checkpoint_key,
+                handle=handle,
+                limit=self.params_queue.limit,
+                feat_cnt=self.feat_cnt_loaded,
+            )
         else:
             if self.status == self.LOADING:
                 self.status = self.ALL_FEAT
+        if self._verify_written:
+            # resolved in main thread, written features are skipped in worker thread
+            kw.update(
+                checkpoint_store=self.layer.get_load_checkpoint(),
+                db_layer_names=self.layer.get_db_layer_names(),
+            )
+        return self._make_parse_args(obj, **kw)
+
+    def _parse_feature(self, obj: Geojson, *a, checkpoint_store=None, db_layer_names=None, **kw):
+        """render.parse_feature (in worker thread), features of a resumed load that are
+        written already are skipped first"""
+        if checkpoint_store is not None:
+            features = obj.get("features") or list()
+            obj["features"] = self._skip_written(checkpoint_store, db_layer_names, features)
+            # written pages are verified until a page is not written, see _dispatch_render
+            kw["page_written"] = len(obj["features"]) == 0
+        return render.parse_feature(obj, *a, **kw)
+
+    @staticmethod
+    def _skip_written(store: LoadCheckpoint, db_layer_names: list, features: list) -> list:
+        """skip features written after the checkpoint (in worker thread)"""
+        lst_id = [ft.get(parser.XYZ_ID) for ft in features]
+        written = store.find_written(db_layer_names, lst_id, parser.QGS_XYZ_ID)
+        print_qgis("resume", "skip %s written features" % len(written))
+        return [ft for ft in features if ft.get(parser.XYZ_ID) not in written]
+
+    def _make_parse_args(self, obj: Geojson, **kw):
+        """args of render.parse_feature"""
         map_fields: dict = self.layer.get_map_fields()
         similarity_threshold = self.kw.get("similarity_threshold")
-        return make_qt_args(obj, map_fields, similarity_threshold, **kw)
+        map_fields_cache: dict = self.layer.get_map_fields_cache()
+        return make_qt_args(
+            obj, map_fields, similarity_threshold, map_fields_cache=map_fields_cache, **kw
+        )
 
     # non-threaded
     def _render(self, *parsed_feat):
@@ -229,7 +449,16 @@ class LoadLayerController(BaseLoader):
                     vlayer = self.layer.add_ext_layer(geom, idx)
                 else:
                     vlayer = self.layer.get_layer(geom, idx)
-                render.add_feature_render(vlayer, feat, fields)
+                render.add_feature_render(
+                    vlayer,
+                    feat,
+                    fields,
+                    self.layer.get_fields_remap_cache(vlayer),
+                    self.layer.get_bulk_writer(vlayer),
+                    self.layer.get_feat_counter(vlayer),
+                    self.layer.get_writer_thread(vlayer),
+                    self.update_scheduler,
+                )
 
     def get_feat_cnt(self):
         return self.layer.get_feat_cnt()
@@ -260,6 +489,8 @@ class LoadLayerController(BaseLoader):
     # threaded (parallel)
     def _dispatch_render(self, *parsed_feat):
         map_feat, map_fields, kw_params = parsed_feat
+        if not kw_params.pop("page_written", True):
+            self._verify_written = False
         lst_args = [
             (geom, idx, feat, fields, kw_params)
             for geom in map_feat.keys()
@@ -274,11 +505,22 @@ class LoadLayerController(BaseLoader):
         if self.is_not_running():
             return
         vlayer = self._create_or_get_vlayer(geom, idx)
-        render.add_feature_render(vlayer, feat, fields)
+        render.add_feature_render(
+            vlayer,
+            feat,
+            fields,
+            self.layer.get_fields_remap_cache(vlayer),
+            self.layer.get_bulk_writer(vlayer),
+            self.layer.get_feat_counter(vlayer),
+            self.layer.get_writer_thread(vlayer),
+            self.update_scheduler,
+        )
 
     def _create_or_get_vlayer(self, geom, idx):
         if not self.layer.has_layer(geom, idx):
             vlayer = self.layer.add_ext_layer(geom, idx)
+            if self.is_auto_selection():
+                feature_form_loader.setup_vlayer(vlayer)
         else:
             vlayer = self.layer.get_layer(geom, idx)
         return vlayer
@@ -311,33 +553,228 @@ class LoadLayerController(BaseLoader):
         self.signal.info.emit(make_qt_args(msg, dt=dt))
 
 
+class PartitionedLoadLayerController(LoadLayerController):
+    """Load a whole space with concurrent requests of spatial partitions (bbox).
+    Extent, count and size of the space are given by statistics, see BboxPartitionQueue.
+    Features crossing partitions, or loaded before their partition is refined, are skipped
+    by xyz_id (and upserted by xyz_id on write anyway).
+    Small spaces, spaces without statistics and loading with max_feat use iterate.
+    """
+
+    PARTITION_MIN_FEAT = 50000  # smaller spaces are loaded by iterate
+    PARTITION_LIMIT = 10000  # limit of a bbox request
+    # planned features of a partition per limit, headroom for areas denser than average
+    PARTITION_FEAT_RATIO = 0.5
+    CLS_STAT_CONTROLLER = StatSpaceController
+
+    def __init__(self, network: NetManager, *a, **kw):
+        super().__init__(network, *a, **kw)
+        self.con_stat = self.CLS_STAT_CONTROLLER(network)
+        self.con_stat.signal.results.connect(make_fun_args(self._after_statistics))
+        self.con_stat.signal.error.connect(self._after_statistics_error)
+        self.kw_start: dict = None
+        self.partition: tuple = None  # args of BboxPartitionQueue
+        self._loaded_ids = set()
+
+    def _config(self, network: NetManager):
+        self.config_fun(
+            [
+                NetworkFun(self.fn_load_features(network), limiters),
+                WorkerFun(network.on_received, self.pool),
+                AsyncFun(self._process_render),
+                WorkerFun(self._parse_feature, self.pool),
+                AsyncFun(self._dispatch_render),
+                ParallelFun(self._render_single),
+                AsyncFun(self.post_render),
+            ]
+        )
+
+    def fn_load_features(self, network: NetManager) -> Callable:
+        def load_features(conn_info: SpaceConnectionInfo, **kw):
+            if "bbox" in kw:
+                reply = network.load_features_bbox(conn_info, **kw)
+            else:
+                reply = network.load_features_iterate(conn_info, **kw)
+            return self._stream_reply(reply)
+
+        return load_features
+
+    def _start(self, **kw):
+        self.kw_start = kw
+        self.partition = None
+        if kw.get("max_feat") or self.has_checkpoint():
+            # unfinished iterate load resumes from its checkpoint
+            return super()._start(**kw)
+        # loading starts after statistics
+        self.status = self.LOADING
+        self.con_stat.start(self.get_conn_info())
+        return self.layer
+
+    def _after_statistics(self, conn_info, obj, *a, **kw):
+        if self.status == self.STOPPED:
+            return
+        self.partition = self.plan_partition(obj)
+        print_qgis("partition", self.partition)
+        LoadLayerController._start(self, **self.kw_start)
+
+    def _after_statistics_error(self, err):
+        if self.status == self.STOPPED:
+            return
+        LoadLayerController._start(self, **self.kw_start)
+
+    def plan_partition(self, obj: dict) -> tuple:
+        """args of BboxPartitionQueue from statistics, None to load by iterate"""
+        try:
+            count = obj["count"]["value"]
+            rect = obj["bbox"]["value"]
+        except (KeyError, TypeError):
+            return None
+        if not count or count < self.PARTITION_MIN_FEAT or not rect or len(rect) != 4:
+            return None
+        limit = self.PARTITION_LIMIT
+        byte_size = (obj.get("byteSize") or dict()).get("value")
+        if byte_size:
+            # large features, limit targets the response size of iterate
+            limit = min(limit, int(queue.ByteSizeParamsQueue.TARGET_SIZE * count / byte_size))
+        limit = max(1, limit)
+        feat_per_part = max(1, int(limit * self.PARTITION_FEAT_RATIO))
+        return tuple(rect), count, limit, feat_per_part
+
+    def reset(self, **kw):
+        super().reset(**kw)
+        self._loaded_ids = set()
+        if self.partition is not None:
+            self.params_queue = queue.BboxPartitionQueue(*self.partition)
+            self._verify_written = False
+
+    def is_partitioned(self) -> bool:
+        return isinstance(self.params_queue, queue.BboxPartitionQueue)
+
+    def get_n_parallel(self) -> int:
+        # iterate pages depend on the handle of the previous page
+        return super().get_n_parallel() if self.is_partitioned() else 1
+
+    def _has_pending_params(self):
+        return self.is_partitioned() and self.params_queue.has_next()
+
+    def _run(self):
+        if not self.is_partitioned():
+            return super()._run()
+        self.layer.refresh_map_fields()  # ensure map fields is updated from provider
+        if not self.params_queue.has_next():
+            # partitions in flight might still be refined, the last loop finishes
+            self._try_finish()
+            return
+        params = self.params_queue.get_params()
+        LoopController.start(self, self.get_conn_info(), **params, **self.fixed_params)
+
+    def _process_render(self, obj: Geojson, *a, **kw):
+        if "bbox" not in kw:
+            return super()._process_render(obj, *a, **kw)
+        features = obj.get("features") or list()
+        n_feat = len(features) + kw.pop("n_batched", 0)
+        limit = kw.get("limit") or 0
+        # full response: there might be more features, load the parts of the partition
+        is_split = 0 < limit <= n_feat and self.params_queue.split_params(**kw)
+        features = [ft for ft in features if ft.get(parser.XYZ_ID) not in self._loaded_ids]
+        # a point is in a single partition, unless it is loaded again in the parts
+        self._loaded_ids.update(
+            ft.get(parser.XYZ_ID)
+            for ft in features
+            if is_split or (ft.get("geometry") or dict()).get("type") != "Point"
+        )
+        obj["features"] = features
+        return self._make_parse_args(obj, **kw)
+
+    def _render_batch(self, map_feat, map_fields, kw_params):
+        # split of the partition is unknown before the reply is finished, ids of points are
+        # kept as well
+        for lst_feat in map_feat.values():
+            for i, feat in enumerate(lst_feat):
+                feat = [
+                    ft for ft in feat if ft.attribute(parser.QGS_XYZ_ID) not in self._loaded_ids
+                ]
+                self._loaded_ids.update(ft.attribute(parser.QGS_XYZ_ID) for ft in feat)
+                lst_feat[i] = feat
+        super()._render_batch(map_feat, map_fields, kw_params)
+
+    def _retry(self, reply: QNetworkReply):
+        limit, bbox = net_handler.get_qt_property(reply, ["limit", "bbox"])
+        if bbox is None:
+            return super()._retry(reply)
+        # e.g. timeout of a dense partition, load its parts instead
+        if not self.params_queue.split_params(limit=limit, bbox=bbox):
+            self.params_queue.gen_retry_params(limit=limit, bbox=bbox)
+        self._run_loop()
+
+
 class TileLayerLoader(LoadLayerController):
+    RENDER_FLUSH_DELAY = 300  # ms, max delay of rendering queued features
+    RENDER_FLUSH_FEAT = 10000  # number of queued features that triggers rendering
+    RELOAD_LOADED_TILES = False  # loaded tiles are kept when the view changes
+    # response status of a server (or layer) that does not serve mvt tiles
+    MVT_UNSUPPORTED_STATUS = (406, 415, 501)
+
     def __init__(self, network: NetManager, *a, layer: XYZLayer = None, **kw):
         super().__init__(network, *a, **kw)
         self.fixed_keys = ["tags", "limit", "tile_schema", "filters", "selection"]
-        self.params_queue = queue.SimpleQueue(key="tile_id")  # dont have retry logic
+        self.params_queue = queue.ViewportTileQueue(
+            key="tile_id", reload_loaded=self.RELOAD_LOADED_TILES
+        )
         self.layer = layer
         self.total_params = 0
         self.cnt_params = 0
         self.feat_cnt = 0
+        self.tile_ids = list()  # tiles of the current view
+        # parts of mvt features clipped by tiles of the view
+        self.tile_parts = mvt_decoder.TilePartMerger(fn_dissolve=parser.dissolve_geometry)
+        # features of concurrent tile responses are rendered together
+        self.render_queue = render.RenderQueue(max_feat=self.RENDER_FLUSH_FEAT)
+        self.render_timer = QTimer()
+        self.render_timer.setSingleShot(True)
+        self.render_timer.setInterval(self.RENDER_FLUSH_DELAY)
+        self.render_timer.timeout.connect(self._flush_render)
         self._config(network)
 
         if layer:
             self._config_layer_callback(layer)
+            self._config_limiter(network, layer)
 
     def _config(self, network: NetManager):
         self.config_fun(
             [
-                NetworkFun(network.load_features_tile),
+                NetworkFun(self.fn_load_features(network), limiters),
                 WorkerFun(network.on_received, self.pool),
                 AsyncFun(self._process_render),
-                WorkerFun(render.parse_feature, self.pool),
+                WorkerFun(self._parse_tile, self.pool),
                 AsyncFun(self._dispatch_render),
                 ParallelFun(self._render_single),
                 AsyncFun(self.post_render),
             ]
         )
 
+    def fn_load_features(self, network: NetManager) -> Callable:
+        def load_features(conn_info: SpaceConnectionInfo, **kw):
+            reply = network.load_features_tile(conn_info, **kw)
+            if kw.get("tile_format") == mvt_decoder.TILE_FORMAT_MVT:
+                return reply  # mvt body is decoded once received, see NetworkResponse
+            return self._stream_reply(reply)
+
+        return load_features
+
+    def _stream_reply(self, reply: QNetworkReply) -> QNetworkReply:
+        """body of the reply is decoded while it is received, see ReplyStream.
+        Features of a tile are rendered together, e.g. mvt parts or live tiles are replaced"""
+        if isinstance(reply, QNetworkReply) and not reply.isFinished():
+            net_handler.ReplyStream(reply, self.pool)
+        return reply
+
+    def _parse_tile(self, obj: Geojson, *a, **kw):
+        """threaded: merge parts of mvt features clipped by tiles, parse features"""
+        if kw.get("tile_format") == mvt_decoder.TILE_FORMAT_MVT and "features" in obj:
+            self.tile_parts.merge(kw.get("tile_id"), obj["features"])
+        return render.parse_feature(obj, *a, **kw)
+
     def _check_status(self):
         if not self.params_queue.has_next():
             if self.status == self.LOADING:
@@ -357,10 +794,9 @@ class TileLayerLoader(LoadLayerController):
         self.cnt_params += 1
         if "features" in obj:
             self.feat_cnt += len(obj["features"])
-
-        map_fields: dict = self.layer.get_map_fields()
-        similarity_threshold = self.kw.get("similarity_threshold")
-        return make_qt_args(obj, map_fields, similarity_threshold, **kw)
+        if not self.is_not_running():
+            self.params_queue.set_done(kw.get("tile_id"))
+        return self._make_parse_args(obj, **kw)
 
     def reset(self, **kw):
         """
@@ -371,8 +807,12 @@ class TileLayerLoader(LoadLayerController):
 
         self.kw = kw
         self.fixed_params.update((k, kw[k]) for k in self.fixed_keys if k in kw)
+        self.fixed_params["tile_format"] = self._get_tile_format(**kw)
+        self.tile_parts.clear()
+        self._resolve_selection()
 
         lst: list = kw.pop("tile_ids")
+        self.tile_ids = list(lst)
         params = [dict(tile_id=i) for i in lst]
 
         self.params_queue.set_params(params)  # dont have retry logic
@@ -383,14 +823,140 @@ class TileLayerLoader(LoadLayerController):
         # print_qgis("cache", self.params_queue._cache)
         # print_qgis("queue", self.params_queue._queue)
 
+    def _get_tile_format(self, tile_format=None, tile_schema=None, **kw) -> str:
+        """tile format of the layer (e.g. after fallback) or of plugin settings,
+        mvt is only decoded for web tile schema"""
+        tile_format = tile_format or shared_network.tile_format
+        if tile_format == mvt_decoder.TILE_FORMAT_MVT and tile_schema == "web":
+            return mvt_decoder.TILE_FORMAT_MVT
+        return mvt_decoder.TILE_FORMAT_GEOJSON
+
+    def update_tiles(self, **kw):
+        """Update tiles to be loaded for the new view (tile_ids), without restart.
+        Tiles in flight that left the view are canceled, the ones still visible keep
+        loading, other tiles are queued by distance to the view centre.
+        """
+        if self.layer is None:
+            raise InvalidXYZLayerError()
+        if self.status == self.STOPPED:
+            return self.restart(**kw)
+        self.tile_ids = list(kw["tile_ids"])
+        params = [dict(tile_id=i) for i in kw["tile_ids"]]
+        lst_cancel = set(self.params_queue.update_view(params))
+        # parts of tiles that left the view are not merged anymore
+        self.tile_parts.retain(self.tile_ids)
+        n_queued = self.params_queue.count_queued()
+        print_qgis("update tiles", n_queued, "queued", len(lst_cancel), "canceled")
+        if lst_cancel:
+            # canceled replies are ignored in _retry, that continues run loop
+            self.lst_fun[0].abort(
+                lambda reply: net_handler.get_qt_property(reply, ["tile_id"])[0] in lst_cancel
+            )
+        if self.count_active() == 0:
+            self.total_params = n_queued
+            self.cnt_params = 0
+            self.feat_cnt = 0
+            if n_queued:
+                BaseLoader.reset(self)
+                self.dispatch_parallel(n_parallel=self.get_n_parallel())
+        else:
+            self.total_params = self.cnt_params + n_queued + self.params_queue.count_inflight()
+            if n_queued and self.status == self.ALL_FEAT:
+                self.status = self.LOADING
+        return self.layer
+
+    def _has_pending_params(self):
+        return self.params_queue.has_next()
+
     def _retry(self, reply: QNetworkReply):
+        tile_id, tile_format = net_handler.get_qt_property(reply, ["tile_id", "tile_format"])
+        self.params_queue.set_failed(tile_id)
+        self.tile_parts.evict([tile_id])
+        if tile_format == mvt_decoder.TILE_FORMAT_MVT and self._is_mvt_unsupported(reply):
+            self._fallback_to_geojson()
+            self.params_queue.update_view([dict(tile_id=i) for i in self.tile_ids])
+            self.total_params = (
+                self.cnt_params
+                + self.params_queue.count_queued()
+                + self.params_queue.count_inflight()
+            )
         # ignore error, continue run loop
         self._run_loop()
 
+    def _is_mvt_unsupported(self, reply: QNetworkReply) -> bool:
+        status = net_handler.NetworkResponse(reply).get_status()
+        return status in self.MVT_UNSUPPORTED_STATUS
+
+    def _fallback_to_geojson(self):
+        """load next tiles as geojson. The tile format is kept in loader params of the
+        layer (saved in project)"""
+        if self.fixed_params.get("tile_format") != mvt_decoder.TILE_FORMAT_MVT:
+            return  # already, e.g. other mvt tiles in flight failed
+        print_qgis("mvt not supported, fallback to geojson", self.layer.get_name())
+        self.fixed_params["tile_format"] = mvt_decoder.TILE_FORMAT_GEOJSON
+        self.layer.update_loader_params(tile_format=mvt_decoder.TILE_FORMAT_GEOJSON)
+
+    def _render_single(self, geom, idx, feat, fields, kw_params):
+        if not feat:
+            return
+        if self.is_not_running():
+            return
+        vlayer = self._create_or_get_vlayer(geom, idx)
+        self.render_queue.put(
+            vlayer,
+            feat,
+            fields,
+            self.layer.get_fields_remap_cache(vlayer),
+            self.layer.get_bulk_writer(vlayer),
+            self.layer.get_feat_counter(vlayer),
+            self.layer.get_writer_thread(vlayer),
+            self.update_scheduler,
+        )
+        if self.render_queue.is_full():
+            self._flush_render()
+        elif not self.render_timer.isActive():
+            self.render_timer.start()
+
+    def post_render(self, *a, **kw):
+        if self.is_not_running():
+            return
+        # queued features are repainted after flush
+        if self.render_queue.size() == 0:
+            self._post_render()
+
+    def _flush_render(self):
+        self.render_timer.stop()
+        if self.status == self.STOPPED:
+            self.render_queue.clear()
+            return
+        if self.render_queue.size() == 0:
+            return
+        try:
+            self.render_queue.flush()
+        except Exception as err:
+            self.signal.error.emit(make_exception_obj(err))
+            return
+        self._post_render()
+
+    def stop_loading(self):
+        super().stop_loading()
+        # discard queued features, e.g. layer is deleted or in editing mode
+        self.render_timer.stop()
+        self.render_queue.clear()
+        self.params_queue.forget()
+
     def _emit_finish(self):
+        self._flush_render()
         BaseLoop._emit_finish(self)
         if self.count_active() > 0:
             return
+        # only the last flushed features are still being written
+        self.layer.barrier(self._emit_results)
+
+    def _emit_results(self):
+        if self.count_active() > 0:
+            return  # loading of the next view is started
+        self.update_scheduler.run_pending()
         token, space_id = self.get_conn_info().get_xyz_space()
         name = self.layer.get_name()
         cnt = min(self.cnt_params, self.total_params)
@@ -407,8 +973,13 @@ class TileLayerLoader(LoadLayerController):
             start_editing=self._start_editing,
             end_editing=self._continue_parallel_loop,
             stop_loading=self.stop_loading,
+            usage_changed=self._cb_usage_changed,
         )
 
+    def _reload_selection(self):
+        # tiles of the view are loaded again, with the new selection
+        self.restart(tile_ids=list(self.tile_ids))
+
     def _start_editing(self):
         self.stop_loading()
         self.show_info_msg(
@@ -424,28 +995,117 @@ class TileLayerLoader(LoadLayerController):
     def _continue_parallel_loop(self):
         if self.count_active() == 0:
             BaseLoader.reset(self)
-            self.dispatch_parallel(n_parallel=self.n_parallel)
+            self.dispatch_parallel(n_parallel=self.get_n_parallel())
 
 
 class LiveTileLayerLoader(TileLayerLoader):
-    def __init__(self, *a, **kw):
-        super().__init__(*a, **kw)
-        self.params_queue = queue.SimpleQueue(key="tile_id")  # dont have retry logic
+    RELOAD_LOADED_TILES = True  # live data, visible tiles are loaded again
+
+    def reset(self, **kw):
+        super().reset(**kw)
+        # live data: cached tiles are always revalidated (ETag)
+        self.fixed_params.update(max_age=0)
 
     def _render_single(self, geom, idx, feat, fields, kw_params):
         if self.is_not_running():
             return
         tile_id = kw_params.get("tile_id")
-        tile_schema = kw_params.get("tile_schema")
-        lrc = tile_utils.parse_tile_id(tile_id, schema=tile_schema)
-        rcl = [lrc[k] for k in ["row", "col", "level"]]
-        extent = tile_utils.extent_from_row_col(*rcl, schema=tile_schema)
         vlayer = self._create_or_get_vlayer(geom, idx)
-        render.clear_features_in_extent(vlayer, QgsRectangle(*extent))
-        # if no feat received, only clear the current extent
+        tile_index = self.layer.get_tile_index(vlayer)
+        bulk_writer = self.layer.get_bulk_writer(vlayer)
+        writer_thread = self.layer.get_writer_thread(vlayer)
+        if feat and bulk_writer is not None and writer_thread is not None:
+            # ownership of the tile and its features are replaced in one transaction
+            render.add_feature_render(
+                vlayer,
+                feat,
+                fields,
+                self.layer.get_fields_remap_cache(vlayer),
+                bulk_writer,
+                self.layer.get_feat_counter(vlayer),
+                writer_thread,
+                self.update_scheduler,
+                tile_index=tile_index,
+                tile_id=tile_id,
+            )
+            return
+        # replace features owned by the tile, features shared with other tiles are kept
+        render.replace_tile_features(
+            vlayer,
+            tile_index,
+            tile_id,
+            [ft.attribute(parser.QGS_XYZ_ID) for ft in feat or list()],
+            self.layer.get_feat_counter(vlayer),
+            bulk_writer,
+            writer_thread,
+            self.update_scheduler,
+        )
+        # if no feat received, only clear the current tile
         if not feat:
             return
-        render.add_feature_render(vlayer, feat, fields)
+        render.add_feature_render(
+            vlayer,
+            feat,
+            fields,
+            self.layer.get_fields_remap_cache(vlayer),
+            bulk_writer,
+            self.layer.get_feat_counter(vlayer),
+            writer_thread,
+            self.update_scheduler,
+        )
+
+
+class LoadFeatureController(ChainController):
+    """Load all properties of features of a layer loaded with a property selection,
+    e.g. the attribute form of a feature is opened. Features are upserted by xyz_id.
+    Args:
+        layer: XYZLayer
+        vlayer: vlayer of the features
+        lst_id: xyz id of features
+    """
+
+    def __init__(self, network: NetManager):
+        super().__init__()
+        self.pool = QThreadPool()  # .globalInstance() will crash afterward
+        self.layer: XYZLayer = None
+        self.vlayer: QgsVectorLayer = None
+        self._config(network)
+
+    def start(self, layer: XYZLayer, vlayer: QgsVectorLayer, lst_id: list):
+        if vlayer is None:
+            raise InvalidQgsLayerError()
+        self.layer = layer
+        self.vlayer = vlayer
+        super().start(layer.get_conn_info(), lst_id)
+
+    def _config(self, network: NetManager):
+        self.config_fun(
+            [
+                NetworkFun(network.load_features_by_id),
+                WorkerFun(network.on_received, self.pool),
+                AsyncFun(self._render),
+            ]
+        )
+
+    def _render(self, obj: Geojson, *a, **kw):
+        vlayer = self.vlayer
+        fields = QgsFields()
+        for field in parser.non_expression_fields(vlayer.fields()):
+            fields.append(field)
+        # new properties are appended to fields
+        feat = [parser.xyz_json_to_feature(ft, fields) for ft in obj.get("features") or list()]
+        if feat:
+            render.add_feature_render(
+                vlayer,
+                feat,
+                fields,
+                self.layer.get_fields_remap_cache(vlayer),
+                self.layer.get_bulk_writer(vlayer),
+                self.layer.get_feat_counter(vlayer),
+                self.layer.get_writer_thread(vlayer),
+                update_scheduler,
+            )
+        return make_qt_args(vlayer, [ft.attribute(parser.QGS_XYZ_ID) for ft in feat])
 
 
 ########################
@@ -513,12 +1173,17 @@ class UploadLayerController(BaseLoop):
     def _config(self, network: NetManager):
         self.config_fun(
             [
-                NetworkFun(network.add_features),
+                WorkerFun(self._make_payload, self.pool),
+                NetworkFun(network.add_features, limiters),
                 WorkerFun(network.on_received, self.pool),
                 AsyncFun(self._process),
             ]
         )
 
+    def _make_payload(self, conn_info: SpaceConnectionInfo, feat, **kw):
+        """compress payload in worker thread, queued payload stays as is for retry"""
+        return make_qt_args(conn_info, make_upload_payload(feat), **kw)
+
     def _process(self, obj: Geojson, *a):
         self.feat_cnt += len(obj["features"])
 
@@ -533,7 +1198,7 @@ class UploadLayerController(BaseLoop):
 
         if self.count_active() == 0:
             BaseLoop.reset(self)
-        self.dispatch_parallel(n_parallel=self.n_parallel)
+        self.dispatch_parallel(n_parallel=self.get_n_parallel())
 
     def _run_loop(self):
         if self.status == self.STOPPED:
@@ -542,11 +1207,16 @@ class UploadLayerController(BaseLoop):
         if not self.lst_added_feat.has_next():
             self._try_finish()
             return
+        if not self._adapt_parallel():
+            return
 
         conn_info: dict = self.get_conn_info()
         feat: list = self.lst_added_feat.get_params()
         LoopController.start(self, conn_info, feat, **self.fixed_params)
 
+    def _has_pending_params(self):
+        return self.lst_added_feat.has_next()
+
     def get_conn_info(self):
         return self.conn_info
 
@@ -582,7 +1252,7 @@ class EditSyncController(UploadLayerController):
         self.feat_cnt_del = 0
         if self.count_active() == 0:
             BaseLoop.reset(self)
-        self.dispatch_parallel(n_parallel=self.n_parallel)
+        self.dispatch_parallel(n_parallel=self.get_n_parallel())
 
     def fn_sync_feature(self, network: NetManager) -> Callable:
         def sync_feature(conn_info: SpaceConnectionInfo, **kw):
@@ -600,6 +1270,8 @@ class EditSyncController(UploadLayerController):
             self._handle_error(ManualInterrupt())
             return
 
+        if not self._adapt_parallel():
+            return
         conn_info = self.get_conn_info()
         if not self.lst_added_feat.has_next():
             if self.removed_feat.has_next():
@@ -617,12 +1289,22 @@ class EditSyncController(UploadLayerController):
     def _config(self, network: NetManager):
         self.config_fun(
             [
-                NetworkFun(self.fn_sync_feature(network)),
+                WorkerFun(self._make_payload, self.pool),
+                NetworkFun(self.fn_sync_feature(network), limiters),
                 WorkerFun(network.on_received, self.pool),
                 AsyncFun(self._process),
             ]
         )
 
+    def _make_payload(self, conn_info: SpaceConnectionInfo, **kw):
+        if "add" in kw:
+            feat, params = kw["add"]
+            kw["add"] = (make_upload_payload(feat), params)
+        return make_qt_args(conn_info, **kw)
+
+    def _has_pending_params(self):
+        return self.lst_added_feat.has_next() or self.removed_feat.has_next()
+
     def _process(self, obj: Geojson, *a):
         self.layer_cache.update_progress(obj)
         if "features" not in obj:
@@ -652,7 +1334,7 @@ class EditAddController(UploadLayerController):
 
         if self.count_active() == 0:
             BaseLoop.reset(self)
-        self.dispatch_parallel(n_parallel=self.n_parallel)
+        self.dispatch_parallel(n_parallel=self.get_n_parallel())
 
     def _emit_finish(self):
         BaseLoop._emit_finish(self)
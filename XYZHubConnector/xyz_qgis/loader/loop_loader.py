@@ -13,6 +13,7 @@ from qgis.PyQt.QtCore import QTimer
 from ..controller import (
     AsyncFun,
     LoopController,
+    NetworkFun,
     make_exception_obj,
     make_qt_args,
     parse_qt_args,
@@ -82,6 +83,8 @@ class ParallelWrapper:
 
 
 class ParallelLoop(LoopController, ParallelWrapper):
+    GROW_DELAY = 10  # ms, between loops dispatched when the window grows
+
     def __init__(self):
         LoopController.__init__(self)
         ParallelWrapper.__init__(self)
@@ -89,6 +92,64 @@ class ParallelLoop(LoopController, ParallelWrapper):
     def _run_single(self):
         self._run_loop()
 
+    def get_limiter(self):
+        """limiter of requests in flight (AIMD), from the network function of the chain"""
+        for fun in self.lst_fun or list():
+            if isinstance(fun, NetworkFun):
+                return fun.limiter
+        return None
+
+    def set_host(self, host: str):
+        """host of the network function of the chain, whose limiter is used before the
+        first request, see get_n_parallel"""
+        for fun in self.lst_fun or list():
+            if isinstance(fun, NetworkFun):
+                fun.set_host(host)
+
+    def get_n_parallel(self) -> int:
+        """number of loops to run in parallel, window of limiter if any"""
+        limiter = self.get_limiter()
+        return self.n_parallel if limiter is None else limiter.get_window()
+
+    def _has_pending_params(self) -> bool:
+        """True if another loop can start now, i.e. params do not depend on replies"""
+        return False
+
+    def _count_free(self) -> int:
+        """number of loops that can start besides the current one: up to get_n_parallel,
+        and up to the window of limiter, whose requests in flight (in_flight) include those
+        of other loaders of the host. Negative if the current loop exceeds them."""
+        n_free = self.get_n_parallel() - self.count_active()
+        limiter = self.get_limiter()
+        if limiter is not None:
+            # request of the current loop is not in flight yet
+            n_free = min(n_free, limiter.get_window() - limiter.in_flight - 1)
+        return n_free
+
+    def _adapt_parallel(self) -> bool:
+        """grow or shrink the number of active loops, see _count_free.
+        The last active loop always goes on, not to stall the loader.
+
+        :return: False if the current loop is ended
+        """
+        n_free = self._count_free()
+        if n_free < 0 and self.count_active() > 1:
+            self._release()
+            return False
+        if n_free > 0 and self._has_pending_params():
+            self.dispatch_parallel(delay=self.GROW_DELAY, n_parallel=n_free)
+        return True
+
+    def _can_dispatch(self, n_dispatched: int) -> bool:
+        """True if a loop can be dispatched, after n_dispatched loops not yet sent"""
+        n_active = self.count_active()
+        if n_active == 0:
+            return True  # first loop of the loader
+        if not n_active < self.get_n_parallel():
+            return False
+        limiter = self.get_limiter()
+        return limiter is None or limiter.in_flight + n_dispatched < limiter.get_window()
+
     def _emit_progress_start(self):
         self.signal.progress.emit(0)
 
@@ -97,7 +158,7 @@ class ParallelLoop(LoopController, ParallelWrapper):
 
     def dispatch_parallel(self, delay=100, delay_offset=1, n_parallel=1):
         for i in range(n_parallel):
-            if not self.count_active() < self.n_parallel:
+            if not self._can_dispatch(i):
                 return
             n_active = self._reserve()
             print_qgis("dispatch con", n_active)
@@ -187,6 +248,8 @@ class BaseLoop(ParallelLoop):
             return
         if not self._check_status():
             return
+        if not self._adapt_parallel():
+            return
         self._run()
 
     def _emit_finish(self):
@@ -214,7 +277,7 @@ class BaseLoop(ParallelLoop):
         # if self.count_active() == 0:
         # parallel dispatch might fail
         self.reset(**kw)
-        self.dispatch_parallel(n_parallel=self.n_parallel)
+        self.dispatch_parallel(n_parallel=self.get_n_parallel())
 
 
 class BaseLoader(BaseLoop):
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+# Copyright (c) 2019 HERE Europe B.V.
+#
+# SPDX-License-Identifier: MIT
+# License-Filename: LICENSE
+#
+###############################################################################
+
+"""Adaptive number of requests in flight (AIMD), per host.
+
+The window grows additively (about +1 per window of successful replies) while the
+latency stays close to the best latency seen, and is cut multiplicatively on
+congestion (timeout, 429, 5xx), at most once per round trip.
+"""
+
+import threading
+from typing import Callable, Dict, List
+
+from ..common import config
+
+DEFAULT_MAX_WINDOW = 8  # ceiling of a host, unless set_ceiling
+MIN_WINDOW = 1
+INITIAL_WINDOW = 2
+INCREASE = 1.0  # window increase per window of successes
+DECREASE = 0.5  # window factor on congestion
+# latency is healthy below this factor of the base (best) latency
+LATENCY_FACTOR = 2.0
+# weight of a new sample in the smoothed latency
+LATENCY_ALPHA = 0.2
+# base latency slowly follows the smoothed latency, e.g. after the route changed
+BASE_DRIFT = 0.01
+
+
+def is_congestion(status: int = None, is_timeout: bool = False) -> bool:
+    """timeout, too many requests or server error"""
+    return is_timeout or status == 429 or (status is not None and status >= 500)
+
+
+class AIMDLimiter(object):
+    """Window of requests in flight to a host, adapted by reply latency and status.
+
+    Requests in flight (in_flight) are counted by their sender (reserve, release), so
+    that loaders of the same host share the window.
+    """
+
+    def __init__(self, max_window: int = DEFAULT_MAX_WINDOW, initial: float = INITIAL_WINDOW):
+        self.max_window = max_window
+        self.window = float(max(MIN_WINDOW, min(initial, max_window)))
+        self.latency = None  # smoothed latency (s)
+        self.base_latency = None
+        self._t_decrease = None  # time of last decrease
+        self.in_flight = 0
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[int], None]] = list()
+
+    def add_listener(self, fn: Callable[[int], None]):
+        """fn(window) is called when the integer window changes"""
+        self._listeners.append(fn)
+
+    def get_window(self) -> int:
+        return int(self.window)
+
+    def reserve(self):
+        """a request is sent"""
+        with self._lock:
+            self.in_flight += 1
+
+    def release(self):
+        """a request is finished or aborted"""
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+
+    def is_latency_healthy(self) -> bool:
+        if self.latency is None:
+            return True
+        return self.latency <= LATENCY_FACTOR * self.base_latency
+
+    def on_reply(self, t_sent: float, t_done: float, status: int = None, is_timeout=False):
+        """
+        :param t_sent, t_done: monotonic time of request sent and reply finished
+        :param status: http status, None if no reply (e.g. connection error)
+        """
+        if is_congestion(status, is_timeout):
+            self.on_congestion(t_sent, t_done)
+        elif status is not None and status < 400:
+            self.on_success(t_done - t_sent)
+        # other errors (e.g. 4xx) say nothing about the load of the host
+
+    def on_success(self, latency: float):
+        with self._lock:
+            old = self.get_window()
+            if self.latency is None:
+                self.latency = self.base_latency = latency
+            else:
+                self.latency += LATENCY_ALPHA * (latency - self.latency)
+                self.base_latency = min(
+                    latency, self.base_latency + BASE_DRIFT * (self.latency - self.base_latency)
+                )
+            if self.is_latency_healthy():
+                self.window = min(self.max_window, self.window + INCREASE / self.window)
+            new = self.get_window()
+        self._notify(old, new)
+
+    def on_congestion(self, t_sent: float, t_done: float):
+        """decrease window, once for the requests sent before the last decrease"""
+        with self._lock:
+            if self._t_decrease is not None and t_sent < self._t_decrease:
+                return  # same congestion event
+            old = self.get_window()
+            self.window = max(MIN_WINDOW, self.window * DECREASE)
+            self._t_decrease = t_done
+            new = self.get_window()
+        self._notify(old, new)
+
+    def set_max_window(self, max_window: int):
+        old = self.get_window()
+        self.max_window = max(MIN_WINDOW, max_window)
+        self.window = min(self.window, self.max_window)
+        self._notify(old, self.get_window())
+
+    def _notify(self, old, new):
+        if old == new:
+            return
+        for fn in self._listeners:
+            fn(new)
+
+
+class HostLimiters(object):
+    """AIMDLimiter of each host, with per-host ceiling"""
+
+    def __init__(self, max_window: int = DEFAULT_MAX_WINDOW):
+        self.max_window = max_window
+        self._ceilings: Dict[str, int] = dict()
+        self._limiters: Dict[str, AIMDLimiter] = dict()
+        self._listeners: List[Callable[[str, int], None]] = list()
+
+    def get(self, host: str) -> AIMDLimiter:
+        limiter = self._limiters.get(host)
+        if limiter is None:
+            limiter = AIMDLimiter(self._ceilings.get(host, self.max_window))
+            limiter.add_listener(lambda window: self._notify(host, window))
+            self._limiters[host] = limiter
+        return limiter
+
+    def set_ceiling(self, host: str, max_window: int):
+        self._ceilings[host] = max_window
+        if host in self._limiters:
+            self._limiters[host].set_max_window(max_window)
+
+    def set_default_ceiling(self, max_window: int):
+        self.max_window = max_window
+        for host, limiter in self._limiters.items():
+            if host not in self._ceilings:
+                limiter.set_max_window(max_window)
+
+    def load_settings(self):
+        """read ceiling of all hosts from plugin settings, if any"""
+        max_window = config.get_plugin_setting("max_parallel_requests")
+        if max_window is not None:
+            self.set_default_ceiling(int(max_window))
+
+    def add_listener(self, fn: Callable[[str, int], None]):
+        """fn(host, window) is called when the window of a host changes"""
+        self._listeners.append(fn)
+
+    def remove_listener(self, fn: Callable[[str, int], None]):
+        if fn in self._listeners:
+            self._listeners.remove(fn)
+
+    def get_windows(self) -> Dict[str, int]:
+        return {host: limiter.get_window() for host, limiter in self._limiters.items()}
+
+    def _notify(self, host, window):
+        for fn in self._listeners:
+            fn(host, window)
+
+
+limiters = HostLimiters()
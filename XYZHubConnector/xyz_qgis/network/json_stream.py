@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+# Copyright (c) 2019 HERE Europe B.V.
+#
+# SPDX-License-Identifier: MIT
+# License-Filename: LICENSE
+#
+###############################################################################
+
+"""Incremental decoder of (gzip) json response body.
+
+Bytes of the body are fed in bounded chunks. A top-level json object
+is decoded key by key, features of a FeatureCollection are decoded one by one,
+so that only the undecoded tail of the body is kept in memory.
+Any other body (json array, html error page, ...) is kept as text and decoded at the end.
+Decoded features can be taken in batches (pop_features) before the body is complete.
+"""
+
+import codecs
+import json
+import re
+import zlib
+
+GZIP_MAGIC = b"\037\213"
+_GZIP_WBITS = 16 + zlib.MAX_WBITS
+_WS = re.compile(r"[ \t\n\r]*")
+
+# decoder states
+_START = 0
+_FIRST_KEY = 1  # expect key or end of object
+_KEY = 2
+_COLON = 3
+_VALUE = 4
+_NEXT_KEY = 5  # expect "," or end of object
+_FIRST_FEATURE = 6  # expect feature or end of features array
+_FEATURE = 7
+_NEXT_FEATURE = 8  # expect "," or end of features array
+_END = 9
+
+
+class JsonStreamDecoder(object):
+    FEATURES_KEY = "features"
+
+    def __init__(self):
+        self._json = json.JSONDecoder()
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._head = b""
+        self._unzip = None  # None: undecided, False: plain body
+        self._buf = ""
+        self._pos = 0
+        self._pending = list()
+        self._pending_len = 0
+        self._retry_len = 0  # buffer length to retry decoding an incomplete value
+        self._state = _START
+        self._key = None
+        self._passthrough = None  # list of text chunks of non-object body
+        self._invalid = False
+        self._error = None
+        self.obj = dict()
+        self.text = None
+        self.size = 0  # decoded (uncompressed) bytes
+
+    def is_started(self):
+        return self._unzip is not None or len(self._head) > 0
+
+    def set_passthrough(self):
+        """keep the whole body as text, e.g. error response. Call before feeding any data"""
+        if self._passthrough is None:
+            self._passthrough = [self._buf[self._pos :]]
+            self._buf, self._pos = "", 0
+
+    def feed(self, byt: bytes):
+        if self._error is not None:
+            return
+        try:
+            byt = self._decompress(byt)
+            self.size += len(byt)
+            self._feed_txt(self._utf8.decode(byt))
+        except Exception as e:
+            # raise later in finish(), once the whole body is fed
+            self._error = e
+
+    def count_features(self) -> int:
+        """number of decoded features, that are not popped yet"""
+        return len(self.obj.get(self.FEATURES_KEY) or tuple())
+
+    def pop_features(self, limit: int = None) -> list:
+        """remove and return the first decoded features (at most limit), e.g. to process
+        a batch of features before the whole body is fed. Object returned by finish
+        only contains the features that are not popped"""
+        features = self.obj.get(self.FEATURES_KEY) or list()
+        limit = len(features) if limit is None else limit
+        batch = features[:limit]
+        del features[:limit]
+        return batch
+
+    def finish(self) -> dict:
+        """decode remaining body, returns decoded json object (empty dict if invalid json)
+
+        :raises: error of decompression or utf-8 decoding (same as decode_byte)
+        """
+        if self._error is None:
+            try:
+                byt = self._decompress(b"", final=True)
+                self.size += len(byt)
+                txt = self._utf8.decode(byt, final=True)
+                self._feed_txt(txt, final=True)
+            except Exception as e:
+                self._error = e
+        if self._error is not None:
+            raise self._error
+        return self.obj
+
+    def _decompress(self, byt, final=False):
+        if self._unzip is None:
+            self._head += byt
+            if len(self._head) < len(GZIP_MAGIC) and not final:
+                return b""
+            byt, self._head = self._head, b""
+            self._unzip = zlib.decompressobj(_GZIP_WBITS) if byt[:2] == GZIP_MAGIC else False
+        if not self._unzip:
+            return byt
+        out = list()
+        while byt:
+            out.append(self._unzip.decompress(byt))
+            if not self._unzip.eof:
+                break
+            # multi-member gzip, same as gzip.decompress
+            byt = self._unzip.unused_data
+            self._unzip = zlib.decompressobj(_GZIP_WBITS)
+        return b"".join(out)
+
+    def _feed_txt(self, txt, final=False):
+        if self._passthrough is not None:
+            self._passthrough.append(txt)
+            if final:
+                self._finish_passthrough()
+            return
+        if txt and not self._invalid:
+            self._pending.append(txt)
+            self._pending_len += len(txt)
+        if not final and len(self._buf) - self._pos + self._pending_len < self._retry_len:
+            return
+        self._buf = self._buf[self._pos :] + "".join(self._pending)
+        self._pos = 0
+        self._pending = list()
+        self._pending_len = 0
+        self._retry_len = 0
+        if not self._invalid:
+            try:
+                self._decode(final)
+            except json.JSONDecodeError:
+                self._invalid = True
+                self._buf = ""
+        if self._passthrough is not None:
+            self._feed_txt("", final)
+        elif final:
+            if self._invalid or self._state not in (_START, _END):
+                self.obj = dict()  # invalid or truncated json, same as decode_byte
+            # nothing decoded, e.g. empty body
+            self.text = self._buf if self._state == _START and not self._invalid else None
+
+    def _finish_passthrough(self):
+        self.text = "".join(self._passthrough)
+        self._passthrough = list()
+        try:
+            obj = json.loads(self.text) if len(self.text) else dict()
+        except json.JSONDecodeError:
+            obj = dict()
+        self.obj = obj
+
+    def _skip(self):
+        self._pos = _WS.match(self._buf, self._pos).end()
+        return self._buf[self._pos : self._pos + 1]
+
+    def _value(self, final):
+        """decode the next json value, returns (True, value) or (False, None) if incomplete"""
+        buf, pos = self._buf, self._pos
+        try:
+            val, end = self._json.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            val, end = None, None
+        # a number at the end of the buffer might be incomplete
+        if end is None or (end == len(buf) and not final and buf[end - 1].isdigit()):
+            # retry when the undecoded part doubled, to avoid decoding large value repeatedly
+            self._retry_len = 2 * (len(buf) - pos) + 1
+            return False, None
+        self._pos = end
+        return True, val
+
+    def _decode(self, final):
+        while True:
+            c = self._skip()
+            if not c:
+                return
+            state = self._state
+            if state == _START:
+                if c != "{":
+                    self.set_passthrough()
+                    return
+                self._pos += 1
+                self._state = _FIRST_KEY
+            elif state == _FIRST_KEY and c == "}":
+                self._pos += 1
+                self._state = _END
+            elif state in (_FIRST_KEY, _KEY):
+                if c != '"':
+                    raise json.JSONDecodeError("Expecting property name", self._buf, self._pos)
+                ok, self._key = self._value(final)
+                if not ok:
+                    return
+                self._state = _COLON
+            elif state == _COLON:
+                self._expect(c, ":")
+                self._state = _VALUE
+            elif state == _VALUE:
+                if self._key == self.FEATURES_KEY and c == "[":
+                    self._pos += 1
+                    self.obj[self._key] = list()
+                    self._state = _FIRST_FEATURE
+                    continue
+                ok, val = self._value(final)
+                if not ok:
+                    return
+                self.obj[self._key] = val
+                self._state = _NEXT_KEY
+            elif state == _NEXT_KEY:
+                if c == "}":
+                    self._pos += 1
+                    self._state = _END
+                    continue
+                self._expect(c, ",")
+                self._state = _KEY
+            elif state == _FIRST_FEATURE and c == "]":
+                self._pos += 1
+                self._state = _NEXT_KEY
+            elif state in (_FIRST_FEATURE, _FEATURE):
+                ok, val = self._value(final)
+                if not ok:
+                    return
+                self.obj[self.FEATURES_KEY].append(val)
+                self._state = _NEXT_FEATURE
+            elif state == _NEXT_FEATURE:
+                if c == "]":
+                    self._pos += 1
+                    self._state = _NEXT_KEY
+                    continue
+                self._expect(c, ",")
+                self._state = _FEATURE
+            else:  # trailing data after the object
+                raise json.JSONDecodeError("Extra data", self._buf, self._pos)
+
+    def _expect(self, c, token):
+        if c != token:
+            raise json.JSONDecodeError("Expecting '%s' delimiter" % token, self._buf, self._pos)
+        self._pos += 1
@@ -0,0 +1,524 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+# Copyright (c) 2019 HERE Europe B.V.
+#
+# SPDX-License-Identifier: MIT
+# License-Filename: LICENSE
+#
+###############################################################################
+
+"""Decode Mapbox Vector Tile (MVT, protobuf) response body to a GeoJSON FeatureCollection.
+
+Tile coordinates are de-quantized to EPSG:4326 using the web mercator tile
+("web" schema, tile id "{level}_{col}_{row}"). Features of a tile are clipped to the
+tile plus a buffer, the buffer is dropped (clipped to the tile extent), so that a line
+or polygon crossing tiles is split into parts that do not overlap, see TilePartMerger.
+
+Only the protobuf messages of vector_tile.proto (v2) are decoded, without dependency.
+"""
+
+import gzip
+import json
+import math
+import struct
+import threading
+from typing import Callable, Dict, Iterable, Iterator, List, Set, Tuple
+
+from .json_stream import GZIP_MAGIC
+
+TILE_FORMAT_GEOJSON = "geojson"
+TILE_FORMAT_MVT = "mvt"
+MIME_TYPE = "application/vnd.mapbox-vector-tile"
+DEFAULT_EXTENT = 4096
+# feature id kept in properties, otherwise the (integer) mvt feature id is used
+ID_KEY = "id"
+# json objects encoded as string property
+JSON_KEYS = ("@ns:com:here:xyz",)
+
+# protobuf wire types
+_VARINT = 0
+_FIXED64 = 1
+_LEN = 2
+_FIXED32 = 5
+
+# geometry types
+GEOM_POINT = 1
+GEOM_LINESTRING = 2
+GEOM_POLYGON = 3
+
+# geometry commands
+_MOVE_TO = 1
+_LINE_TO = 2
+_CLOSE_PATH = 7
+
+
+class MvtDecodeError(Exception):
+    pass
+
+
+def _read_varint(buf, pos: int) -> Tuple[int, int]:
+    result = 0
+    shift = 0
+    while True:
+        try:
+            b = buf[pos]
+        except IndexError:
+            raise MvtDecodeError("truncated varint")
+        pos += 1
+        result |= (b & 0x7F) << shift
+        if not b & 0x80:
+            return result, pos
+        shift += 7
+
+
+def _iter_fields(buf) -> Iterator[Tuple[int, int, object]]:
+    """yields field number, wire type and value (int, or memoryview of bytes) of a message"""
+    pos = 0
+    end = len(buf)
+    while pos < end:
+        key, pos = _read_varint(buf, pos)
+        field, wire_type = key >> 3, key & 7
+        if wire_type == _VARINT:
+            value, pos = _read_varint(buf, pos)
+        elif wire_type == _LEN:
+            size, pos = _read_varint(buf, pos)
+            value = buf[pos : pos + size]
+            pos += size
+        elif wire_type == _FIXED64:
+            value = buf[pos : pos + 8]
+            pos += 8
+        elif wire_type == _FIXED32:
+            value = buf[pos : pos + 4]
+            pos += 4
+        else:
+            raise MvtDecodeError("unsupported wire type %s" % wire_type)
+        if pos > end:
+            raise MvtDecodeError("truncated message")
+        yield field, wire_type, value
+
+
+def _read_packed(buf) -> List[int]:
+    lst = list()
+    pos = 0
+    end = len(buf)
+    while pos < end:
+        value, pos = _read_varint(buf, pos)
+        lst.append(value)
+    return lst
+
+
+def _zigzag(n: int) -> int:
+    return (n >> 1) ^ -(n & 1)
+
+
+def _to_signed64(n: int) -> int:
+    return n - (1 << 64) if n >= 1 << 63 else n
+
+
+def _decode_value(buf):
+    for field, wire_type, value in _iter_fields(buf):
+        if field == 1:
+            return str(value, "utf-8")
+        elif field == 2:
+            return struct.unpack("<f", value)[0]
+        elif field == 3:
+            return struct.unpack("<d", value)[0]
+        elif field == 4:
+            return _to_signed64(value)
+        elif field == 5:
+            return value
+        elif field == 6:
+            return _zigzag(value)
+        elif field == 7:
+            return bool(value)
+    return None
+
+
+def _decode_commands(commands: List[int]) -> List[List[Tuple[int, int]]]:
+    """returns parts (MoveTo) of geometry as list of tile coordinates, ClosePath repeats
+    the first coordinate"""
+    parts = list()
+    part = None
+    x = y = 0
+    i = 0
+    n = len(commands)
+    while i < n:
+        cmd = commands[i]
+        cmd_id, count = cmd & 7, cmd >> 3
+        i += 1
+        if cmd_id == _CLOSE_PATH:
+            if part:
+                part.append(part[0])
+            continue
+        if cmd_id not in (_MOVE_TO, _LINE_TO) or i + 2 * count > n:
+            raise MvtDecodeError("invalid geometry command %s" % cmd)
+        for _ in range(count):
+            x += _zigzag(commands[i])
+            y += _zigzag(commands[i + 1])
+            i += 2
+            if cmd_id == _MOVE_TO:
+                part = list()
+                parts.append(part)
+            part.append((x, y))
+    return parts
+
+
+def _ring_area(ring) -> float:
+    """signed area (surveyor's formula) in tile coordinates, y axis pointing down:
+    exterior rings are positive, interior rings negative (mvt spec v2)"""
+    area = 0
+    for (x1, y1), (x2, y2) in zip(ring, ring[1:]):
+        area += x1 * y2 - x2 * y1
+    return area / 2
+
+
+def _clip_line(part, extent: int) -> List[list]:
+    """clip line to tile [0, extent] (Liang-Barsky), returns list of lines"""
+    lines = list()
+    line = None
+    for (x1, y1), (x2, y2) in zip(part, part[1:]):
+        t0, t1 = 0.0, 1.0
+        dx, dy = x2 - x1, y2 - y1
+        inside = True
+        for p, q in ((-dx, x1), (dx, extent - x1), (-dy, y1), (dy, extent - y1)):
+            if p == 0:
+                if q < 0:
+                    inside = False
+                    break
+                continue
+            t = q / p
+            if p < 0:
+                t0 = max(t0, t)
+            else:
+                t1 = min(t1, t)
+            if t0 > t1:
+                inside = False
+                break
+        if not inside:
+            line = None
+            continue
+        start = (x1 + t0 * dx, y1 + t0 * dy)
+        end = (x1 + t1 * dx, y1 + t1 * dy)
+        if line is None or line[-1] != start:
+            line = [start]
+            lines.append(line)
+        line.append(end)
+    return [line for line in lines if len(line) > 1]
+
+
+def _clip_ring_edge(points, axis: int, value: float, is_min: bool) -> list:
+    """clip open ring by the half-plane points[axis] >= value (is_min) or <= value"""
+
+    def is_inside(p):
+        return p[axis] >= value if is_min else p[axis] <= value
+
+    def intersect(p, q):
+        t = (value - p[axis]) / (q[axis] - p[axis])
+        other = 1 - axis
+        pt = [0, 0]
+        pt[axis] = value
+        pt[other] = p[other] + t * (q[other] - p[other])
+        return tuple(pt)
+
+    out = list()
+    prev = points[-1]
+    for cur in points:
+        if is_inside(cur):
+            if not is_inside(prev):
+                out.append(intersect(prev, cur))
+            out.append(cur)
+        elif is_inside(prev):
+            out.append(intersect(prev, cur))
+        prev = cur
+    return out
+
+
+def _clip_ring(ring, extent: int) -> list:
+    """clip closed ring to tile [0, extent] (Sutherland-Hodgman), [] if outside"""
+    points = list(ring[:-1])  # open ring
+    for axis, value, is_min in (
+        (0, 0, True),
+        (0, extent, False),
+        (1, 0, True),
+        (1, extent, False),
+    ):
+        if not points:
+            break
+        points = _clip_ring_edge(points, axis, value, is_min)
+    if len(points) < 3:
+        return list()
+    return points + [points[0]]
+
+
+def _is_in_tile(point, extent: int) -> bool:
+    return 0 <= point[0] <= extent and 0 <= point[1] <= extent
+
+
+class TileProjection(object):
+    """de-quantize tile coordinates of a web mercator tile to lon, lat (EPSG:4326)"""
+
+    def __init__(self, level: int, col: int, row: int, extent: int = DEFAULT_EXTENT):
+        self.extent = extent
+        n = 2**level
+        self._x_scale = 360.0 / (n * extent)
+        self._x_offset = 360.0 * col / n - 180
+        self._y_scale = 2 * math.pi / (n * extent)
+        self._y_offset = math.pi * (1 - 2 * row / n)
+
+    def to_lon_lat(self, x: int, y: int) -> List[float]:
+        lon = self._x_offset + x * self._x_scale
+        lat = math.degrees(math.atan(math.sinh(self._y_offset - y * self._y_scale)))
+        return [lon, lat]
+
+    def to_coords(self, part) -> List[List[float]]:
+        return [self.to_lon_lat(x, y) for x, y in part]
+
+
+def _make_geometry(geom_type: int, parts, projection: TileProjection, clip=True) -> dict:
+    """GeoJSON geometry of parts, clipped to tile extent (buffer is dropped) if clip"""
+    if not parts:
+        return None
+    extent = projection.extent
+    if geom_type == GEOM_POINT:
+        coords = [
+            projection.to_lon_lat(x, y)
+            for part in parts
+            for x, y in part
+            if not clip or _is_in_tile((x, y), extent)
+        ]
+        if not coords:
+            return None
+        if len(coords) == 1:
+            return dict(type="Point", coordinates=coords[0])
+        return dict(type="MultiPoint", coordinates=coords)
+    if geom_type == GEOM_LINESTRING:
+        if clip:
+            parts = [line for part in parts for line in _clip_line(part, extent)]
+        lines = [projection.to_coords(part) for part in parts if len(part) > 1]
+        if not lines:
+            return None
+        if len(lines) == 1:
+            return dict(type="LineString", coordinates=lines[0])
+        return dict(type="MultiLineString", coordinates=lines)
+    if geom_type == GEOM_POLYGON:
+        # rings of polygons: exterior ring followed by its interior rings
+        lst_rings = list()
+        for ring in parts:
+            if len(ring) < 4:
+                continue
+            area = _ring_area(ring)
+            if area > 0 or not lst_rings:
+                lst_rings.append([ring])
+            elif area < 0:
+                lst_rings[-1].append(ring)
+        polygons = list()
+        for rings in lst_rings:
+            if clip:
+                rings = [_clip_ring(ring, extent) for ring in rings]
+            if not rings[0]:
+                continue  # exterior ring is in buffer
+            polygons.append([projection.to_coords(ring) for ring in rings if ring])
+        if not polygons:
+            return None
+        if len(polygons) == 1:
+            return dict(type="Polygon", coordinates=polygons[0])
+        return dict(type="MultiPolygon", coordinates=polygons)
+    return None
+
+
+def _decode_feature(buf, keys, values, projection: TileProjection, clip=True) -> dict:
+    fid = None
+    tags = list()
+    geom_type = 0
+    commands = list()
+    for field, wire_type, value in _iter_fields(buf):
+        if field == 1:
+            fid = value
+        elif field == 2:
+            tags = _read_packed(value)
+        elif field == 3:
+            geom_type = value
+        elif field == 4:
+            commands = _read_packed(value)
+    props = dict()
+    for k, v in zip(tags[0::2], tags[1::2]):
+        try:
+            props[keys[k]] = values[v]
+        except IndexError:
+            raise MvtDecodeError("invalid feature tag")
+    for k in JSON_KEYS:
+        if isinstance(props.get(k), str):
+            try:
+                props[k] = json.loads(props[k])
+            except ValueError:
+                pass
+    xyz_id = props.pop(ID_KEY, None)
+    if xyz_id is None and fid is not None:
+        xyz_id = str(fid)
+    feature = dict(
+        type="Feature",
+        geometry=_make_geometry(geom_type, _decode_commands(commands), projection, clip),
+        properties=props,
+    )
+    if xyz_id is not None:
+        feature["id"] = str(xyz_id)
+    return feature
+
+
+def _decode_layer(buf, level: int, col: int, row: int, clip=True) -> List[dict]:
+    keys = list()
+    values = list()
+    lst_feat_buf = list()
+    extent = DEFAULT_EXTENT
+    for field, wire_type, value in _iter_fields(buf):
+        if field == 2:
+            lst_feat_buf.append(value)
+        elif field == 3:
+            keys.append(str(value, "utf-8"))
+        elif field == 4:
+            values.append(_decode_value(value))
+        elif field == 5:
+            extent = value
+    projection = TileProjection(level, col, row, extent)
+    features = [_decode_feature(b, keys, values, projection, clip) for b in lst_feat_buf]
+    # features only in the buffer
+    return [ft for ft in features if ft["geometry"] is not None or not clip]
+
+
+def decompress(byt) -> bytes:
+    byt = bytes(byt)
+    if byt[:2] == GZIP_MAGIC:
+        byt = gzip.decompress(byt)
+    return byt
+
+
+def is_mvt_body(byt: bytes) -> bool:
+    """True if decompressed body is a vector tile (empty tile included), not a json body,
+    e.g. error or server without mvt support"""
+    # first field of a tile is a layer (field 3, length-delimited)
+    return len(byt) == 0 or byt[0] == (3 << 3 | _LEN)
+
+
+def parse_tile_id(tile_id: str) -> Tuple[int, int, int]:
+    """level, col, row of web tile id "{level}_{col}_{row}", see tile_utils.get_tile_format"""
+    level, col, row = map(int, str(tile_id).split("_"))
+    return level, col, row
+
+
+def decode_tile(byt, tile_id: str, clip=True) -> dict:
+    """Decode (gzip) mvt body of web tile tile_id to a GeoJSON FeatureCollection,
+    features of all layers of the tile are merged.
+
+    :param byt: bytes or QByteArray
+    :param clip: clip geometries to the tile extent, i.e. drop the buffer
+    :raises MvtDecodeError: invalid protobuf message
+    """
+    level, col, row = parse_tile_id(tile_id)
+    features = list()
+    buf = memoryview(decompress(byt))
+    try:
+        for field, wire_type, value in _iter_fields(buf):
+            if field == 3 and wire_type == _LEN:
+                features.extend(_decode_layer(value, level, col, row, clip))
+    except (UnicodeDecodeError, struct.error) as e:
+        raise MvtDecodeError(e)
+    return dict(type="FeatureCollection", features=features)
+
+
+_MULTI_TYPES = {
+    "LineString": "MultiLineString",
+    "MultiLineString": "MultiLineString",
+    "Polygon": "MultiPolygon",
+    "MultiPolygon": "MultiPolygon",
+}
+
+
+def _merge_geometries(lst_geom: Iterable[dict], multi_type: str) -> dict:
+    coords = list()
+    for geom in lst_geom:
+        geom_type = geom["type"]
+        if _MULTI_TYPES.get(geom_type) != multi_type:
+            continue
+        if geom_type == multi_type:
+            coords.extend(geom["coordinates"])
+        else:
+            coords.append(geom["coordinates"])
+    return dict(type=multi_type, coordinates=coords)
+
+
+class TilePartMerger(object):
+    """Parts of lines and polygons clipped by tiles, merged per feature id.
+
+    A feature crossing tiles is received once per tile, with the part of its geometry
+    in the tile. As features are de-duplicated by xyz id, the geometry of a feature is
+    replaced by the Multi- geometry of its parts in the loaded tiles, dissolved by
+    fn_dissolve. Lines and polygons are always Multi-, so that all parts of a feature are
+    in the same vlayer.
+
+    Parts are kept per tile until the tile is evicted (e.g. it left the view).
+    Merge is thread-safe, e.g. called in worker threads.
+    """
+
+    def __init__(self, fn_dissolve: Callable[[dict], dict] = None):
+        """
+        :param fn_dissolve: fn_dissolve(geometry) returns union of the parts of the Multi-
+            geometry, e.g. polygon parts sharing a tile edge
+        """
+        self.fn_dissolve = fn_dissolve
+        self._parts: Dict[str, Dict[str, dict]] = dict()  # xyz id -> tile id -> geometry
+        self._tile_ids: Dict[str, Set[str]] = dict()  # tile id -> xyz ids
+        self._lock = threading.Lock()
+
+    def _evict(self, tile_id: str):
+        for xyz_id in self._tile_ids.pop(tile_id, set()):
+            parts = self._parts.get(xyz_id, dict())
+            parts.pop(tile_id, None)
+            if not parts:
+                self._parts.pop(xyz_id, None)
+
+    def merge(self, tile_id: str, features: List[dict]) -> List[dict]:
+        """parts of tile_id replace the previous ones (e.g. tile is reloaded),
+        geometry of features is updated in place"""
+        lst_merged = list()
+        with self._lock:
+            self._evict(tile_id)
+            ids = set()
+            for ft in features:
+                geom = ft.get("geometry")
+                xyz_id = ft.get("id")
+                if xyz_id is None or geom is None or geom.get("type") not in _MULTI_TYPES:
+                    continue
+                parts = self._parts.setdefault(xyz_id, dict())
+                parts[tile_id] = geom
+                ids.add(xyz_id)
+                lst_merged.append((ft, len(parts), list(parts.values())))
+            if ids:
+                self._tile_ids[tile_id] = ids
+        for ft, n_parts, lst_geom in lst_merged:
+            geom = _merge_geometries(lst_geom, _MULTI_TYPES[ft["geometry"]["type"]])
+            if n_parts > 1 and self.fn_dissolve is not None:
+                geom = self.fn_dissolve(geom)
+            ft["geometry"] = geom
+        return features
+
+    def evict(self, tile_ids: Iterable[str]):
+        """forget parts of tile_ids, e.g. tiles failed"""
+        with self._lock:
+            for tile_id in tile_ids:
+                self._evict(tile_id)
+
+    def retain(self, tile_ids: Iterable[str]):
+        """forget parts of tiles other than tile_ids, e.g. tiles that left the view"""
+        tile_ids = set(tile_ids)
+        with self._lock:
+            for tile_id in [t for t in self._tile_ids if t not in tile_ids]:
+                self._evict(tile_id)
+
+    def count_tiles(self) -> int:
+        return len(self._tile_ids)
+
+    def clear(self):
+        with self._lock:
+            self._parts = dict()
+            self._tile_ids = dict()
@@ -8,12 +8,19 @@
 #
 ###############################################################################
 
+import json
+from collections import deque
+from threading import Lock
+
 from qgis.PyQt.QtCore import QByteArray
 from qgis.PyQt.QtNetwork import QNetworkRequest, QNetworkReply
 
 from qgis.core import Qgis, QgsMessageLog  # to be removed
-from .net_utils import decode_byte, get_qt_property
-from ..controller import make_qt_args
+from .net_utils import decode_json, get_qt_property, set_qt_property
+from .json_stream import GZIP_MAGIC, JsonStreamDecoder
+from . import mvt_decoder
+from .tile_cache import tile_cache
+from ..controller import BasicSignal, Worker, make_qt_args, output_to_qt_args
 from ..common import config
 from ..models.connection import mask_token, SpaceConnectionInfo
 
@@ -21,6 +28,119 @@ from ..common.signal import make_print_qgis
 
 print_qgis = make_print_qgis("net_handler")
 
+FEATURE_REPLY_TAGS = ("tile", "bbox", "iterate", "search", "features")
+STREAM_REPLY_TAGS = ("tile", "bbox", "iterate")
+STREAM_CHUNK_SIZE = 1024 * 1024  # bytes of compressed body decoded at once
+
+
+class ReplyStream:
+    """Decoder of the json body of a feature reply, fed while the body is received.
+
+    Chunks of the body are read on readyRead (main thread) and decoded in order
+    in a worker thread of pool, see JsonStreamDecoder. If fn_batch is given, decoded
+    features are passed to fn_batch in batches of batch_size (in worker thread),
+    its output is emitted by signal.results, before the reply is finished.
+    The rest of the body is decoded by NetworkResponse in on_received (see finish).
+    """
+
+    def __init__(self, reply: QNetworkReply, pool=None, batch_size=None, fn_batch=None):
+        self.reply = reply
+        self.pool = pool
+        self.batch_size = batch_size
+        self.fn_batch = fn_batch
+        self.signal = BasicSignal()
+        self.n_batched = 0  # features passed to fn_batch
+        self.decoder = JsonStreamDecoder()
+        self._chunks = deque()
+        self._lock = Lock()
+        self._is_started = False
+        self._is_finished = False
+        self._error = None
+        # body of tile cache: plain body is compressed chunk by chunk, gzip body is kept
+        self._is_cached = False
+        self._cache_head = b""
+        self._compressor = None
+        self._lst_zip = list()
+        if pool is not None:
+            set_qt_property(reply, body_stream=self)
+            reply.readyRead.connect(self._read)
+
+    def _read(self):
+        """read available chunk of the body (main thread), decoded in worker thread"""
+        if self._is_finished:
+            return
+        self._chunks.append(bytes(self.reply.readAll()))
+        self.pool.start(Worker(self._feed_chunks))
+
+    def _feed_chunks(self):
+        with self._lock:
+            if self._is_finished:
+                return
+            while self._chunks:
+                self._feed(self._chunks.popleft())
+            self._emit_batches()
+
+    def _emit_batches(self):
+        if self.fn_batch is None:
+            return
+        while self._error is None and self.decoder.count_features() >= self.batch_size:
+            features = self.decoder.pop_features(self.batch_size)
+            self.n_batched += len(features)
+            try:
+                output = self.fn_batch(features)
+            except Exception as e:
+                self._error = e  # raise in finish, i.e. in on_received
+                return
+            self.signal.results.emit(output_to_qt_args(output))
+
+    def _start(self):
+        self._is_started = True
+        status = self.reply.attribute(QNetworkRequest.HttpStatusCodeAttribute)
+        if status is not None and status >= 300:
+            self.decoder.set_passthrough()  # keep error response as text
+        (cache_key,) = get_qt_property(self.reply, ["tile_cache_key"])
+        self._is_cached = cache_key is not None and status == 200
+
+    def _feed(self, byt: bytes, final=False):
+        if not self._is_started:
+            self._start()
+        self.decoder.feed(byt)
+        if not self._is_cached:
+            return
+        if self._cache_head is not None:
+            byt = self._cache_head + byt
+            if len(byt) < len(GZIP_MAGIC) and not final:
+                self._cache_head = byt
+                return
+            self._cache_head = None
+            if byt[:2] != GZIP_MAGIC:
+                self._compressor = tile_cache.make_compressor()
+        self._lst_zip.append(self._compressor.compress(byt) if self._compressor else byt)
+
+    def finish(self):
+        """decode the rest of the body of the finished reply (in worker thread)
+
+        :return: decoded json object and body of tile cache (None if not cached)
+        :raises: error of fn_batch or of decoder, see JsonStreamDecoder.finish
+        """
+        with self._lock:
+            self._is_finished = True
+            self._chunks.append(bytes(self.reply.readAll()))
+            while self._chunks:
+                byt = self._chunks.popleft()
+                for i in range(0, len(byt), STREAM_CHUNK_SIZE):
+                    self._feed(byt[i : i + STREAM_CHUNK_SIZE])
+            self._feed(b"", final=True)
+            if self._error is not None:
+                raise self._error
+            obj = self.decoder.finish()
+            if not self._is_cached:
+                return obj, None
+            if self._compressor is not None:
+                self._lst_zip.append(self._compressor.flush())
+            body, self._lst_zip = b"".join(self._lst_zip), list()
+            return obj, body
+
 
 # reply handler
 class NetworkResponse:
@@ -30,23 +150,117 @@ class NetworkResponse:
         self.body_bytes: bytes = None
         self.body_txt: str = None
         self.body_json: dict = None
+        self.body_size = 0  # decoded size of streamed body, see get_body_size
+        self.is_mvt_decoded = False  # body is a decoded mvt tile
+        self.n_batched = 0  # features of streamed body passed in batches, see ReplyStream
         self._is_body_read = False
 
     def is_dummy(self):
-        return not isinstance(self.reply, QNetworkReply)
+        return not isinstance(self.reply, QNetworkReply) and not self.is_cached()
+
+    def is_cached(self):
+        """reply is made from a fresh tile cache entry, without network"""
+        return not isinstance(self.reply, QNetworkReply) and self._get_cached_body() is not None
+
+    def _get_cached_body(self):
+        (cached_body,) = self.get_qt_property(["cached_body"])
+        return cached_body
+
+    def _get_revalidated_body(self):
+        """returns body of tile cache entry if it is revalidated (304) or fresh"""
+        if not isinstance(self.reply, QNetworkReply):
+            return self._get_cached_body()
+        cached_body = self._get_cached_body()
+        if cached_body is None or self.get_status() != 304:
+            return None
+        (cache_key,) = self.get_qt_property(["tile_cache_key"])
+        tile_cache.refresh(cache_key)
+        return cached_body
+
+    def is_streamed(self):
+        """json body of feature response is decoded in chunks, see _decode_stream"""
+        return (
+            not self.is_dummy() and not self.is_mvt() and self.get_reply_tag() in STREAM_REPLY_TAGS
+        )
 
     def _read_body(self):
         if not self._is_body_read:
-            self.body_qbytearray = self.reply.readAll()
-            self.body_bytes, self.body_txt, self.body_json = decode_byte(self.body_qbytearray)
+            cached_body = self._get_revalidated_body()
+            if cached_body is not None:
+                self.body_bytes, self.body_json = self._decode_body(cached_body)
+            elif self.is_streamed():
+                self._decode_stream()
+            elif self.is_mvt():
+                byt = bytes(self.reply.readAll())
+                self.body_bytes, self.body_json = self._decode_body(byt)
+                self._put_tile_cache(byt)
+            else:
+                self.body_qbytearray = self.reply.readAll()
+                # body text is built on demand, see get_body_txt
+                self.body_bytes, self.body_json = decode_json(self.body_qbytearray)
             self._is_body_read = True
 
+    def is_mvt(self):
+        """tile is requested as mvt, see NetManager.load_features_tile"""
+        (tile_format,) = self.get_qt_property(["tile_format"])
+        return tile_format == mvt_decoder.TILE_FORMAT_MVT
+
+    def _decode_body(self, byt):
+        """decode json body, or mvt body to GeoJSON (in worker thread, see on_received).
+        Body of a mvt request is json if the server does not support mvt"""
+        if not self.is_mvt():
+            return decode_json(byt)
+        byt = mvt_decoder.decompress(byt)
+        if not mvt_decoder.is_mvt_body(byt):
+            return decode_json(byt)
+        (tile_id,) = self.get_qt_property(["tile_id"])
+        try:
+            obj = mvt_decoder.decode_tile(byt, tile_id)
+            self.is_mvt_decoded = True
+            # body text is built from decoded object, see get_body_txt
+            return None, obj
+        except mvt_decoder.MvtDecodeError as e:
+            print_qgis("invalid mvt", tile_id, repr(e))
+            return byt, dict()
+
+    def _decode_stream(self):
+        """decode json body chunk by chunk (in worker thread, see on_received), so that
+        no decompressed copy or text of the whole body is kept. Body is decoded while
+        it is received if a ReplyStream is attached to the reply"""
+        (body_stream,) = self.get_qt_property(["body_stream"])
+        if body_stream is None:
+            body_stream = ReplyStream(self.reply)
+        self.body_json, cached_body = body_stream.finish()
+        # body text of decoded object is not kept, see get_body_txt
+        self.body_txt = body_stream.decoder.text
+        self.body_size = body_stream.decoder.size
+        self.n_batched = body_stream.n_batched
+        if cached_body is not None:
+            self._put_tile_cache(cached_body)
+
+    def _put_tile_cache(self, body: bytes):
+        """store body of a successful tile response in tile cache"""
+        (cache_key,) = self.get_qt_property(["tile_cache_key"])
+        if cache_key is None or self.get_status() != 200:
+            return
+        if not isinstance(self.body_json, dict) or "features" not in self.body_json:
+            return  # invalid or truncated body
+        etag = bytes(self.reply.rawHeader(b"ETag")).decode("utf-8") or None
+        last_modified = bytes(self.reply.rawHeader(b"Last-Modified")).decode("utf-8") or None
+        tile_cache.put(cache_key, body, etag, last_modified)
+
     def get_body_qbytearray(self):
         self._read_body()
+        if self.body_qbytearray is None:
+            self.body_qbytearray = QByteArray(self.get_body_bytes())
         return self.body_qbytearray
 
     def get_body_txt(self):
         self._read_body()
+        if self.body_txt is None and self.body_bytes is not None:
+            self.body_txt = str(self.body_bytes, "utf-8")
+        elif self.body_txt is None:  # streamed body
+            self.body_txt = json.dumps(self.body_json, ensure_ascii=False)
         return self.body_txt
 
     def get_body_json(self):
@@ -55,8 +269,21 @@ class NetworkResponse:
 
     def get_body_bytes(self):
         self._read_body()
+        if self.body_bytes is None:  # streamed body
+            self.body_bytes = self.get_body_txt().encode("utf-8")
+        elif isinstance(self.body_bytes, memoryview):
+            self.body_bytes = bytes(self.body_bytes)
         return self.body_bytes
 
+    def get_body_size(self) -> int:
+        """size of the decoded (uncompressed) body in bytes"""
+        if self.is_dummy():
+            return 0
+        self._read_body()
+        if self.body_bytes is not None:
+            return len(self.body_bytes)
+        return self.body_size
+
     def get_reply(self):
         return self.reply
 
@@ -94,6 +321,9 @@ class NetworkResponse:
         conn_info, reply_tag = self.get_qt_property(["conn_info", "reply_tag"])
         token, space_id = conn_info.get_xyz_space() if conn_info is not None else (None, None)
 
+        if self.is_cached():
+            print_qgis("tile cache hit", reply_tag, mask_token(token), space_id)
+            return
         if self.is_dummy():
             msg = "%s: %s - %s" % (
                 reply_tag,
@@ -158,7 +388,7 @@ class NetworkHandler:
         # print(response.get_reply().request().rawHeader("Cookie".encode("utf-8")))
 
         response.log_status()
-        if not response.is_dummy():
+        if not response.is_dummy() and not response.is_cached():
             cls.handle_error(response)
         return cls.on_received_impl(response)
 
@@ -169,6 +399,11 @@ class NetworkHandler:
             raw = QByteArray()
             txt = ""
             obj = {}
+        elif response.is_streamed() or response.get_reply_tag() in FEATURE_REPLY_TAGS:
+            # body text of large feature response is only built on demand (error log)
+            raw = QByteArray()
+            txt = ""
+            obj = response.get_body_json()
         else:
             raw = response.get_body_qbytearray()
             txt = response.get_body_txt()
@@ -184,7 +419,7 @@ class NetworkHandler:
         if reply_tag == "spaces":
             print_qgis(txt)
             args = [conn_info, obj]
-        elif reply_tag in ("tile", "bbox", "iterate", "search"):
+        elif reply_tag in FEATURE_REPLY_TAGS:
             print_qgis(txt[:100])
             print_qgis(txt[-10:])
 
@@ -197,9 +432,24 @@ class NetworkHandler:
 
             args = [obj]
             if reply_tag == "tile":
-                kw = dict(limit=limit, tile_schema=tile_schema, tile_id=tile_id)
+                # geojson body of mvt request, e.g. server without mvt support
+                tile_format = (
+                    mvt_decoder.TILE_FORMAT_MVT
+                    if response.is_mvt_decoded
+                    else mvt_decoder.TILE_FORMAT_GEOJSON
+                )
+                kw = dict(
+                    limit=limit, tile_schema=tile_schema, tile_id=tile_id, tile_format=tile_format
+                )
             else:
-                kw = dict(handle=handle, limit=limit)
+                kw = dict(
+                    handle=handle,
+                    limit=limit,
+                    body_size=response.get_body_size(),
+                    n_batched=response.n_batched,
+                )
+                if reply_tag == "bbox":
+                    (kw["bbox"],) = response.get_qt_property(["bbox"])
 
         elif reply_tag in ("init_layer",):
             print_qgis(txt[:100])
@@ -15,6 +15,16 @@ import gzip
 import json
 from typing import List
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+
 from qgis.PyQt.QtCore import QUrl
 from qgis.PyQt.QtNetwork import (
     QNetworkRequest,
@@ -30,6 +40,8 @@ from qgis.core import Qgis
 import platform
 from ..common import config
 from ..models import API_TYPES, SpaceConnectionInfo
+from . import mvt_decoder
+from .shared_network import shared_network
 
 USER_AGENT = (
     "xyz-qgis-plugin/{plugin_version} QGIS/{qgis_version} Python/"
@@ -63,6 +75,67 @@ def decode_byte(byt):
     return byt, txt, obj
 
 
+def _loads_orjson(byt):
+    return orjson.loads(byt)  # accepts memoryview
+
+
+def _loads_simdjson(byt):
+    return simdjson.loads(bytes(byt))
+
+
+def _loads_std(byt):
+    return json.loads(bytes(byt) if isinstance(byt, memoryview) else byt)
+
+
+# fast json backend, if available
+if orjson is not None:
+    _json_loads, _JSON_ERRORS = _loads_orjson, (orjson.JSONDecodeError,)
+elif simdjson is not None:
+    _json_loads, _JSON_ERRORS = _loads_simdjson, (ValueError,)
+else:
+    _json_loads, _JSON_ERRORS = _loads_std, tuple()
+
+
+def json_loads(byt):
+    """Parse json from utf-8 bytes (or memoryview) without decoding to str,
+    using orjson or simdjson if available, stdlib json otherwise
+    """
+    if _JSON_ERRORS:
+        try:
+            return _json_loads(byt)
+        except _JSON_ERRORS:
+            pass  # e.g. NaN, big int: retry with stdlib json
+    return _loads_std(byt)
+
+
+def _as_buffer(byt):
+    """returns bytes-like view of QByteArray without copy if possible"""
+    if isinstance(byt, (bytes, bytearray, memoryview)):
+        return byt
+    try:
+        return memoryview(byt)
+    except TypeError:
+        return bytes(byt)
+
+
+def decode_json(byt):
+    """Decode (gzip) json response body, without intermediate str.
+    Body text can be built on demand from returned bytes (see decode_byte)
+
+    :param byt: QByteArray or bytes
+    :return: tuple of decompressed bytes (or memoryview), json object
+    """
+    byt = _as_buffer(byt)
+    if check_gzip(byt):
+        byt = gzip.decompress(byt)
+    try:
+        obj = json_loads(byt) if len(byt) else dict()
+    except json.JSONDecodeError:
+        obj = dict()
+
+    return byt, obj
+
+
 def _make_headers(token, **params):
     h = {"Accept": "*/*", "Accept-Encoding": "gzip", "User-Agent": USER_AGENT}
     if isinstance(token, str) and token.strip():
@@ -81,6 +154,7 @@ def make_request(url, token, **header):
         k = k.encode("utf-8")
         v = v.encode("utf-8")
         request.setRawHeader(k, v)
+    shared_network.apply_request_config(request)
     return request
 
 
@@ -100,10 +174,32 @@ def make_json_request(url, token):
 
 
 def make_payload(obj):
+    if isinstance(obj, bytes):  # already serialized, e.g. parser.make_lst_feature_collection
+        return obj
     txt = json.dumps(obj, ensure_ascii=False)
     return txt.encode("utf-8")
 
 
+class GzipPayload(bytes):
+    """payload compressed with gzip, sent with header Content-Encoding: gzip"""
+
+
+UPLOAD_GZIP_LEVEL = 6
+
+
+def make_upload_payload(obj):
+    """Serialize payload, compressed with gzip if enabled (shared_network.gzip_upload,
+    disabled by default as not every server accepts a gzip request body).
+    Run it in a worker thread, as compression of a large payload takes a while.
+    The payload limit of the API applies to the uncompressed size
+    (see parser.make_lst_feature_collection)
+    """
+    payload = make_payload(obj)
+    if isinstance(payload, GzipPayload) or not shared_network.gzip_upload:
+        return payload
+    return GzipPayload(gzip.compress(payload, UPLOAD_GZIP_LEVEL))
+
+
 def make_bytes_payload(obj):
     return QByteArray(make_payload(obj))
 
@@ -122,6 +218,7 @@ HEADER_EXTRA_MAP = dict(
     geo={"Content-Type": "application/geo+json"},
     json={"Content-Type": "application/json"},
     gzip={"Accept-Encoding": "gzip"},
+    mvt={"Accept": mvt_decoder.MIME_TYPE},
 )
 
 
@@ -132,6 +229,7 @@ def make_conn_request(url: str, token: str, req_type="normal", **kw):
         "gzip"
         "geo"
         "json"
+        "mvt": Mapbox Vector Tile
 
     """
     url = make_query_url(url, **kw)
@@ -10,17 +10,19 @@
 
 
 from qgis.PyQt.QtCore import QObject, QTimer
-from qgis.PyQt.QtNetwork import QNetworkAccessManager
 
-from . import datahub_servers
+from . import datahub_servers, mvt_decoder
 from .net_handler import NetworkHandler
 from .net_utils import (
+    GzipPayload,
     make_conn_request,
     set_qt_property,
     prepare_new_space_info,
     make_payload,
     make_bytes_payload,
 )
+from .shared_network import shared_network
+from .tile_cache import tile_cache
 from ..models import SpaceConnectionInfo
 
 
@@ -29,6 +31,8 @@ from ..models import SpaceConnectionInfo
 
 class NetManager(QObject):
     TIMEOUT_COUNT = 1000
+    # managers with the same key share a QNetworkAccessManager (connections, cookies)
+    NETWORK_KEY = "datahub"
 
     API_URL = datahub_servers.API_URL
 
@@ -44,13 +48,14 @@ class NetManager(QObject):
         "load_features_iterate": "/spaces/{space_id}/iterate",
         "load_features_search": "/spaces/{space_id}/search",
         "load_features_tile": "/spaces/{space_id}/tile/{tile_schema}/{tile_id}",
+        "load_features_by_id": "/spaces/{space_id}/features",
         "add_features": "/spaces/{space_id}/features",
         "del_features": "/spaces/{space_id}/features",
     }
 
     def __init__(self, parent):
         super().__init__(parent)
-        self.network = QNetworkAccessManager(self)
+        self.network = shared_network.get_manager(self.NETWORK_KEY)
 
     #############
     def _pre_send_request(self, conn_info, endpoint_key: str, kw_path=dict(), kw_request=dict()):
@@ -62,6 +67,10 @@ class NetManager(QObject):
         request = make_conn_request(url, token, **kw_request)
         return request
 
+    def get_host(self, conn_info, endpoint_key="load_features_iterate") -> str:
+        """host of requests of endpoint, e.g. limiter of the host before any request"""
+        return self._pre_send_request(conn_info, endpoint_key).url().host()
+
     def _post_send_request(self, reply, conn_info, kw_prop=dict()):
         set_qt_property(reply, conn_info=conn_info, **kw_prop)
 
@@ -181,15 +190,61 @@ class NetManager(QObject):
         kw_prop = dict(reply_tag=reply_tag, bbox=bbox, **kw)
         return self._send_request(conn_info, endpoint_key, kw_request=kw_request, kw_prop=kw_prop)
 
-    def load_features_tile(self, conn_info, tile_id="0", tile_schema="quadkey", **kw):
+    def load_features_tile(
+        self,
+        conn_info,
+        tile_id="0",
+        tile_schema="quadkey",
+        max_age=None,
+        tile_format=mvt_decoder.TILE_FORMAT_GEOJSON,
+        **kw
+    ):
+        """
+        :param max_age: seconds a tile cache entry is used without revalidation,
+            defaults to ttl of tile cache, 0: always revalidate
+        :param tile_format: "geojson" or "mvt" (web tile schema only), mvt body is decoded
+            to GeoJSON in NetworkResponse
+        """
         reply_tag = "tile"
         kw_tile = dict(tile_schema=tile_schema, tile_id=tile_id)
         endpoint_key = "load_features_tile"
         self._process_queries(kw)
-        kw_prop = dict(reply_tag=reply_tag, **kw, **kw_tile)
-        return self._send_request(
-            conn_info, endpoint_key, kw_path=kw_tile, kw_request=kw, kw_prop=kw_prop
+        kw_prop = dict(reply_tag=reply_tag, tile_format=tile_format, **kw, **kw_tile)
+        is_mvt = tile_format == mvt_decoder.TILE_FORMAT_MVT
+        if is_mvt:
+            kw_path = dict(kw_tile, tile_id=tile_id + ".mvt")
+            kw_request = dict(kw, req_type="mvt")
+        else:
+            kw_path = kw_tile
+            kw_request = kw
+        request = self._pre_send_request(
+            conn_info, endpoint_key, kw_path=kw_path, kw_request=kw_request
+        )
+        if not tile_cache.is_enabled():
+            reply = self.network.get(request)
+            self._post_send_request(reply, conn_info, kw_prop=kw_prop)
+            return reply
+
+        # url includes server, space/layer, tile and queries (limit, tags, filters, ..)
+        cache_key = tile_cache.make_key(
+            request.url().toString(), bytes(request.rawHeader(b"Authorization"))
         )
+        entry = tile_cache.get(cache_key, max_age)
+        kw_prop.update(tile_cache_key=cache_key)
+        if entry is not None:
+            body, etag, last_modified, is_fresh = entry
+            kw_prop.update(cached_body=body)
+            if is_fresh:
+                reply = QObject()  # finished reply, see NetworkResponse.is_cached
+                self._post_send_request(reply, conn_info, kw_prop=kw_prop)
+                return reply
+            if etag:
+                request.setRawHeader(b"If-None-Match", etag.encode("utf-8"))
+            if last_modified:
+                request.setRawHeader(b"If-Modified-Since", last_modified.encode("utf-8"))
+        reply = self.network.get(request)
+        self._post_send_request(reply, conn_info, kw_prop=kw_prop)
+        return reply
 
     def load_features_iterate(self, conn_info, **kw):
         reply_tag = kw.pop("reply_tag", "iterate")
@@ -205,6 +260,14 @@ class NetManager(QObject):
         kw_prop = dict(reply_tag=reply_tag, **kw)
         return self._send_request(conn_info, endpoint_key, kw_request=kw, kw_prop=kw_prop)
 
+    def load_features_by_id(self, conn_info, lst_id, **kw):
+        reply_tag = "features"
+        endpoint_key = "load_features_by_id"
+        self._process_queries(kw)
+        kw_request = dict(id=",".join(str(i) for i in lst_id), **kw)
+        kw_prop = dict(reply_tag=reply_tag, **kw)
+        return self._send_request(conn_info, endpoint_key, kw_request=kw_request, kw_prop=kw_prop)
+
     # feature function
     def add_features(self, conn_info, added_feat, **kw):
         send_request = (
@@ -232,6 +295,8 @@ class NetManager(QObject):
         request = self._pre_send_request(conn_info, endpoint_key, kw_request=kw_request)
 
         payload = make_payload(added_feat)
+        if isinstance(payload, GzipPayload):
+            request.setRawHeader(b"Content-Encoding", b"gzip")
         reply = send_request(request, payload)
         self._post_send_request(reply, conn_info, kw_prop=kw_prop)
 
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+# Copyright (c) 2019 HERE Europe B.V.
+#
+# SPDX-License-Identifier: MIT
+# License-Filename: LICENSE
+#
+###############################################################################
+
+"""QNetworkAccessManager shared by the network managers of an api (DataHub, IML).
+
+Connections to a server are pooled by its QNetworkAccessManager, so that loaders,
+uploaders and space controllers reuse warm connections (keep-alive), multiplexed
+over HTTP/2 where the server supports it.
+"""
+
+from typing import Dict
+
+from qgis.PyQt.QtNetwork import QNetworkAccessManager, QNetworkRequest
+
+from ..common import config
+from ..common.signal import make_print_qgis
+
+print_qgis = make_print_qgis("shared_network")
+
+# not available in older Qt
+HTTP2_ALLOWED_ATTRIBUTE = getattr(QNetworkRequest, "Http2AllowedAttribute", None)
+HTTP2_WAS_USED_ATTRIBUTE = getattr(QNetworkRequest, "Http2WasUsedAttribute", None)
+
+
+def _parse_bool(value) -> bool:
+    return str(value).lower() not in ("false", "0")
+
+
+class ConnectionStats(object):
+    """Requests and new (TLS) connections to a host"""
+
+    def __init__(self):
+        self.requests = 0
+        self.http2 = 0  # replies over HTTP/2
+        self.connections = 0  # TLS handshakes, i.e. connections not reused
+
+    def get_reuse_ratio(self) -> float:
+        """fraction of requests sent over an existing connection (TLS only)"""
+        if not self.requests:
+            return 0.0
+        return max(0.0, 1 - self.connections / self.requests)
+
+    def to_dict(self) -> dict:
+        return dict(
+            requests=self.requests,
+            http2=self.http2,
+            connections=self.connections,
+            reuse_ratio=self.get_reuse_ratio(),
+        )
+
+
+class SharedNetwork(object):
+    """Shared QNetworkAccessManager per key (api), with connection statistics per host"""
+
+    def __init__(self):
+        self.http2_allowed = True
+        self.transfer_timeout = 0  # ms, 0: no timeout
+        # Content-Encoding: gzip for feature payloads, only if the server accepts it (setting)
+        self.gzip_upload = False
+        self.tile_format = "geojson"  # format of tiles of live loading: geojson, mvt
+        self._managers: Dict[str, QNetworkAccessManager] = dict()
+        self._stats: Dict[str, ConnectionStats] = dict()
+
+    def get_manager(self, key: str) -> QNetworkAccessManager:
+        network = self._managers.get(key)
+        if network is None:
+            network = QNetworkAccessManager()
+            self._config_manager(network)
+            network.finished.connect(self._cb_finished)
+            network.encrypted.connect(self._cb_encrypted)
+            self._managers[key] = network
+        return network
+
+    def _config_manager(self, network: QNetworkAccessManager):
+        if hasattr(network, "setTransferTimeout"):
+            network.setTransferTimeout(self.transfer_timeout)
+
+    def load_settings(self):
+        """read http2, gzip_upload (true/false), network_timeout (s) and tile_format
+        (geojson/mvt) from plugin settings, if any"""
+        http2 = config.get_plugin_setting("http2")
+        gzip_upload = config.get_plugin_setting("gzip_upload")
+        timeout = config.get_plugin_setting("network_timeout")
+        tile_format = config.get_plugin_setting("tile_format")
+        if http2 is not None:
+            self.http2_allowed = _parse_bool(http2)
+        if gzip_upload is not None:
+            self.gzip_upload = _parse_bool(gzip_upload)
+        if timeout is not None:
+            self.transfer_timeout = int(float(timeout) * 1000)
+        if tile_format is not None:
+            self.tile_format = str(tile_format).lower()
+        for network in self._managers.values():
+            self._config_manager(network)
+
+    def apply_request_config(self, request: QNetworkRequest):
+        if HTTP2_ALLOWED_ATTRIBUTE is not None:
+            request.setAttribute(HTTP2_ALLOWED_ATTRIBUTE, self.http2_allowed)
+
+    def _get_host_stats(self, reply) -> ConnectionStats:
+        host = reply.url().host()
+        stats = self._stats.get(host)
+        if stats is None:
+            stats = self._stats[host] = ConnectionStats()
+        return stats
+
+    def _cb_finished(self, reply):
+        stats = self._get_host_stats(reply)
+        stats.requests += 1
+        if HTTP2_WAS_USED_ATTRIBUTE is not None and reply.attribute(HTTP2_WAS_USED_ATTRIBUTE):
+            stats.http2 += 1
+
+    def _cb_encrypted(self, reply):
+        # emitted once per TLS handshake, not for requests over a reused connection
+        self._get_host_stats(reply).connections += 1
+
+    def get_stats(self) -> Dict[str, dict]:
+        return {host: stats.to_dict() for host, stats in self._stats.items()}
+
+    def log_stats(self):
+        for host, stats in self.get_stats().items():
+            print_qgis("connection stats", host, stats)
+
+    def clear(self):
+        """delete shared managers, e.g. plugin is unloaded"""
+        for network in self._managers.values():
+            network.deleteLater()
+        self._managers = dict()
+        self._stats = dict()
+
+
+shared_network = SharedNetwork()
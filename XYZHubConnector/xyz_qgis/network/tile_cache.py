@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+# Copyright (c) 2019 HERE Europe B.V.
+#
+# SPDX-License-Identifier: MIT
+# License-Filename: LICENSE
+#
+###############################################################################
+
+"""Persistent cache of tile responses (DataHub and IML).
+
+Entries are keyed by request url (server, space/layer id, tile schema, tile id and
+queries like limit, tags, filters, selection) and credentials of the request, so that
+a response is only reused for the same token. Bodies are stored gzip compressed with
+ETag/Last-Modified of the response. A fresh entry (younger than ttl) is used without
+network, a stale entry is revalidated with a conditional request (304: stored body
+is reused). Least recently used entries are evicted above max_size.
+"""
+
+import gzip
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Optional, Tuple
+
+from ..common import config
+
+TABLE_NAME = "tile_response"
+
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024  # bytes of compressed bodies
+DEFAULT_TTL = 60  # seconds an entry is used without revalidation
+# eviction frees space down to this fraction of max_size, to evict in batches
+EVICT_LOW_RATIO = 0.9
+COMPRESS_LEVEL = 1
+
+GZIP_MAGIC = b"\037\213"
+
+
+class TileResponseCache(object):
+    """Tile response cache in a sqlite db, shared by network and worker threads"""
+
+    def __init__(self, fname: str, max_size: int = DEFAULT_MAX_SIZE, ttl: float = DEFAULT_TTL):
+        """
+        :param fname: path of sqlite db, created on first use
+        :param max_size: max total size of bodies (bytes), 0 disables the cache
+        :param ttl: seconds an entry is used without revalidation
+        """
+        self.fname = fname
+        self.max_size = max_size
+        self.ttl = ttl
+        self._conn = None
+        self._total_size = 0
+        self._lock = threading.Lock()
+
+    def set_config(self, max_size: int = None, ttl: float = None):
+        if max_size is not None:
+            self.max_size = max_size
+        if ttl is not None:
+            self.ttl = ttl
+        if self.is_enabled():
+            with self._lock:
+                self._evict(self._get_conn())
+
+    def load_settings(self):
+        """read size (MB) and ttl (s) from plugin settings, if any"""
+        size_mb = config.get_plugin_setting("tile_cache_size_mb")
+        ttl = config.get_plugin_setting("tile_cache_ttl")
+        self.set_config(
+            max_size=None if size_mb is None else int(float(size_mb) * 1024 * 1024),
+            ttl=None if ttl is None else float(ttl),
+        )
+
+    def is_enabled(self) -> bool:
+        return self.max_size > 0
+
+    @staticmethod
+    def make_key(url: str, auth: bytes = b"") -> str:
+        """
+        :param auth: credentials of the request, e.g. Authorization header
+        """
+        key = hashlib.sha1(url.encode("utf-8"))
+        key.update(b"\n" + hashlib.sha1(auth).digest())
+        return key.hexdigest()
+
+    @staticmethod
+    def make_compressor():
+        """returns compressor of a body streamed in chunks, output is stored as is by put"""
+        return zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def _get_conn(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.fname)), exist_ok=True)
+            conn = sqlite3.connect(
+                self.fname, timeout=10, isolation_level=None, check_same_thread=False
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS "{table}" (
+                    "key" TEXT NOT NULL PRIMARY KEY,
+                    "body" BLOB NOT NULL,
+                    "etag" TEXT,
+                    "last_modified" TEXT,
+                    "fetched_at" REAL NOT NULL,
+                    "last_access" REAL NOT NULL,
+                    "size" INTEGER NOT NULL
+                )
+                """.format(
+                    table=TABLE_NAME
+                )
+            )
+            conn.execute(
+                'CREATE INDEX IF NOT EXISTS "idx_{table}_last_access" '
+                'ON "{table}" ("last_access")'.format(table=TABLE_NAME)
+            )
+            (total,) = conn.execute(
+                'SELECT COALESCE(SUM("size"), 0) FROM "{table}"'.format(table=TABLE_NAME)
+            ).fetchone()
+            self._total_size = total
+            self._conn = conn
+        return self._conn
+
+    def get(
+        self, key: str, max_age: float = None
+    ) -> Optional[Tuple[bytes, Optional[str], Optional[str], bool]]:
+        """returns (gzip body, etag, last_modified, is_fresh) of entry, or None
+
+        :param max_age: seconds an entry is fresh, defaults to ttl
+        """
+        if not self.is_enabled():
+            return None
+        max_age = self.ttl if max_age is None else max_age
+        now = time.time()
+        with self._lock:
+            conn = self._get_conn()
+            row = conn.execute(
+                'SELECT "body", "etag", "last_modified", "fetched_at" FROM "{table}" '
+                'WHERE "key" = ?'.format(table=TABLE_NAME),
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                'UPDATE "{table}" SET "last_access" = ? WHERE "key" = ?'.format(table=TABLE_NAME),
+                (now, key),
+            )
+        body, etag, last_modified, fetched_at = row
+        return body, etag, last_modified, now - fetched_at < max_age
+
+    def put(self, key: str, body: bytes, etag: str = None, last_modified: str = None):
+        """store body of a 200 response, compressed if it is not gzip yet"""
+        if not self.is_enabled():
+            return
+        body = bytes(body)
+        if body[:2] != GZIP_MAGIC:
+            body = gzip.compress(body, compresslevel=COMPRESS_LEVEL)
+        if len(body) > self.max_size:
+            return
+        now = time.time()
+        with self._lock:
+            conn = self._get_conn()
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                'SELECT "size" FROM "{table}" WHERE "key" = ?'.format(table=TABLE_NAME), (key,)
+            ).fetchone()
+            conn.execute(
+                'INSERT OR REPLACE INTO "{table}" VALUES (?, ?, ?, ?, ?, ?, ?)'.format(
+                    table=TABLE_NAME
+                ),
+                (key, body, etag, last_modified, now, now, len(body)),
+            )
+            conn.execute("COMMIT")
+            self._total_size += len(body) - (row[0] if row else 0)
+            if self._total_size > self.max_size:
+                self._evict(conn)
+
+    def refresh(self, key: str):
+        """entry is revalidated (304), it is fresh again"""
+        if not self.is_enabled():
+            return
+        now = time.time()
+        with self._lock:
+            self._get_conn().execute(
+                'UPDATE "{table}" SET "fetched_at" = ?, "last_access" = ? WHERE "key" = ?'.format(
+                    table=TABLE_NAME
+                ),
+                (now, now, key),
+            )
+
+    def _evict(self, conn):
+        """delete least recently used entries down to EVICT_LOW_RATIO of max_size"""
+        target = self.max_size * EVICT_LOW_RATIO
+        if self._total_size <= target:
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        lst_key = list()
+        for key, size in conn.execute(
+            'SELECT "key", "size" FROM "{table}" ORDER BY "last_access"'.format(table=TABLE_NAME)
+        ):
+            if self._total_size <= target:
+                break
+            lst_key.append((key,))
+            self._total_size -= size
+        conn.executemany('DELETE FROM "{table}" WHERE "key" = ?'.format(table=TABLE_NAME), lst_key)
+        conn.execute("COMMIT")
+
+    def get_size(self) -> int:
+        with self._lock:
+            self._get_conn()
+            return self._total_size
+
+    def clear(self):
+        with self._lock:
+            self._get_conn().execute('DELETE FROM "{table}"'.format(table=TABLE_NAME))
+            self._total_size = 0
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+tile_cache = TileResponseCache(os.path.join(config.USER_PLUGIN_DIR, "cache", "tile_cache.sqlite"))
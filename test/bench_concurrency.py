@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+# Copyright (c) 2019 HERE Europe B.V.
+#
+# SPDX-License-Identifier: MIT
+#
+###############################################################################
+
+"""Benchmark requests in flight: fixed n_parallel vs. adaptive window (AIMDLimiter).
+
+Usage: ./runTest.sh test/bench_concurrency.py [n_request [latency_ms [capacity]]]
+
+A local stand-in server answers each request after the injected latency, and with 429
+when more than capacity requests are in flight. Requests answered with 429 are retried.
+"""
+
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.abspath("."))
+
+from XYZHubConnector.xyz_qgis.network.concurrency import AIMDLimiter
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency, capacity):
+        super().__init__(("127.0.0.1", 0), StandInHandler)
+        self.latency = latency
+        self.capacity = capacity
+        self.n_active = 0
+        self.lock = threading.Lock()
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.n_active += 1
+            busy = server.n_active > server.capacity
+        try:
+            time.sleep(server.latency)
+            body = b'{"type":"FeatureCollection","features":[]}'
+            self.send_response(429 if busy else 200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with server.lock:
+                server.n_active -= 1
+
+    def log_message(self, *a):
+        pass
+
+
+class FixedWindow(object):
+    def __init__(self, n):
+        self.n = n
+
+    def get_window(self):
+        return self.n
+
+    def on_reply(self, *a, **kw):
+        pass
+
+
+def run(url, n_request, limiter):
+    """send n_request requests, at most limiter.get_window() in flight
+
+    :return: (elapsed time, number of 429, max window)
+    """
+    cond = threading.Condition()
+    state = dict(todo=n_request, active=0, n_429=0, max_window=0)
+
+    def _request():
+        t_sent = time.monotonic()
+        try:
+            status = urllib.request.urlopen(url).status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        limiter.on_reply(t_sent, time.monotonic(), status)
+        with cond:
+            state["active"] -= 1
+            if status == 429:
+                state["n_429"] += 1
+                state["todo"] += 1  # retry
+            cond.notify()
+
+    t0 = time.monotonic()
+    with cond:
+        while state["todo"] or state["active"]:
+            window = limiter.get_window()
+            state["max_window"] = max(state["max_window"], window)
+            if state["todo"] and state["active"] < window:
+                state["todo"] -= 1
+                state["active"] += 1
+                threading.Thread(target=_request, daemon=True).start()
+            else:
+                cond.wait()
+    return time.monotonic() - t0, state["n_429"], state["max_window"]
+
+
+def main(n_request=200, latency_ms=50, capacity=6):
+    server = StandInServer(latency_ms / 1000, capacity)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = "http://127.0.0.1:%s/tile" % server.server_address[1]
+    print(
+        "%s requests, latency %s ms, server capacity %s in flight"
+        % (n_request, latency_ms, capacity)
+    )
+    for name, limiter in [
+        ("fixed 1", FixedWindow(1)),
+        ("fixed 2", FixedWindow(2)),
+        ("aimd", AIMDLimiter(max_window=16)),
+    ]:
+        elapsed, n_429, max_window = run(url, n_request, limiter)
+        print(
+            "%-8s %6.2f s %7.1f req/s  429: %3d  max window: %s"
+            % (name, elapsed, n_request / elapsed, n_429, max_window)
+        )
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+# Copyright (c) 2019 HERE Europe B.V.
+#
+# SPDX-License-Identifier: MIT
+# License-Filename: LICENSE
+#
+###############################################################################
+
+"""Benchmark decoding of (gzip) feature responses: decode_byte vs. decode_json.
+
+Usage: ./runTest.sh test/bench_decode.py [response.geojson[.gz] ...]
+
+Without arguments, synthetic responses of 1, 10 and 100 MB are used.
+Time and peak python memory (tracemalloc) are reported for each decode path,
+the json backend in use depends on whether orjson or simdjson is installed.
+"""
+
+import gzip
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath("."))
+
+from qgis.PyQt.QtCore import QByteArray
+
+from XYZHubConnector.xyz_qgis.network import net_utils
+from XYZHubConnector.xyz_qgis.network.json_stream import JsonStreamDecoder
+
+
+def make_response(size_mb):
+    feat = {
+        "type": "Feature",
+        "id": "0",
+        "geometry": {"type": "LineString", "coordinates": [[13.4, 52.5]] * 20},
+        "properties": {"name": "feature", "height": 10, "@ns:com:here:xyz": {"tags": []}},
+    }
+    n = int(size_mb * 1e6 / len(json.dumps(feat)))
+    obj = {"type": "FeatureCollection", "features": [dict(feat, id=str(i)) for i in range(n)]}
+    return gzip.compress(json.dumps(obj).encode("utf-8"), compresslevel=1)
+
+
+def decode_stream(raw, chunk_size=1 << 16):
+    byt = bytes(raw)
+    decoder = JsonStreamDecoder()
+    for i in range(0, len(byt), chunk_size):
+        decoder.feed(byt[i : i + chunk_size])
+    return decoder.finish()
+
+
+def measure(name, fn, raw):
+    tracemalloc.start()
+    t0 = time.time()
+    fn(raw)
+    dt = time.time() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("%-15s %8.3fs %10.1f MB" % (name, dt, peak / 1e6))
+
+
+def bench(name, byt):
+    raw = QByteArray(byt)
+    print("%s: %.1f MB compressed" % (name, len(byt) / 1e6))
+    measure("decode_byte", net_utils.decode_byte, raw)
+    measure("decode_json", net_utils.decode_json, raw)
+    measure("stream", decode_stream, raw)
+
+
+if __name__ == "__main__":
+    print("json backend: %s" % net_utils._json_loads.__name__)
+    if len(sys.argv) > 1:
+        for fname in sys.argv[1:]:
+            with open(fname, "rb") as f:
+                bench(fname, f.read())
+    else:
+        for size_mb in [1, 10, 100]:
+            bench("%s MB" % size_mb, make_response(size_mb))
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+# Copyright (c) 2019 HERE Europe B.V.
+#
+# SPDX-License-Identifier: MIT
+#
+###############################################################################
+
+"""Benchmark writing features into the GeoPackage cache:
+per-row insert with the unique xyz_id trigger (as through OGR) vs. GpkgBulkWriter,
+which drops the trigger and upserts by the unique index (ON CONFLICT DO UPDATE).
+
+Usage: ./runTest.sh test/bench_gpkg_writer.py [n_feat ...]
+
+Without arguments, 10k, 100k and 1M features are written. Each path writes the features
+into an empty table (insert), then writes them again (update of existing xyz_id).
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath("."))
+
+from test.test_gpkg_writer import SQL_UPDATE_RTREE, make_gpkg, point_row
+
+from XYZHubConnector.xyz_qgis.layer import gpkg_writer
+from XYZHubConnector.xyz_qgis.layer.gpkg_writer import GpkgBulkWriter
+
+LAYER_NAME = "Point_0"
+COLUMNS = ["xyz_id", "name", "height"]
+BATCH_SIZE = 10000  # features per transaction, e.g. rendered tiles per flush
+
+
+def make_rows(writer, n):
+    return [point_row(writer, str(i), i * 1e-5, -i * 1e-5, "name", 1.5) for i in range(n)]
+
+
+def write_trigger(fname, lst_rows):
+    """insert one row at a time, the trigger deletes existing xyz_id"""
+    conn = sqlite3.connect(fname, isolation_level=None)
+    for name, fun in gpkg_writer.SQL_FUNCTIONS:
+        conn.create_function(name, 1, fun)
+    conn.execute(gpkg_writer.SQL_INDEX_UNIQUE_ID.format(layer_name=LAYER_NAME, id_column="xyz_id"))
+    sql = 'INSERT INTO "{t}" ("geom", {columns}) VALUES (?, ?, ?, ?)'.format(
+        t=LAYER_NAME, columns=",".join('"%s"' % c for c in COLUMNS)
+    )
+    for rows in lst_rows:
+        conn.execute("BEGIN")
+        for row in rows:
+            conn.execute(sql, row)
+        conn.execute("COMMIT")
+    conn.close()
+
+
+def write_bulk(fname, lst_rows, writer=None):
+    writer = writer or GpkgBulkWriter(fname, LAYER_NAME)
+    for rows in lst_rows:
+        writer.upsert(COLUMNS, rows)
+    writer.close()
+
+
+def measure(name, fn, n, update_rtree):
+    fd, fname = tempfile.mkstemp(suffix=".gpkg")
+    os.close(fd)
+    make_gpkg(fname, LAYER_NAME, update_rtree)
+    rows = make_rows(GpkgBulkWriter(fname, LAYER_NAME), n)
+    lst_rows = [rows[i : i + BATCH_SIZE] for i in range(0, n, BATCH_SIZE)]
+    result = list()
+    for phase in ["insert", "update"]:
+        t0 = time.time()
+        fn(fname, lst_rows)
+        dt = time.time() - t0
+        result.append("%s %10.0f rows/s" % (phase, n / dt))
+    print("%-10s %s" % (name, "  ".join(result)))
+    for suffix in ["", "-wal", "-shm"]:
+        if os.path.exists(fname + suffix):
+            os.remove(fname + suffix)
+
+
+def bench(n):
+    print("%s features" % n)
+    measure("trigger", write_trigger, n, SQL_UPDATE_RTREE[0])
+    measure("bulk", write_bulk, n, SQL_UPDATE_RTREE[0])
+
+
+if __name__ == "__main__":
+    lst_n = [int(n) for n in sys.argv[1:]] or [10000, 100000, 1000000]
+    for n in lst_n:
+        bench(n)
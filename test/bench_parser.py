@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+# Copyright (c) 2019 HERE Europe B.V.
+#
+# SPDX-License-Identifier: MIT
+# License-Filename: LICENSE
+#
+###############################################################################
+
+"""Benchmark parsing of xyz geojson: ogr path vs. wkb fast path,
+and export of QgsFeature back to xyz geojson (upload preparation).
+
+Usage: ./runTest.sh test/bench_parser.py [n_feat] [n_vertex]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath("."))
+
+from qgis.testing import start_app
+
+from XYZHubConnector.xyz_qgis.layer import parser, wkb_utils
+
+app = start_app()
+
+
+def make_polygon_feat(idx, n_vertex):
+    x0, y0 = random.uniform(-170, 170), random.uniform(-80, 80)
+    ring = [[x0 + 0.01 * random.random(), y0 + 0.01 * random.random()] for _ in range(n_vertex)]
+    ring.append(list(ring[0]))
+    return {
+        "type": "Feature",
+        "id": str(idx),
+        "geometry": {"type": "Polygon", "coordinates": [ring]},
+        "properties": {"name": "feat %s" % idx, "height": idx % 100},
+    }
+
+
+def make_point_feat(idx):
+    return {
+        "type": "Feature",
+        "id": str(idx),
+        "geometry": {"type": "Point", "coordinates": [random.uniform(-180, 180), 1.0]},
+        "properties": {"name": "feat %s" % idx},
+    }
+
+
+def timeit(name, fn, *a):
+    t0 = time.time()
+    out = fn(*a)
+    print("%-30s %.3fs" % (name, time.time() - t0))
+    return out
+
+
+def bench_geometry(lst_feat):
+    lst_geom = [ft["geometry"] for ft in lst_feat]
+    timeit("ogr", lambda: [parser.make_geometry_ogr(g) for g in lst_geom])
+    timeit("wkb single", lambda: [parser.make_geometry(g) for g in lst_geom])
+    timeit(
+        "wkb batch",
+        lambda: [
+            parser.make_geometry(g, wkb)
+            for g, wkb in zip(lst_geom, wkb_utils.geojson_to_wkb_batch(lst_geom))
+        ],
+    )
+
+
+def bench_feature_map(lst_feat):
+    obj = parser.feature_collection(lst_feat)
+    return timeit("xyz_json_to_feature_map", parser.xyz_json_to_feature_map, obj)
+
+
+def bench_export(map_feat):
+    features = [ft for lst in map_feat.values() for feats in lst for ft in feats]
+    timeit("feature_to_xyz_json", parser.feature_to_xyz_json, features)
+
+
+if __name__ == "__main__":
+    n_feat = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    n_vertex = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    random.seed(0)
+
+    print("Polygon: %s features, %s vertices" % (n_feat, n_vertex))
+    polygons = [make_polygon_feat(i, n_vertex) for i in range(n_feat)]
+    bench_geometry(polygons)
+    map_feat, _ = bench_feature_map(polygons)
+    bench_export(map_feat)
+
+    print("Point: %s features" % n_feat)
+    points = [make_point_feat(i) for i in range(n_feat)]
+    bench_geometry(points)
+    map_feat, _ = bench_feature_map(points)
+    bench_export(map_feat)
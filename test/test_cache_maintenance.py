@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+# Copyright (c) 2019 HERE Europe B.V.
+#
+# SPDX-License-Identifier: MIT
+#
+###############################################################################
+
+import os
+import sqlite3
+import tempfile
+
+from test.utils import BaseTestAsync
+
+from qgis.testing import unittest
+from XYZHubConnector.xyz_qgis.layer import cache_maintenance, gpkg_writer
+
+
+class TestCacheMaintenance(BaseTestAsync):
+    def setUp(self):
+        super().setUp()
+        fd, self.fname = tempfile.mkstemp(suffix=".gpkg")
+        os.close(fd)
+        conn = sqlite3.connect(self.fname)
+        conn.execute('CREATE TABLE "Point_0" ("fid" INTEGER PRIMARY KEY, "xyz_id" TEXT, "v" TEXT)')
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        os.remove(self.fname)
+        super().tearDown()
+
+    def _fill_and_delete(self, conn, cnt=2000):
+        conn.execute("BEGIN")
+        conn.executemany(
+            'INSERT INTO "Point_0" ("xyz_id", "v") VALUES (?, ?)',
+            ((str(i), "x" * 1000) for i in range(cnt)),
+        )
+        conn.execute('DELETE FROM "Point_0"')
+        conn.execute("COMMIT")
+
+    def test_ensure_schema(self):
+        conn = sqlite3.connect(self.fname, isolation_level=None)
+        conn.executescript(
+            gpkg_writer.SQL_TRIGGER_UNIQUE_ID.format(layer_name="Point_0", id_column="xyz_id")
+        )
+        self.assertEqual(len(cache_maintenance.missing_schema(conn, "Point_0")), 2)
+        self.assertEqual(cache_maintenance.ensure_schema(conn, "Point_0"), 2)
+        self.assertEqual(cache_maintenance.missing_schema(conn, "Point_0"), [])
+        self.assertEqual(cache_maintenance.ensure_schema(conn, "Point_0"), 0)
+        self.assertEqual(cache_maintenance.missing_schema(conn, "Line_0"), [])
+
+        # xyz_id is kept unique, obsolete trigger is dropped
+        conn.execute('INSERT INTO "Point_0" ("xyz_id", "v") VALUES (?, ?)', ("a", "1"))
+        with self.assertRaises(sqlite3.IntegrityError):
+            conn.execute('INSERT INTO "Point_0" ("xyz_id", "v") VALUES (?, ?)', ("a", "2"))
+        self.assertEqual(conn.execute('SELECT "v" FROM "Point_0"').fetchall(), [("1",)])
+        conn.close()
+
+    def test_need_vacuum(self):
+        self.assertFalse(cache_maintenance.need_vacuum(0, 0, 4096))
+        self.assertFalse(cache_maintenance.need_vacuum(100, 200, 4096))  # small
+        self.assertFalse(cache_maintenance.need_vacuum(10000, 100000, 4096))  # low ratio
+        self.assertTrue(cache_maintenance.need_vacuum(50000, 100000, 4096))
+
+    def test_reclaim_full_vacuum(self):
+        conn = sqlite3.connect(self.fname, isolation_level=None)
+        self._fill_and_delete(conn)
+        free_pages, page_count, _, auto_vacuum = cache_maintenance.freelist_stats(conn)
+        self.assertGreater(free_pages, 0)
+        self.assertNotEqual(auto_vacuum, cache_maintenance.AUTO_VACUUM_INCREMENTAL)
+
+        self.assertTrue(cache_maintenance.reclaim_free_pages(conn))
+        free_pages2, page_count2, _, auto_vacuum = cache_maintenance.freelist_stats(conn)
+        self.assertEqual(free_pages2, 0)
+        self.assertLess(page_count2, page_count)
+        self.assertEqual(auto_vacuum, cache_maintenance.AUTO_VACUUM_INCREMENTAL)
+        conn.close()
+
+    def test_reclaim_incremental(self):
+        cache_maintenance.set_incremental_vacuum(self.fname)
+        conn = sqlite3.connect(self.fname, isolation_level=None)
+        self._fill_and_delete(conn)
+        free_pages, _, _, _ = cache_maintenance.freelist_stats(conn)
+
+        lst_progress = list()
+        self.assertTrue(
+            cache_maintenance.reclaim_free_pages(
+                conn, set_progress=lst_progress.append, step=free_pages // 4
+            )
+        )
+        self.assertEqual(cache_maintenance.freelist_stats(conn)[0], 0)
+        self.assertGreater(len(lst_progress), 2)
+        self.assertEqual(lst_progress, sorted(lst_progress))
+        self.assertEqual(lst_progress[-1], 1)
+
+        # canceled
+        self._fill_and_delete(conn)
+        self.assertFalse(cache_maintenance.reclaim_free_pages(conn, is_canceled=lambda: True))
+        self.assertGreater(cache_maintenance.freelist_stats(conn)[0], 0)
+        conn.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+# Copyright (c) 2019 HERE Europe B.V.
+#
+# SPDX-License-Identifier: MIT
+#
+###############################################################################
+
+from test.utils import BaseTestAsync
+
+from qgis.testing import unittest
+from XYZHubConnector.xyz_qgis.controller import NetworkFun
+from XYZHubConnector.xyz_qgis.network.concurrency import AIMDLimiter, HostLimiters
+
+
+class TestAIMDLimiter(BaseTestAsync):
+    def _succeed(self, limiter, n, latency=0.1, t=0.0):
+        for i in range(n):
+            limiter.on_reply(t, t + latency, 200)
+        return t + latency
+
+    def test_increase(self):
+        limiter = AIMDLimiter(max_window=4, initial=1)
+        self.assertEqual(limiter.get_window(), 1)
+        self._succeed(limiter, 1)
+        self.assertEqual(limiter.get_window(), 2)
+        self._succeed(limiter, 2)  # about +1 per window of replies
+        self.assertEqual(limiter.get_window(), 2)
+        self._succeed(limiter, 100)
+        self.assertEqual(limiter.get_window(), 4)  # ceiling
+
+    def test_latency_unhealthy(self):
+        limiter = AIMDLimiter(max_window=16, initial=2)
+        self._succeed(limiter, 10, latency=0.1)
+        window = limiter.get_window()
+        self._succeed(limiter, 50, latency=1.0)
+        self.assertFalse(limiter.is_latency_healthy())
+        self.assertLessEqual(limiter.get_window(), window + 2)
+
+    def test_decrease(self):
+        limiter = AIMDLimiter(max_window=16, initial=8)
+        limiter.on_reply(0.0, 1.0, 429)
+        self.assertEqual(limiter.get_window(), 4)
+        # requests sent before the decrease belong to the same congestion
+        limiter.on_reply(0.5, 1.2, 503)
+        limiter.on_reply(0.9, 1.3, None, is_timeout=True)
+        self.assertEqual(limiter.get_window(), 4)
+        limiter.on_reply(1.1, 2.0, 500)
+        self.assertEqual(limiter.get_window(), 2)
+        for t in range(3, 10):
+            limiter.on_reply(t, t + 1, None, is_timeout=True)
+        self.assertEqual(limiter.get_window(), 1)  # floor
+
+        # other errors are ignored
+        limiter.on_reply(20.0, 21.0, 404)
+        limiter.on_reply(20.0, 21.0, None)
+        self.assertEqual(limiter.get_window(), 1)
+
+    def test_in_flight(self):
+        limiter = AIMDLimiter(max_window=4, initial=2)
+        limiter.reserve()
+        limiter.reserve()
+        self.assertEqual(limiter.in_flight, 2)
+        self.assertFalse(limiter.in_flight < limiter.get_window())
+        limiter.release()
+        self.assertTrue(limiter.in_flight < limiter.get_window())
+        limiter.release()
+        limiter.release()  # e.g. released on abort and on finish
+        self.assertEqual(limiter.in_flight, 0)
+
+    def test_host_limiters(self):
+        limiters = HostLimiters(max_window=4)
+        lst_report = list()
+        limiters.add_listener(lambda host, window: lst_report.append((host, window)))
+        limiters.set_ceiling("b", 2)
+        a, b = limiters.get("a"), limiters.get("b")
+        self.assertIs(limiters.get("a"), a)
+        self._succeed(a, 100)
+        self._succeed(b, 100)
+        self.assertEqual(limiters.get_windows(), dict(a=4, b=2))
+        self.assertEqual(lst_report[-1], ("a", 4))
+        self.assertNotIn(("b", 3), lst_report)
+
+        limiters.set_default_ceiling(3)
+        self.assertEqual(limiters.get_windows(), dict(a=3, b=2))
+        self.assertEqual(lst_report[-1], ("a", 3))
+
+
+class TestNetworkFun(BaseTestAsync):
+    def test_set_host(self):
+        host_limiters = HostLimiters()
+        fun = NetworkFun(lambda: None, host_limiters)
+        self.assertIsNone(fun.limiter)
+        # limiter is known before the first request
+        fun.set_host("a.com")
+        self.assertIs(fun.limiter, host_limiters.get("a.com"))
+        # without limiters
+        fun = NetworkFun(lambda: None)
+        fun.set_host("a.com")
+        self.assertIsNone(fun.limiter)
+
+
+if __name__ == "__main__":
+    unittest.main()
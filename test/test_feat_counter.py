@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+# Copyright (c) 2019 HERE Europe B.V.
+#
+# SPDX-License-Identifier: MIT
+#
+###############################################################################
+
+import os
+import sqlite3
+import tempfile
+
+from test.utils import BaseTestAsync
+
+from qgis.testing import unittest
+from XYZHubConnector.xyz_qgis.layer.feat_counter import FeatureCounter
+
+
+class TestFeatureCounter(BaseTestAsync):
+    def setUp(self):
+        super().setUp()
+        fd, self.fname = tempfile.mkstemp(suffix=".gpkg")
+        os.close(fd)
+        conn = sqlite3.connect(self.fname)
+        conn.execute('CREATE TABLE "Point_0" ("fid" INTEGER PRIMARY KEY, "xyz_id" TEXT)')
+        conn.executemany(
+            'INSERT INTO "Point_0" ("xyz_id") VALUES (?)', [(str(i),) for i in range(5)]
+        )
+        conn.commit()
+        conn.close()
+        self.lst_counter = list()
+
+    def tearDown(self):
+        for feat_counter in self.lst_counter:
+            feat_counter.close()
+        os.remove(self.fname)
+        super().tearDown()
+
+    def _new_counter(self):
+        feat_counter = FeatureCounter(self.fname, "Point_0")
+        feat_counter.init()
+        self.lst_counter.append(feat_counter)
+        return feat_counter
+
+    def _insert(self, cnt):
+        conn = sqlite3.connect(self.fname)
+        conn.executemany('INSERT INTO "Point_0" ("xyz_id") VALUES (?)', [("x",)] * cnt)
+        conn.commit()
+        conn.close()
+
+    def test_count(self):
+        feat_counter = self._new_counter()
+        # reconciled by COUNT(*)
+        self.assertEqual(feat_counter.get(), 5)
+        feat_counter.add(3)
+        feat_counter.add(-1)
+        self.assertEqual(feat_counter.get(), 7)
+
+        # persisted, not counted again
+        self._insert(10)
+        self.assertEqual(self._new_counter().get(), 7)
+
+        # reconciled after invalidate
+        feat_counter.invalidate()
+        self.assertEqual(self._new_counter().get(), 15)
+
+        feat_counter.reset(0)
+        self.assertEqual(feat_counter.get(), 0)
+        self.assertEqual(self._new_counter().get(), 0)
+
+    def test_add_unknown(self):
+        # change made before the count is known is included by COUNT(*)
+        feat_counter = self._new_counter()
+        self._insert(2)
+        feat_counter.add(2)
+        self.assertEqual(feat_counter.get(), 7)
+
+    def test_transaction(self):
+        feat_counter = self._new_counter()
+        self.assertEqual(feat_counter.get(), 5)
+        conn = sqlite3.connect(self.fname)
+        conn.execute("BEGIN IMMEDIATE")
+        feat_counter.add(2, conn=conn)
+        self.assertEqual(feat_counter.get(), 7)
+        conn.rollback()  # not committed by add
+        feat_counter.discard()
+        self.assertEqual(feat_counter.get(), 5)
+
+        conn.execute("BEGIN IMMEDIATE")
+        feat_counter.add(2, conn=conn)
+        conn.commit()
+        conn.close()
+        self.assertEqual(self._new_counter().get(), 7)
+
+        feat_counter.add_pending(3)
+        self.assertEqual(feat_counter.get_pending(), 3)
+        feat_counter.add_pending(-3)
+        self.assertEqual(feat_counter.get_pending(), 0)
+
+    def test_get_without_write_lock(self):
+        feat_counter = self._new_counter()
+        conn = sqlite3.connect(self.fname, timeout=0)
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute('INSERT INTO "Point_0" ("xyz_id") VALUES (?)', ("x",))
+        # committed rows are counted while the writer holds the db
+        self.assertEqual(feat_counter.get(), 5)
+        feat_counter.add(1, conn=conn)
+        conn.commit()
+        conn.close()
+        self.assertEqual(feat_counter.get(), 6)
+        self.assertEqual(self._new_counter().get(), 6)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -161,6 +161,65 @@ class TestFieldsSimilarity(BaseTestAsync):
         # prepare_fields
 
 
+class TestFieldsCache(BaseTestAsync):
+    def _make_fields(self, names):
+        fields = parser.new_fields_gpkg()
+        for k in names:
+            fields.append(parser.make_field(k, 1))
+        return fields
+
+    def test_score_inverted_index(self):
+        random.seed(0)
+        keys = ["a", "b", "c", "d", "e", "f", parser.QGS_ID.upper(), "@ns:com:here:xyz"]
+        lst_fields = [self._make_fields(random.sample(keys[:-2], k)) for k in range(6)]
+        cache = parser.FieldsCache()
+        for _ in range(50):
+            props_names = random.sample(keys, random.randint(0, len(keys)))
+            props = parser.rename_special_props(dict.fromkeys(props_names, 1))
+            names = list(props.keys())
+            expected = [
+                parser.fields_similarity(
+                    [f.name() for f in parser.non_expression_fields(fields)], props_names, names
+                )
+                if fields.size() > 1
+                else -1
+                for fields in lst_fields
+            ]
+            with self.subTest(props_names=props_names):
+                self.assertEqual(cache.score(lst_fields, names), expected)
+
+    def test_cached_feature_map(self):
+        random.seed(0)
+        keys = ["k%s" % i for i in range(20)]
+        features = [
+            dict(
+                type="Feature",
+                geometry=dict(type="Point", coordinates=[0, i]),
+                properties=dict.fromkeys(random.sample(keys, random.randint(1, 5)), i),
+            )
+            for i in range(200)
+        ]
+        for similarity_threshold in [0, 50, 80, 100]:
+            with self.subTest(similarity_threshold=similarity_threshold):
+                map_fields1, map_fields2, map_fields_cache = dict(), dict(), dict()
+                for i in range(0, len(features), 50):
+                    obj = parser.feature_collection(features[i : i + 50])
+                    map_feat1, _ = parser.xyz_json_to_feature_map(
+                        obj, map_fields1, similarity_threshold
+                    )
+                    map_feat2, _ = parser.xyz_json_to_feature_map(
+                        obj, map_fields2, similarity_threshold, map_fields_cache
+                    )
+                    self.assertEqual(
+                        [[len(lst) for lst in v] for v in map_feat1.values()],
+                        [[len(lst) for lst in v] for v in map_feat2.values()],
+                    )
+                self.assertEqual(
+                    [[f.names() for f in v] for v in map_fields1.values()],
+                    [[f.names() for f in v] for v in map_fields2.values()],
+                )
+
+
 class TestUniqueFieldName(BaseTestAsync):
     def test_transform_unique_field_names(self):
         fid = parser.QGS_ID
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+# Copyright (c) 2019 HERE Europe B.V.
+#
+# SPDX-License-Identifier: MIT
+#
+###############################################################################
+
+import os
+import sqlite3
+import struct
+import tempfile
+
+from test.utils import BaseTestAsync
+
+from qgis.testing import unittest
+from XYZHubConnector.xyz_qgis.layer import gpkg_writer
+from XYZHubConnector.xyz_qgis.layer.gpkg_writer import GpkgBulkWriter
+
+# minimal GeoPackage feature table with rtree index, as created by GDAL
+# (update trigger as of GDAL < 3.6 with INSERT OR REPLACE, or UPDATE)
+SQL_CREATE_TABLE = """
+CREATE TABLE "gpkg_geometry_columns" (
+    "table_name" TEXT, "column_name" TEXT, "geometry_type_name" TEXT,
+    "srs_id" INTEGER, "z" TINYINT, "m" TINYINT);
+INSERT INTO "gpkg_geometry_columns" VALUES ('{t}', 'geom', 'POINT', 4326, 1, 0);
+CREATE TABLE "{t}" (
+    "fid" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL, "geom" POINT,
+    "xyz_id" TEXT, "name" TEXT, "height" REAL);
+CREATE VIRTUAL TABLE "rtree_{t}_geom" USING rtree(id, minx, maxx, miny, maxy);
+CREATE TRIGGER "rtree_{t}_geom_insert" AFTER INSERT ON "{t}"
+WHEN (new."geom" NOT NULL AND NOT ST_IsEmpty(NEW."geom")) BEGIN
+INSERT OR REPLACE INTO "rtree_{t}_geom" VALUES (NEW."fid",
+ST_MinX(NEW."geom"), ST_MaxX(NEW."geom"), ST_MinY(NEW."geom"), ST_MaxY(NEW."geom")); END;
+CREATE TRIGGER "rtree_{t}_geom_update1" AFTER UPDATE OF "geom" ON "{t}"
+WHEN OLD."fid" = NEW."fid" AND (NEW."geom" NOTNULL AND NOT ST_IsEmpty(NEW."geom")) BEGIN
+{update_rtree}; END;
+CREATE TRIGGER "rtree_{t}_geom_update2" AFTER UPDATE OF "geom" ON "{t}"
+WHEN OLD."fid" = NEW."fid" AND (NEW."geom" ISNULL OR ST_IsEmpty(NEW."geom")) BEGIN
+DELETE FROM "rtree_{t}_geom" WHERE id = OLD."fid"; END;
+CREATE TRIGGER "rtree_{t}_geom_delete" AFTER DELETE ON "{t}"
+WHEN old."geom" NOT NULL BEGIN DELETE FROM "rtree_{t}_geom" WHERE id = OLD."fid"; END;
+"""
+
+SQL_UPDATE_RTREE = [
+    """INSERT OR REPLACE INTO "rtree_{t}_geom" VALUES (NEW."fid",
+    ST_MinX(NEW."geom"), ST_MaxX(NEW."geom"), ST_MinY(NEW."geom"), ST_MaxY(NEW."geom"))""",
+    """UPDATE "rtree_{t}_geom" SET minx = ST_MinX(NEW."geom"), maxx = ST_MaxX(NEW."geom"),
+    miny = ST_MinY(NEW."geom"), maxy = ST_MaxY(NEW."geom") WHERE id = NEW.fid""",
+]
+
+
+def make_gpkg(fname, layer_name, update_rtree=SQL_UPDATE_RTREE[0], unique_trigger=True):
+    conn = sqlite3.connect(fname)
+    for name, fun in gpkg_writer.SQL_FUNCTIONS:
+        conn.create_function(name, 1, fun)
+    conn.executescript(
+        SQL_CREATE_TABLE.format(t=layer_name, update_rtree=update_rtree.format(t=layer_name))
+    )
+    kw = dict(layer_name=layer_name, id_column="xyz_id")
+    if unique_trigger:
+        conn.executescript(gpkg_writer.SQL_TRIGGER_UNIQUE_ID.format(**kw))
+    conn.commit()
+    conn.close()
+
+
+def point_wkb(x, y, z=0.0):
+    return struct.pack("<BI3d", 1, 1001, x, y, z)
+
+
+def point_row(writer, xyz_id, x, y, name=None, height=None):
+    blob = writer.make_blob(point_wkb(x, y), (x, x, y, y))
+    return [blob, xyz_id, name, height]
+
+
+class TestGpkgBulkWriter(BaseTestAsync):
+    layer_name = "Point_0"
+
+    def _make_writer(self, update_rtree=SQL_UPDATE_RTREE[0], unique_trigger=True):
+        fd, self.fname = tempfile.mkstemp(suffix=".gpkg")
+        os.close(fd)
+        make_gpkg(self.fname, self.layer_name, update_rtree, unique_trigger)
+        writer = GpkgBulkWriter(self.fname, self.layer_name)
+        self.addCleanup(self._remove_gpkg, self.fname, writer)
+        return writer
+
+    def _remove_gpkg(self, fname, writer):
+        writer.close()
+        for suffix in ["", "-wal", "-shm"]:
+            if os.path.exists(fname + suffix):
+                os.remove(fname + suffix)
+
+    def _select(self, sql):
+        conn = sqlite3.connect(self.fname)
+        rows = conn.execute(sql).fetchall()
+        conn.close()
+        return rows
+
+    def test_upsert(self):
+        for i, update_rtree in enumerate(SQL_UPDATE_RTREE):
+            for unique_trigger in [True, False]:
+                with self.subTest(update_rtree=i, unique_trigger=unique_trigger):
+                    self._test_upsert(self._make_writer(update_rtree, unique_trigger), i == 0)
+
+    def _test_upsert(self, writer, legacy_rtree):
+        columns = ["xyz_id", "name", "height"]
+        triggers = dict(self._select("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'"))
+        writer.connect()
+        self.assertEqual(writer.geom_column, "geom")
+        self.assertEqual(writer.srs_id, 4326)
+        self.assertEqual(writer.rtree, "rtree_Point_0_geom")
+        # schema is updated once by connect: unique index, no unique id trigger
+        names = [name for (name,) in self._select("SELECT name FROM sqlite_master")]
+        self.assertIn("idx_Point_0_xyz_id", names)
+        self.assertNotIn("trigger_Point_0_xyz_id_insert", names)
+        triggers.pop("trigger_Point_0_xyz_id_insert", None)
+        if legacy_rtree:
+            # update trigger of GDAL < 3.6 is replaced
+            triggers.pop("rtree_Point_0_geom_update1")
+            self.assertNotIn("rtree_Point_0_geom_update1", names)
+            self.assertIn("rtree_Point_0_geom_update6", names)
+            self.assertIn("rtree_Point_0_geom_update7", names)
+        # other triggers are kept
+        self.assertEqual(
+            triggers,
+            {
+                name: sql
+                for name, sql in self._select(
+                    "SELECT name, sql FROM sqlite_master WHERE type = 'trigger'"
+                )
+                if name in triggers
+            },
+        )
+
+        rows = [point_row(writer, str(i), i, -i, "a", 1.5 * i) for i in range(10)]
+        self.assertEqual(writer.upsert(columns, rows), 10)
+        rows = [point_row(writer, str(i), 2 * i, i, "b") for i in range(5, 15)]
+        self.assertEqual(writer.upsert(columns, rows), 5)  # 5 updated
+
+        table = self._select('SELECT "fid", "xyz_id", "name", "height" FROM "Point_0"')
+        self.assertEqual(len(table), 15)
+        by_id = {xyz_id: (fid, name, height) for fid, xyz_id, name, height in table}
+        self.assertEqual(by_id["0"][1:], ("a", 0.0))
+        self.assertEqual(by_id["5"], (6, "b", None))  # updated in place
+
+        # rtree is maintained by the triggers of GDAL
+        rtree = self._select('SELECT "id", "minx", "miny" FROM "rtree_Point_0_geom"')
+        self.assertEqual(len(rtree), 15)
+        self.assertIn((6, 10.0, 5.0), rtree)
+
+        # empty geometry is removed from rtree
+        blob = writer.make_blob(struct.pack("<BII", 1, 1004, 0))
+        self.assertEqual(writer.upsert(columns, [[blob, "5", None, None]]), 0)
+        rtree = self._select('SELECT "id" FROM "rtree_Point_0_geom"')
+        self.assertEqual(len(rtree), 14)
+        self.assertNotIn((6,), rtree)
+        if legacy_rtree:
+            # and added again
+            self.assertEqual(writer.upsert(columns, [point_row(writer, "5", 1, 2)]), 0)
+            rtree = self._select('SELECT "id", "minx", "miny" FROM "rtree_Point_0_geom"')
+            self.assertIn((6, 1.0, 2.0), rtree)
+
+        # rows without id are inserted, duplicated ids are counted once
+        rows = [point_row(writer, None, 0, 0), point_row(writer, "a", 0, 0)]
+        self.assertEqual(writer.upsert(columns, rows + [point_row(writer, "a", 1, 1)]), 2)
+
+    def test_delete(self):
+        writer = self._make_writer()
+        columns = ["xyz_id", "name", "height"]
+        writer.upsert(columns, [point_row(writer, str(i), i, i) for i in range(2000)])
+        self.assertEqual(writer.delete([str(i) for i in range(0, 2000, 2)] + ["x"]), 1000)
+        self.assertEqual(self._select('SELECT COUNT(*) FROM "Point_0"'), [(1000,)])
+        # rtree is cleaned by the delete trigger
+        self.assertEqual(self._select('SELECT COUNT(*) FROM "rtree_Point_0_geom"'), [(1000,)])
+        self.assertEqual(writer.delete([]), 0)
+
+    def test_upsert_rollback(self):
+        writer = self._make_writer()
+        rows = [point_row(writer, "0", 0, 0), point_row(writer, "1", 0, 0, name=object())]
+        with self.assertRaises(sqlite3.Error):
+            writer.upsert(["xyz_id", "name", "height"], rows)
+        self.assertEqual(self._select('SELECT COUNT(*) FROM "Point_0"'), [(0,)])
+        self.assertEqual(self._select('SELECT COUNT(*) FROM "rtree_Point_0_geom"'), [(0,)])
+        # next transaction
+        self.assertEqual(writer.upsert(["xyz_id", "name", "height"], rows[:1]), 1)
+
+    def test_envelope(self):
+        # point without envelope, as written by GDAL
+        blob = struct.pack("<2sBBi", b"GP", 0, 1, 4326) + point_wkb(1, 2)
+        self.assertEqual(gpkg_writer._gpb_envelope(blob), (1.0, 1.0, 2.0, 2.0))
+        blob = gpkg_writer.make_gpkg_blob(point_wkb(1, 2), 4326, (0, 3, -1, 4))
+        self.assertEqual(gpkg_writer._gpb_envelope(blob), (0, 3, -1, 4))
+        self.assertEqual(gpkg_writer._st_is_empty(blob), 0)
+        blob = gpkg_writer.make_gpkg_blob(struct.pack("<BII", 1, 1003, 0), 4326)
+        self.assertEqual(gpkg_writer._st_is_empty(blob), 1)
+        self.assertIsNone(gpkg_writer._gpb_envelope(blob))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+# Copyright (c) 2019 HERE Europe B.V.
+#
+# SPDX-License-Identifier: MIT
+#
+###############################################################################
+
+import gzip
+import json
+
+from test.utils import BaseTestAsync
+
+from qgis.testing import unittest
+from XYZHubConnector.xyz_qgis.network.json_stream import JsonStreamDecoder
+from XYZHubConnector.xyz_qgis.network.net_utils import decode_byte, decode_json
+from qgis.PyQt.QtCore import QByteArray
+
+
+FEATURES = [
+    {
+        "type": "Feature",
+        "id": str(i),
+        "geometry": {"type": "Point", "coordinates": [1.5 * i, -i]},
+        "properties": {"name": "é中" * i, "n": i},
+    }
+    for i in range(100)
+]
+
+BODIES = [
+    json.dumps({"type": "FeatureCollection", "features": FEATURES, "handle": "100"}),
+    json.dumps({"type": "FeatureCollection", "features": FEATURES[:3]}, indent=2),
+    json.dumps({"features": [], "nextPageToken": 12345}),
+    json.dumps({"features": {"a": 1}}),
+    "",
+    "[1, 2]",
+    "<html>error</html>",
+    '{"a": 1',
+    '{"a": 1}x',
+    '{"a": 1,}',
+    '{"features": [1,]}',
+]
+
+
+class TestJsonStreamDecoder(BaseTestAsync):
+    def _decode_stream(self, byt, chunk_size):
+        decoder = JsonStreamDecoder()
+        for i in range(0, len(byt), chunk_size):
+            decoder.feed(byt[i : i + chunk_size])
+        return decoder.finish()
+
+    def test_same_as_decode_byte(self):
+        for body in BODIES:
+            for byt in [body.encode("utf-8"), gzip.compress(body.encode("utf-8"))]:
+                _, _, expected = decode_byte(byt)
+                for chunk_size in [1, 7, 1000, len(byt) + 1]:
+                    with self.subTest(body=body[:30], chunk_size=chunk_size):
+                        self.assertEqual(self._decode_stream(byt, chunk_size), expected)
+
+    def test_size(self):
+        body = BODIES[0].encode("utf-8")
+        for byt in [body, gzip.compress(body)]:
+            decoder = JsonStreamDecoder()
+            for i in range(0, len(byt), 100):
+                decoder.feed(byt[i : i + 100])
+            decoder.finish()
+            self.assertEqual(decoder.size, len(body))  # uncompressed size
+
+    def test_passthrough(self):
+        body = BODIES[2]
+        decoder = JsonStreamDecoder()
+        decoder.set_passthrough()
+        decoder.feed(body.encode("utf-8"))
+        self.assertEqual(decoder.finish(), json.loads(body))
+        self.assertEqual(decoder.text, body)
+
+    def test_pop_features(self):
+        body = BODIES[0].encode("utf-8")
+        for byt in [body, gzip.compress(body)]:
+            decoder = JsonStreamDecoder()
+            popped = list()
+            for i in range(0, len(byt), 100):
+                decoder.feed(byt[i : i + 100])
+                while decoder.count_features() >= 30:
+                    batch = decoder.pop_features(30)
+                    self.assertEqual(len(batch), 30)
+                    popped.extend(batch)
+            obj = decoder.finish()
+            self.assertEqual(len(popped), 90)
+            self.assertEqual(popped + obj["features"], FEATURES)
+            self.assertEqual(obj["handle"], "100")
+
+
+class TestDecodeJson(BaseTestAsync):
+    def test_same_as_decode_byte(self):
+        for body in BODIES + ['{"a": NaN}', '{"a": 100000000000000000000000}']:
+            for byt in [body.encode("utf-8"), gzip.compress(body.encode("utf-8"))]:
+                expected_byt, expected_txt, expected = decode_byte(byt)
+                for raw in [byt, QByteArray(byt)]:
+                    with self.subTest(body=body[:30], raw=type(raw)):
+                        byt2, obj = decode_json(raw)
+                        self.assertEqual(repr(obj), repr(expected))
+                        self.assertEqual(bytes(byt2), expected_byt)
+                        self.assertEqual(str(byt2, "utf-8"), expected_txt)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+# Copyright (c) 2019 HERE Europe B.V.
+#
+# SPDX-License-Identifier: MIT
+#
+###############################################################################
+
+from test.utils import BaseTestAsync
+
+from qgis.testing import unittest
+from qgis.core import (
+    QgsCategorizedSymbolRenderer,
+    QgsPalLayerSettings,
+    QgsVectorLayer,
+    QgsVectorLayerSimpleLabeling,
+)
+from XYZHubConnector.xyz_qgis.layer import layer_usage
+
+
+class TestLayerUsage(BaseTestAsync):
+    def _make_vlayer(self):
+        return QgsVectorLayer(
+            "Point?crs=epsg:4326&field=xyz_id:string&field=name:string"
+            "&field=height:double&field=kind:string&field=fid_0:integer&field=other:string",
+            "test",
+            "memory",
+        )
+
+    def test_parse_selection(self):
+        self.assertEqual(layer_usage.parse_selection(""), (False, []))
+        self.assertEqual(layer_usage.parse_selection("a,b"), (False, ["a", "b"]))
+        self.assertEqual(layer_usage.parse_selection("*, a"), (True, ["a"]))
+        self.assertTrue(layer_usage.is_auto_selection("*"))
+        self.assertFalse(layer_usage.is_auto_selection(None))
+
+    def test_fields_to_properties(self):
+        self.assertEqual(
+            layer_usage.fields_to_properties(["xyz_id", "fid", "fid_0", "name"]),
+            {"fid", "name"},
+        )
+
+    def test_selection_covered(self):
+        self.assertTrue(layer_usage.is_selection_covered("a", "a,b"))
+        self.assertFalse(layer_usage.is_selection_covered("a,c", "a,b"))
+        self.assertTrue(layer_usage.is_selection_covered("a,c", ""))  # all loaded
+        self.assertFalse(layer_usage.is_selection_covered("", "a,b"))
+
+    def test_subset_fields(self):
+        vlayer = self._make_vlayer()
+        vlayer.setSubsetString(
+            "height > 1.5e3 AND lower(kind) = 'a b' AND \"long name\" IS NOT NULL"
+            " AND not_loaded IN ('x', 'it''s')"
+        )
+        self.assertEqual(
+            layer_usage._subset_fields(vlayer), {"height", "kind", "long name", "not_loaded"}
+        )
+
+    def test_used_fields(self):
+        vlayer = self._make_vlayer()
+        vlayer.setDisplayExpression('"xyz_id"')
+        self.assertEqual(layer_usage.used_fields(vlayer), {"xyz_id"})
+        self.assertEqual(layer_usage.resolve_selection("a,b", [vlayer]), "a,b")
+        self.assertEqual(layer_usage.resolve_selection("*", [vlayer]), "@ns:com:here:xyz")
+
+        vlayer.setRenderer(QgsCategorizedSymbolRenderer("kind", []))
+        settings = QgsPalLayerSettings()
+        settings.fieldName = "concat(name, ' ', height)"
+        settings.isExpression = True
+        vlayer.setLabeling(QgsVectorLayerSimpleLabeling(settings))
+        vlayer.setLabelsEnabled(True)
+        vlayer.setSubsetString('"fid_0" > 1')
+        self.assertEqual(
+            layer_usage.used_fields(vlayer), {"xyz_id", "kind", "name", "height", "fid_0"}
+        )
+        self.assertEqual(
+            layer_usage.resolve_selection("*,extra", [vlayer]),
+            "@ns:com:here:xyz,extra,fid,height,kind,name",
+        )
+
+        vlayer.setLabelsEnabled(False)
+        self.assertNotIn("name", layer_usage.used_fields(vlayer))
+
+        vlayer.setDisplayExpression("attributes()")  # all fields
+        self.assertEqual(layer_usage.resolve_selection("*", [vlayer]), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
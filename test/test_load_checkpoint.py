@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+# Copyright (c) 2019 HERE Europe B.V.
+#
+# SPDX-License-Identifier: MIT
+#
+###############################################################################
+
+import os
+import sqlite3
+import tempfile
+
+from test.utils import BaseTestAsync
+
+from qgis.testing import unittest
+from XYZHubConnector.xyz_qgis.layer.load_checkpoint import LoadCheckpoint, make_checkpoint_key
+
+
+class TestLoadCheckpoint(BaseTestAsync):
+    def setUp(self):
+        super().setUp()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.fname = os.path.join(self.tmpdir.name, "layer.gpkg")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+        super().tearDown()
+
+    def _make_db(self, lst_id):
+        conn = sqlite3.connect(self.fname)
+        with conn:
+            conn.execute('CREATE TABLE "Point_0" ("fid" INTEGER PRIMARY KEY, "xyz_id" TEXT)')
+            conn.executemany('INSERT INTO "Point_0" ("xyz_id") VALUES (?)', [(i,) for i in lst_id])
+        conn.close()
+
+    def test_key(self):
+        self.assertEqual(
+            make_checkpoint_key(dict(tags="a", selection="b")),
+            make_checkpoint_key(dict(selection="b", tags="a")),
+        )
+        self.assertNotEqual(make_checkpoint_key(dict(tags="a")), make_checkpoint_key(dict()))
+
+    def test_save_get_clear(self):
+        store = LoadCheckpoint(self.fname)
+        self.assertIsNone(store.get("k"))  # no db yet
+        self.assertTrue(store.is_empty())
+
+        self._make_db([])
+        self.assertIsNone(store.get("k"))
+        store.save(dict(key="k", handle="abc", limit=100, feat_cnt=200))
+        store.save(dict(key="k", handle="def", limit=50, feat_cnt=250))
+        self.assertEqual(store.get("k"), dict(key="k", handle="def", limit=50, feat_cnt=250))
+        self.assertIsNone(store.get("other"))
+        self.assertFalse(store.is_empty())
+
+        store.clear("k")
+        self.assertIsNone(store.get("k"))
+        self.assertTrue(store.is_empty())
+
+    def test_find_written(self):
+        store = LoadCheckpoint(self.fname)
+        self.assertEqual(store.find_written(["Point_0"], ["a"], "xyz_id"), set())
+        lst_id = ["f%s" % i for i in range(2000)]
+        self._make_db(lst_id[:1500])
+        written = store.find_written(["Point_0"], lst_id + [None], "xyz_id")
+        self.assertEqual(written, set(lst_id[:1500]))
+
+
+if __name__ == "__main__":
+    unittest.main()
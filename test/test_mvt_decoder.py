@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+# Copyright (c) 2019 HERE Europe B.V.
+#
+# SPDX-License-Identifier: MIT
+#
+###############################################################################
+
+import gzip
+import struct
+
+from test.utils import BaseTestAsync
+
+from qgis.testing import unittest
+from XYZHubConnector.xyz_qgis.network import mvt_decoder
+
+
+# minimal vector tile encoder (vector_tile.proto v2)
+
+
+def _varint(n):
+    out = bytearray()
+    while True:
+        b = n & 0x7F
+        n >>= 7
+        if n:
+            out.append(b | 0x80)
+        else:
+            out.append(b)
+            return bytes(out)
+
+
+def _field(number, wire_type, payload):
+    key = _varint(number << 3 | wire_type)
+    if wire_type == 0:
+        return key + _varint(payload)
+    if wire_type == 2:
+        return key + _varint(len(payload)) + payload
+    return key + payload
+
+
+def _packed(number, values):
+    return _field(number, 2, b"".join(_varint(v) for v in values))
+
+
+def _zz(n):
+    return (n << 1) ^ (n >> 63)
+
+
+def _commands(parts, close=False):
+    """encode parts (list of tile coordinates) as MoveTo, LineTo (, ClosePath)"""
+    out = list()
+    x = y = 0
+    for part in parts:
+        for i, (px, py) in enumerate(part):
+            if i == 0:
+                out.append(1 | 1 << 3)
+            elif i == 1:
+                out.append(2 | (len(part) - 1) << 3)
+            out.extend([_zz(px - x), _zz(py - y)])
+            x, y = px, py
+        if close:
+            out.append(7 | 1 << 3)
+    return out
+
+
+def _value(v):
+    if isinstance(v, str):
+        return _field(1, 2, v.encode("utf-8"))
+    if isinstance(v, bool):
+        return _field(7, 0, int(v))
+    if isinstance(v, float):
+        return _field(3, 1, struct.pack("<d", v))
+    if v < 0:
+        return _field(6, 0, _zz(v))
+    return _field(5, 0, v)
+
+
+def encode_layer(features, name="space", extent=4096):
+    """features: list of (id, geom_type, parts, properties)"""
+    keys, values = list(), list()
+    body = _field(15, 0, 2) + _field(1, 2, name.encode("utf-8"))
+    for fid, geom_type, parts, props in features:
+        tags = list()
+        for k, v in props.items():
+            if k not in keys:
+                keys.append(k)
+            if v not in values:
+                values.append(v)
+            tags.extend([keys.index(k), values.index(v)])
+        feat = b""
+        if fid is not None:
+            feat += _field(1, 0, fid)
+        feat += _packed(2, tags) + _field(3, 0, geom_type)
+        feat += _packed(4, _commands(parts, close=geom_type == mvt_decoder.GEOM_POLYGON))
+        body += _field(2, 2, feat)
+    body += b"".join(_field(3, 2, k.encode("utf-8")) for k in keys)
+    body += b"".join(_field(4, 2, _value(v)) for v in values)
+    body += _field(5, 0, extent)
+    return _field(3, 2, body)
+
+
+class TestMvtDecoder(BaseTestAsync):
+    def assertCoordsAlmostEqual(self, a, b):
+        self.assertEqual(len(a), len(b))
+        for p, q in zip(a, b):
+            self.assertAlmostEqual(p[0], q[0], places=6)
+            self.assertAlmostEqual(p[1], q[1], places=6)
+
+    def test_point_dequantize(self):
+        body = encode_layer(
+            [
+                (1, mvt_decoder.GEOM_POINT, [[(0, 0)]], {"name": "a", "n": 3}),
+                (2, mvt_decoder.GEOM_POINT, [[(2048, 2048)]], {"x": 1.5, "neg": -2}),
+                (3, mvt_decoder.GEOM_POINT, [[(4096, 4096)], [(0, 4096)]], {"b": True}),
+            ]
+        )
+        obj = mvt_decoder.decode_tile(body, "1_1_0")
+        self.assertEqual(obj["type"], "FeatureCollection")
+        features = obj["features"]
+        self.assertEqual([ft["id"] for ft in features], ["1", "2", "3"])
+        self.assertEqual(features[0]["properties"], {"name": "a", "n": 3})
+        self.assertEqual(features[1]["properties"], {"x": 1.5, "neg": -2})
+        self.assertEqual(features[2]["properties"], {"b": True})
+        # tile 1_1_0: north east quarter of the world
+        geom = features[0]["geometry"]
+        self.assertEqual(geom["type"], "Point")
+        self.assertCoordsAlmostEqual([geom["coordinates"]], [[0, 85.0511288]])
+        self.assertCoordsAlmostEqual([features[1]["geometry"]["coordinates"]], [[90, 66.5132604]])
+        geom = features[2]["geometry"]
+        self.assertEqual(geom["type"], "MultiPoint")
+        self.assertCoordsAlmostEqual(geom["coordinates"], [[180, 0], [0, 0]])
+
+    def test_line_polygon(self):
+        square = [(0, 0), (4096, 0), (4096, 4096), (0, 4096)]  # clockwise, y down
+        hole = [(1024, 1024), (1024, 3072), (3072, 3072), (3072, 1024)]
+        body = encode_layer(
+            [
+                (1, mvt_decoder.GEOM_LINESTRING, [[(0, 0), (4096, 4096)]], {}),
+                (2, mvt_decoder.GEOM_LINESTRING, [[(0, 0), (1, 1)], [(2, 2), (3, 3)]], {}),
+                (3, mvt_decoder.GEOM_POLYGON, [square, hole], {}),
+                (4, mvt_decoder.GEOM_POLYGON, [square, square], {}),
+            ]
+        )
+        features = mvt_decoder.decode_tile(gzip.compress(body), "0_0_0")["features"]
+        geom = features[0]["geometry"]
+        self.assertEqual(geom["type"], "LineString")
+        self.assertCoordsAlmostEqual(geom["coordinates"], [[-180, 85.0511288], [180, -85.0511288]])
+        self.assertEqual(features[1]["geometry"]["type"], "MultiLineString")
+        self.assertEqual(len(features[1]["geometry"]["coordinates"]), 2)
+        geom = features[2]["geometry"]
+        self.assertEqual(geom["type"], "Polygon")
+        self.assertEqual(len(geom["coordinates"]), 2)  # exterior, interior
+        self.assertEqual(len(geom["coordinates"][0]), 5)  # closed ring
+        self.assertEqual(geom["coordinates"][0][0], geom["coordinates"][0][-1])
+        self.assertEqual(features[3]["geometry"]["type"], "MultiPolygon")
+
+    def test_feature_id(self):
+        body = encode_layer(
+            [
+                (7, mvt_decoder.GEOM_POINT, [[(0, 0)]], {"id": "abc", "a": 1}),
+                (None, mvt_decoder.GEOM_POINT, [[(0, 0)]], {"a": 2}),
+                (
+                    8,
+                    mvt_decoder.GEOM_POINT,
+                    [[(0, 0)]],
+                    {"@ns:com:here:xyz": '{"tags": ["t"]}'},
+                ),
+            ]
+        )
+        features = mvt_decoder.decode_tile(body, "0_0_0")["features"]
+        self.assertEqual(features[0]["id"], "abc")
+        self.assertEqual(features[0]["properties"], {"a": 1})
+        self.assertNotIn("id", features[1])
+        self.assertEqual(features[2]["properties"], {"@ns:com:here:xyz": {"tags": ["t"]}})
+
+    def test_body(self):
+        self.assertTrue(mvt_decoder.is_mvt_body(b""))
+        self.assertTrue(mvt_decoder.is_mvt_body(encode_layer([])))
+        self.assertFalse(mvt_decoder.is_mvt_body(b'{"type": "FeatureCollection"}'))
+        self.assertEqual(mvt_decoder.decode_tile(b"", "0_0_0")["features"], [])
+        with self.assertRaises(mvt_decoder.MvtDecodeError):
+            mvt_decoder.decode_tile(encode_layer([])[:-1], "0_0_0")
+
+    def test_clip_buffer(self):
+        body = encode_layer(
+            [
+                (1, mvt_decoder.GEOM_POINT, [[(-10, -10)]], {}),  # in buffer
+                (2, mvt_decoder.GEOM_POINT, [[(-10, 5)], [(10, 5)]], {}),
+                (3, mvt_decoder.GEOM_LINESTRING, [[(-100, 2048), (4196, 2048)]], {}),
+                # leaves and enters the tile: 2 lines
+                (
+                    4,
+                    mvt_decoder.GEOM_LINESTRING,
+                    [[(100, 100), (-100, 100), (-100, 200), (100, 200)]],
+                    {},
+                ),
+                (5, mvt_decoder.GEOM_POLYGON, [[(-100, -100), (4196, -100), (4196, 4196)]], {}),
+                (6, mvt_decoder.GEOM_POLYGON, [[(-200, 0), (-100, 0), (-100, 100)]], {}),
+            ]
+        )
+        features = mvt_decoder.decode_tile(body, "0_0_0")["features"]
+        self.assertEqual([ft["id"] for ft in features], ["2", "3", "4", "5"])
+        self.assertEqual(features[0]["geometry"]["type"], "Point")
+        line = features[1]["geometry"]
+        self.assertEqual(line["type"], "LineString")
+        self.assertCoordsAlmostEqual(line["coordinates"], [[-180, 0], [180, 0]])
+        self.assertEqual(features[2]["geometry"]["type"], "MultiLineString")
+        polygon = features[3]["geometry"]
+        self.assertEqual(polygon["type"], "Polygon")
+        ring = polygon["coordinates"][0]
+        self.assertEqual(ring[0], ring[-1])
+        for lon, lat in ring:
+            self.assertLessEqual(abs(lon), 180 + 1e-9)
+            self.assertLessEqual(abs(lat), 85.06)
+
+        features = mvt_decoder.decode_tile(body, "0_0_0", clip=False)["features"]
+        self.assertEqual(len(features), 6)
+
+    def test_part_merger(self):
+        def line(xyz_id, coords):
+            return dict(id=xyz_id, geometry=dict(type="LineString", coordinates=coords))
+
+        merger = mvt_decoder.TilePartMerger()
+        point = dict(id="p", geometry=dict(type="Point", coordinates=[0, 0]))
+        features = merger.merge("1_0_0", [line("a", [[0, 0], [1, 1]]), point])
+        self.assertEqual(
+            features[0]["geometry"],
+            dict(type="MultiLineString", coordinates=[[[0, 0], [1, 1]]]),
+        )
+        self.assertEqual(features[1]["geometry"]["type"], "Point")
+
+        features = merger.merge("1_1_0", [line("a", [[1, 1], [2, 2]])])
+        self.assertEqual(
+            features[0]["geometry"]["coordinates"], [[[0, 0], [1, 1]], [[1, 1], [2, 2]]]
+        )
+        # reloaded tile replaces its part
+        features = merger.merge("1_0_0", [line("a", [[0, 0], [1.5, 1.5]])])
+        self.assertEqual(
+            features[0]["geometry"]["coordinates"], [[[1, 1], [2, 2]], [[0, 0], [1.5, 1.5]]]
+        )
+        merger.merge("1_0_0", [])
+        features = merger.merge("1_1_0", [line("a", [[1, 1], [2, 2]])])
+        self.assertEqual(features[0]["geometry"]["coordinates"], [[[1, 1], [2, 2]]])
+
+        merger.clear()
+        features = merger.merge("1_0_0", [line("a", [[0, 0], [1, 1]])])
+        self.assertEqual(features[0]["geometry"]["coordinates"], [[[0, 0], [1, 1]]])
+
+    def test_part_merger_evict(self):
+        def line(xyz_id, coords):
+            return dict(id=xyz_id, geometry=dict(type="LineString", coordinates=coords))
+
+        dissolved = list()
+
+        def dissolve(geom):
+            dissolved.append(len(geom["coordinates"]))
+            return geom
+
+        merger = mvt_decoder.TilePartMerger(fn_dissolve=dissolve)
+        for tile_id in ["1_0_0", "1_1_0", "1_0_1"]:
+            merger.merge(tile_id, [line("a", [[0, 0], [1, 1]])])
+        self.assertEqual(dissolved, [2, 3])  # only merged parts are dissolved
+        self.assertEqual(merger.count_tiles(), 3)
+
+        merger.retain(["1_0_0", "1_1_0"])  # tile left the view
+        self.assertEqual(merger.count_tiles(), 2)
+        merger.evict(["1_1_0"])  # tile failed
+        self.assertEqual(merger.count_tiles(), 1)
+        (ft,) = merger.merge("1_1_1", [line("a", [[1, 1], [2, 2]])])
+        self.assertEqual(ft["geometry"]["coordinates"], [[[0, 0], [1, 1]], [[1, 1], [2, 2]]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+# Copyright (c) 2019 HERE Europe B.V.
+#
+# SPDX-License-Identifier: MIT
+#
+###############################################################################
+
+from test.utils import BaseTestAsync
+
+from qgis.testing import unittest
+from XYZHubConnector.xyz_qgis.layer.queue import BboxPartitionQueue, ByteSizeParamsQueue
+
+KB = 1024
+
+
+class TestByteSizeParamsQueue(BaseTestAsync):
+    def _load_page(self, q, byte_per_feat, handle):
+        params = q.get_params()
+        limit = params["limit"]
+        q.set_response_size(limit, limit, limit * byte_per_feat)
+        q.gen_params(handle=handle)
+        return limit
+
+    def test_widen_to_target(self):
+        q = ByteSizeParamsQueue(dict(limit=10), target_size=1000 * KB)
+        lst_limit = [self._load_page(q, KB, str(i)) for i in range(8)]
+        # widen at most twice per page, up to the target size
+        self.assertEqual(lst_limit, [10, 20, 40, 80, 160, 320, 640, 1000])
+
+    def test_larger_features(self):
+        q = ByteSizeParamsQueue(dict(limit=1000), target_size=1000 * KB)
+        self._load_page(q, KB, "1")
+        self.assertEqual(self._load_page(q, 100 * KB, "2"), 1000)
+        self.assertEqual(q.get_params()["limit"], 10)  # shrink at once
+
+        # smaller features again, widen gradually
+        q.set_response_size(10, 10, 10 * KB)
+        self.assertGreater(q.limit, 10)
+        self.assertLessEqual(q.limit, 20)
+
+    def test_close_to_payload_limit(self):
+        q = ByteSizeParamsQueue(dict(limit=100), target_size=100 * KB)
+        byte_per_feat = int(0.9 * q.RESPONSE_LIMIT / 100)
+        self._load_page(q, byte_per_feat, "1")
+        self.assertEqual(q.limit, 100 * KB // byte_per_feat or 1)
+
+    def test_retry(self):
+        q = ByteSizeParamsQueue(dict(limit=100), target_size=1000 * KB)
+        params = q.get_params()
+        q.gen_retry_params(**params)
+        self.assertTrue(q.has_retry())
+        self.assertEqual(q.get_params(), dict(limit=50))
+        q.set_response_size(50, 50, 50 * KB)
+        self.assertEqual(q.limit, 100)  # widen again after success
+        q.gen_retry_params(limit=1)
+        self.assertEqual(q.get_params()["limit"], 1)
+
+    def test_resume_handle(self):
+        q = ByteSizeParamsQueue(dict(limit=300, handle="abc"), buffer_size=1)
+        self.assertEqual(q.get_params(), dict(limit=300, handle="abc"))
+        self.assertFalse(q.has_next())
+        q = ByteSizeParamsQueue(dict(limit=300, handle=0), buffer_size=1)
+        self.assertEqual(q.get_params(), dict(limit=300))  # first page
+
+
+class TestBboxPartitionQueue(BaseTestAsync):
+    def _area(self, bbox):
+        return (bbox["east"] - bbox["west"]) * (bbox["north"] - bbox["south"])
+
+    def test_plan(self):
+        q = BboxPartitionQueue((-10, -10, 10, 10), count=10000, limit=1000, feat_per_part=500)
+        self.assertEqual(q.n_part, 25)  # 5x5 grid
+        lst = list()
+        while q.has_next():
+            lst.append(q.get_params())
+        self.assertEqual(len(lst), 25)
+        self.assertEqual(set(p["limit"] for p in lst), {1000})
+        self.assertAlmostEqual(sum(self._area(p["bbox"]) for p in lst), 400)
+        self.assertEqual(min(p["bbox"]["west"] for p in lst), -10)
+        self.assertEqual(max(p["bbox"]["north"] for p in lst), 10)
+
+        q = BboxPartitionQueue((0, 0, 1, 1), count=10, limit=1000, feat_per_part=500)
+        self.assertEqual(q.get_params()["bbox"], dict(west=0, south=0, east=1, north=1))
+
+    def test_split(self):
+        q = BboxPartitionQueue((0, 0, 4, 4), count=4, limit=10, feat_per_part=1)
+        first = q.get_params()
+        self.assertTrue(q.split_params(**first))
+        lst = [q.get_params() for _ in range(4)]  # parts are loaded first
+        self.assertEqual(sum(self._area(p["bbox"]) for p in lst), self._area(first["bbox"]))
+        self.assertEqual(q.n_part, 8)
+
+        tiny = dict(west=0, south=0, east=1e-7, north=1e-7)
+        self.assertFalse(q.split_params(limit=10, bbox=tiny))
+        q.gen_retry_params(limit=10, bbox=tiny)
+        self.assertTrue(q.has_retry())
+        self.assertEqual(q.get_params()["bbox"], tiny)
+
+
+if __name__ == "__main__":
+    unittest.main()
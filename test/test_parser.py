@@ -21,7 +21,16 @@ from test.utils import (
     format_map_fields,
 )
 
-from qgis.core import QgsFields, QgsVectorLayer, QgsWkbTypes
+from qgis.PyQt.QtCore import QVariant
+from qgis.core import (
+    QgsFeature,
+    QgsField,
+    QgsFields,
+    QgsJsonUtils,
+    QgsVectorLayer,
+    QgsWkbTypes,
+    NULL,
+)
 from qgis.testing import unittest
 from XYZHubConnector.xyz_qgis.layer import parser
 
@@ -509,6 +518,34 @@ class TestParser(BaseTestAsync):
         for fname in fnames:
             self.subtest_parse_xyzjson_map(folder, fname)
 
+    def test_parse_xyzjson_map_column_types(self):
+        expected = dict(
+            int32=["Integer", [1, 2]],
+            int64=["Integer64", [1, 2**40]],
+            double=["Double", [1, 1.5, 2**40]],
+            string=["String", ["1", "1.5", "[1]", "a"]],
+        )
+        props = [
+            dict(int32=1, int64=1, double=1, string=1),
+            dict(int32=2, int64=2**40, double=2**40, string=1.5),
+            dict(double=1.5, string="a"),
+            dict(int32=None, string=[1]),
+        ]
+        # field types do not depend on feature order
+        for i, order in enumerate([props, list(reversed(props))]):
+            obj = dict(
+                features=[
+                    dict(id=str(j), geometry=None, properties=p) for j, p in enumerate(order)
+                ]
+            )
+            map_feat, map_fields = parser.xyz_json_to_feature_map(obj)
+            fields = map_fields[None][0]
+            for k, (type_name, lst_val) in expected.items():
+                with self.subTest(order=i, field=k):
+                    self.assertEqual(fields.field(k).typeName(), type_name)
+                    parsed = [ft.attribute(k) for ft in map_feat[None][0]]
+                    self.assertEqual(sorted(v for v in parsed if v != NULL), lst_val)
+
     # ######## Parse QgsFeature -> json
     def test_parse_qgsfeature(self):
         # self.subtest_parse_qgsfeature("geojson-small", "airport-qgis.geojson")  # no xyz_id
@@ -630,6 +667,126 @@ class TestParser(BaseTestAsync):
     def test_parse_qgsfeature_large(self):
         pass
 
+    def test_parse_qgsfeature_export_plan(self):
+        folder = "xyzjson-small"
+        fnames = [
+            "airport-xyz.geojson",
+            "water-xyz.geojson",
+            "mixed-xyz.geojson",
+            "livemap-xyz.geojson",
+        ]
+        resource = TestFolder(folder)
+        for fname in fnames:
+            obj = json.loads(resource.load(fname))
+            map_feat, _ = parser.xyz_json_to_feature_map(obj)
+            qgs_feat = [ft for lst in map_feat.values() for feats in lst for ft in feats]
+            for kw in [dict(), dict(is_new=True), dict(is_livemap=True), dict(ignore_null=False)]:
+                with self.subTest(folder=folder, fname=fname, **kw):
+                    self.maxDiff = None
+                    self.assertListEqual(
+                        _feature_to_xyz_json_exportAttributes(qgs_feat, **kw),
+                        parser.feature_to_xyz_json(qgs_feat, **kw),
+                    )
+
+    def test_parse_qgsfeature_integral_double(self):
+        fields = QgsFields()
+        fields.append(QgsField(parser.QGS_XYZ_ID, QVariant.String))
+        fields.append(QgsField("height", QVariant.Double))
+        fields.append(QgsField("ratio", QVariant.Double))
+        feat = QgsFeature(fields)
+        feat.setAttributes(["a", 1.0, 0.5])
+        for export in [_feature_to_xyz_json_exportAttributes, parser.feature_to_xyz_json]:
+            with self.subTest(export=export.__name__):
+                (ft,) = export([feat])
+                self.assertEqual(ft["properties"], {"height": 1, "ratio": 0.5})
+                self.assertIsInstance(ft["properties"]["height"], int)
+
+    def test_update_feature_fields(self):
+        resource = TestFolder("xyzjson-small")
+        obj = json.loads(resource.load("mixed-xyz.geojson"))
+        map_feat, map_fields = parser.xyz_json_to_feature_map(obj)
+        remap_cache = parser.FieldsRemapCache()
+        for geom, lst_fields in map_fields.items():
+            for feats, fields in zip(map_feat[geom], lst_fields):
+                # provider fields with different order
+                ref = QgsFields()
+                for f in reversed(fields.toList()):
+                    ref.append(f)
+                remap_cache.sync(ref)
+                for ft in feats:
+                    with self.subTest(geom=geom, xyz_id=ft.attribute(parser.QGS_XYZ_ID)):
+                        ft1 = parser.update_feature_fields(ft, ref, fields)
+                        ft2 = parser.update_feature_fields(ft, ref, fields, remap_cache)
+                        self.assertEqual(ft1.attributes(), ft2.attributes())
+                        self.assertEqual(ft1.geometry().asWkt(), ft2.geometry().asWkt())
+                        for k in ft.fields().names():
+                            self.assertEqual(ft.attribute(k), ft2.attribute(k))
+
+    # ######## Upload payload
+    def test_make_lst_feature_collection(self):
+        resource = TestFolder("xyzjson-small")
+        obj = json.loads(resource.load("mixed-xyz.geojson"))
+        features = obj["features"]
+        lst_size = [len(json.dumps(ft, ensure_ascii=False).encode("utf-8")) for ft in features]
+        for limit in [max(lst_size) + 100, 2 * max(lst_size), sum(lst_size), parser.PAYLOAD_LIMIT]:
+            with self.subTest(limit=limit):
+                lst_payload = parser.make_lst_feature_collection(features, limit)
+                for payload in lst_payload:
+                    self.assertLessEqual(len(payload), limit)
+                lst_obj = [json.loads(payload) for payload in lst_payload]
+                self.assertEqual(
+                    parser.feature_collection(features),
+                    parser.feature_collection(flatten([o["features"] for o in lst_obj])),
+                )
+        with self.assertRaises(parser.PayloadTooLargeError):
+            parser.make_lst_feature_collection(features, max(lst_size))
+
+
+def _feature_to_xyz_json_exportAttributes(
+    features, is_new=False, ignore_null=True, is_livemap=False
+):
+    """reference export of feature_to_xyz_json via QgsJsonUtils.exportAttributes"""
+
+    def _single_feature(feat):
+        obj = {"type": "Feature"}
+        props = json.loads(QgsJsonUtils.exportAttributes(feat))
+        props.pop(parser.QGS_ID, None)
+        v = props.pop(parser.QGS_XYZ_ID, None)
+        if v is not None and v != "":
+            if v in exist_feat_id:
+                return None
+            exist_feat_id.add(v)
+            if not is_new:
+                obj[parser.XYZ_ID] = v
+        fields = feat.fields()
+        expression_field_names = [
+            f.name()
+            for i, f in enumerate(fields)
+            if fields.fieldOrigin(i) == fields.OriginExpression
+        ]
+        new_props = dict()
+        for t, val in props.items():
+            k = parser.normal_field_name(t)
+            if (ignore_null and val is None) or k in expression_field_names:
+                continue
+            if k.startswith("@"):
+                continue
+            new_props[k] = parser.try_parse_json_string(val)
+        if is_livemap:
+            delta = {"changeState": "CREATED", "reviewState": "UNPUBLISHED", "taskGridId": ""}
+            if obj.get(parser.XYZ_ID):
+                delta.update({"changeState": "UPDATED", "originId": obj[parser.XYZ_ID]})
+            new_props["@ns:com:here:mom:delta"] = delta
+        obj["properties"] = new_props
+        geom_ = json.loads(feat.geometry().asJson())
+        if geom_ is None:
+            return obj
+        obj["geometry"] = parser.make_valid_xyz_json_geom(geom_)
+        return obj
+
+    exist_feat_id = set()
+    return [_single_feature(ft) for ft in features]
+
 
 if __name__ == "__main__":
     # unittest.main()
@@ -180,6 +180,68 @@ class TestRenderLayer(BaseTestAsync):
             # self.remove_layer(layer) # skip if deleted layer clear map_fields
             return map_fields
 
+    def test_render_queue(self):
+        resource = TestFolder("xyzjson-small")
+        obj = json.loads(resource.load("mixed-xyz.geojson"))
+        obj_feat = obj["features"]
+        for chunk_size in [1, 10, len(obj_feat)]:
+            with self.subTest(chunk_size=chunk_size):
+                layer = self.new_layer()
+                render_queue = render.RenderQueue(max_feat=len(obj_feat) + 1)
+                map_fields = dict()
+                for i0 in range(0, len(obj_feat), chunk_size):
+                    o = dict(obj, features=obj_feat[i0 : i0 + chunk_size])
+                    map_feat, _ = parser.xyz_json_to_feature_map(o, map_fields)
+                    for geom_str in map_feat:
+                        for idx, (feat, fields) in enumerate(
+                            zip(map_feat[geom_str], map_fields[geom_str])
+                        ):
+                            if not feat:
+                                continue
+                            vlayer = (
+                                layer.get_layer(geom_str, idx)
+                                if layer.has_layer(geom_str, idx)
+                                else layer.add_ext_layer(geom_str, idx)
+                            )
+                            render_queue.put(
+                                vlayer, feat, fields, layer.get_fields_remap_cache(vlayer)
+                            )
+                self.assertEqual(render_queue.size(), len(obj_feat))
+                self.assertFalse(render_queue.is_full())
+                self.assertEqual(layer.get_feat_cnt(), 0)
+
+                render_queue.flush()
+                self.assertEqual(render_queue.size(), 0)
+                self.assert_layer(layer, obj, map_fields)
+
+    def test_render_bulk_writer(self):
+        resource = TestFolder("xyzjson-small")
+        obj = json.loads(resource.load("mixed-xyz.geojson"))
+        layer = self.new_layer()
+        map_feat, map_fields = parser.xyz_json_to_feature_map(obj)
+        # features rendered twice are updated by xyz_id
+        for _ in range(2):
+            for geom_str in map_feat:
+                for idx, (feat, fields) in enumerate(
+                    zip(map_feat[geom_str], map_fields[geom_str])
+                ):
+                    vlayer = (
+                        layer.get_layer(geom_str, idx)
+                        if layer.has_layer(geom_str, idx)
+                        else layer.add_ext_layer(geom_str, idx)
+                    )
+                    render.add_feature_render(
+                        vlayer,
+                        feat,
+                        fields,
+                        layer.get_fields_remap_cache(vlayer),
+                        layer.get_bulk_writer(vlayer),
+                        layer.get_feat_counter(vlayer),
+                    )
+                    self._assert_rendered_fields(vlayer, fields)
+            self.assert_layer(layer, obj, map_fields)
+            self.assertEqual(layer.get_feat_cnt(), len(obj["features"]))
+
     def _assert_rendered_fields(self, vlayer, fields):
         name_vlayer_fields = vlayer.fields().names()
         name_fields = fields.names()
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+# Copyright (c) 2019 HERE Europe B.V.
+#
+# SPDX-License-Identifier: MIT
+#
+###############################################################################
+
+import gzip
+import json
+from test.utils import BaseTestAsync
+
+from qgis.PyQt.QtCore import QUrl
+from qgis.PyQt.QtNetwork import QNetworkRequest
+from qgis.testing import unittest
+from XYZHubConnector.xyz_qgis.layer import parser
+from XYZHubConnector.xyz_qgis.network.net_utils import GzipPayload, make_upload_payload
+from XYZHubConnector.xyz_qgis.network.shared_network import (
+    HTTP2_ALLOWED_ATTRIBUTE,
+    ConnectionStats,
+    SharedNetwork,
+    shared_network,
+)
+
+
+class TestSharedNetwork(BaseTestAsync):
+    def test_manager_per_key(self):
+        shared = SharedNetwork()
+        a = shared.get_manager("datahub")
+        self.assertIs(shared.get_manager("datahub"), a)
+        self.assertIsNot(shared.get_manager("platform"), a)
+        shared.clear()
+        self.assertIsNot(shared.get_manager("datahub"), a)
+        shared.clear()
+
+    def test_http2_attribute(self):
+        if HTTP2_ALLOWED_ATTRIBUTE is None:
+            self.skipTest("HTTP/2 not supported by Qt")
+        shared = SharedNetwork()
+        for allowed in [True, False]:
+            shared.http2_allowed = allowed
+            request = QNetworkRequest(QUrl("https://example.com"))
+            shared.apply_request_config(request)
+            self.assertEqual(request.attribute(HTTP2_ALLOWED_ATTRIBUTE), allowed)
+
+    def test_reuse_ratio(self):
+        stats = ConnectionStats()
+        self.assertEqual(stats.get_reuse_ratio(), 0.0)
+        stats.requests, stats.connections = 10, 2
+        self.assertAlmostEqual(stats.get_reuse_ratio(), 0.8)
+
+    def test_gzip_upload_payload(self):
+        features = [
+            dict(type="Feature", properties=dict(name="feature %s" % i), geometry=None)
+            for i in range(1000)
+        ]
+        # limit applies to uncompressed payload
+        lst_payload = parser.make_lst_feature_collection(features, limit=10000)
+        self.assertGreater(len(lst_payload), 1)
+        self.assertFalse(SharedNetwork().gzip_upload)  # uncompressed by default
+        gzip_upload = shared_network.gzip_upload
+        try:
+            shared_network.gzip_upload = True
+            for byt in lst_payload:
+                payload = make_upload_payload(byt)
+                self.assertIsInstance(payload, GzipPayload)
+                self.assertLess(len(payload), len(byt) / 5)
+                self.assertEqual(gzip.decompress(payload), byt)
+                self.assertIs(make_upload_payload(payload), payload)
+
+            shared_network.gzip_upload = False
+            payload = make_upload_payload(features[0])
+            self.assertNotIsInstance(payload, GzipPayload)
+            self.assertEqual(json.loads(payload), features[0])
+        finally:
+            shared_network.gzip_upload = gzip_upload
+
+
+if __name__ == "__main__":
+    unittest.main()
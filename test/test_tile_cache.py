@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+# Copyright (c) 2019 HERE Europe B.V.
+#
+# SPDX-License-Identifier: MIT
+#
+###############################################################################
+
+import gzip
+import json
+import os
+import tempfile
+import time
+
+from test.utils import BaseTestAsync
+
+from qgis.testing import unittest
+from XYZHubConnector.xyz_qgis.network.tile_cache import TileResponseCache
+
+
+def make_body(n, seed=0):
+    feat = [dict(type="Feature", id=str(i), properties=dict(v=seed, s="x" * 50)) for i in range(n)]
+    return json.dumps(dict(type="FeatureCollection", features=feat)).encode("utf-8")
+
+
+class TestTileResponseCache(BaseTestAsync):
+    def setUp(self):
+        super().setUp()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.fname = os.path.join(self.tmp_dir.name, "cache", "tile_cache.sqlite")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+        super().tearDown()
+
+    def test_key(self):
+        url1 = "https://xyz.api.here.com/hub/spaces/abc/tile/quadkey/120?limit=100"
+        url2 = "https://xyz.api.here.com/hub/spaces/abc/tile/quadkey/120?limit=100&tags=a"
+        self.assertEqual(TileResponseCache.make_key(url1), TileResponseCache.make_key(url1))
+        self.assertNotEqual(TileResponseCache.make_key(url1), TileResponseCache.make_key(url2))
+        # response of a token is not reused for another token
+        key1 = TileResponseCache.make_key(url1, b"Bearer token1")
+        self.assertEqual(key1, TileResponseCache.make_key(url1, b"Bearer token1"))
+        self.assertNotEqual(key1, TileResponseCache.make_key(url1, b"Bearer token2"))
+        self.assertNotEqual(key1, TileResponseCache.make_key(url1))
+
+    def test_compressor(self):
+        cache = TileResponseCache(self.fname)
+        body = make_body(100)
+        compressor = cache.make_compressor()
+        chunks = [compressor.compress(body[i : i + 1000]) for i in range(0, len(body), 1000)]
+        gz = b"".join(chunks) + compressor.flush()
+        cache.put("k", gz)
+        stored = cache.get("k")[0]
+        self.assertEqual(stored, gz)  # gzip body is stored as is
+        self.assertEqual(gzip.decompress(stored), body)
+        cache.close()
+
+    def test_put_get(self):
+        cache = TileResponseCache(self.fname, ttl=60)
+        body = make_body(10)
+        self.assertIsNone(cache.get("k"))
+        cache.put("k", body, etag='"e1"')
+
+        stored, etag, last_modified, is_fresh = cache.get("k")
+        self.assertEqual(gzip.decompress(stored), body)  # stored compressed
+        self.assertLess(len(stored), len(body))
+        self.assertEqual(etag, '"e1"')
+        self.assertIsNone(last_modified)
+        self.assertTrue(is_fresh)
+        self.assertFalse(cache.get("k", max_age=0)[3])  # always revalidate
+
+        # gzip response body is stored as is
+        gz = gzip.compress(body)
+        cache.put("k", gz, last_modified="Wed, 21 Oct 2026 07:28:00 GMT")
+        stored, etag, last_modified, _ = cache.get("k")
+        self.assertEqual(stored, gz)
+        self.assertIsNone(etag)
+        self.assertEqual(cache.get_size(), len(gz))
+        cache.close()
+
+        # persistent
+        cache = TileResponseCache(self.fname)
+        self.assertEqual(cache.get("k")[0], gz)
+        self.assertEqual(cache.get_size(), len(gz))
+        cache.clear()
+        self.assertIsNone(cache.get("k"))
+        self.assertEqual(cache.get_size(), 0)
+        cache.close()
+
+    def test_refresh(self):
+        cache = TileResponseCache(self.fname, ttl=0.05)
+        cache.put("k", make_body(1), etag='"e1"')
+        time.sleep(0.1)
+        self.assertFalse(cache.get("k")[3])
+        cache.refresh("k")  # 304
+        self.assertTrue(cache.get("k")[3])
+        cache.close()
+
+    def test_evict_lru(self):
+        size = len(gzip.compress(make_body(100), compresslevel=1))
+        cache = TileResponseCache(self.fname, max_size=int(3.5 * size))
+        for i in range(3):
+            cache.put(str(i), make_body(100))
+        cache.get("0")  # 1 is least recently used
+        cache.put("3", make_body(100))
+        self.assertIsNone(cache.get("1"))
+        for k in ["0", "2", "3"]:
+            self.assertIsNotNone(cache.get(k))
+        self.assertLessEqual(cache.get_size(), cache.max_size)
+
+        cache.set_config(max_size=2 * size)
+        self.assertEqual(cache.get_size(), size)
+        self.assertIsNotNone(cache.get("3"))
+        cache.close()
+
+    def test_disabled(self):
+        cache = TileResponseCache(self.fname, max_size=0)
+        self.assertFalse(cache.is_enabled())
+        cache.put("k", make_body(1))
+        self.assertIsNone(cache.get("k"))
+        self.assertFalse(os.path.exists(self.fname))
+
+
+if __name__ == "__main__":
+    unittest.main()
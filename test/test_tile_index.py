@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+# Copyright (c) 2019 HERE Europe B.V.
+#
+# SPDX-License-Identifier: MIT
+#
+###############################################################################
+
+import os
+import sqlite3
+import tempfile
+
+from test.utils import BaseTestAsync
+
+from qgis.testing import unittest
+from XYZHubConnector.xyz_qgis.layer.tile_index import TileOwnershipIndex
+
+
+class TestTileOwnershipIndex(BaseTestAsync):
+    def setUp(self):
+        super().setUp()
+        fd, self.fname = tempfile.mkstemp(suffix=".gpkg")
+        os.close(fd)
+        self.tile_index = TileOwnershipIndex(self.fname, "Point_0")
+        self.tile_index.init()
+
+    def tearDown(self):
+        os.remove(self.fname)
+        super().tearDown()
+
+    def test_replace(self):
+        tile_index = self.tile_index
+        self.assertEqual(tile_index.replace("t1", ["a", "b", "c"]), [])
+        self.assertEqual(tile_index.replace("t2", ["c", "d"]), [])
+        self.assertEqual(tile_index.count_owner("c"), 2)
+
+        # shared feature is kept
+        self.assertEqual(sorted(tile_index.replace("t1", ["b", "e"])), ["a"])
+        self.assertEqual(sorted(tile_index.clear("t1")), ["b", "e"])
+        self.assertEqual(tile_index.count_owner("c"), 1)
+        self.assertEqual(sorted(tile_index.clear("t2")), ["c", "d"])
+        self.assertEqual(tile_index.clear("t2"), [])
+
+    def test_persist(self):
+        self.tile_index.replace("t1", ["a", "b"])
+        other_layer = TileOwnershipIndex(self.fname, "Point_1")
+        other_layer.replace("t1", ["a"])
+
+        tile_index = TileOwnershipIndex(self.fname, "Point_0")
+        tile_index.init()
+        self.assertEqual(tile_index.count_owner("a"), 1)
+        self.assertEqual(sorted(tile_index.clear("t1")), ["a", "b"])
+
+        other_layer.reset()
+        self.assertEqual(other_layer.count_owner("a"), 0)
+
+    def test_large_tile(self):
+        ids = [str(i) for i in range(3000)]
+        self.tile_index.replace("t1", ids)
+        self.tile_index.replace("t2", ids[:1500])
+        self.assertEqual(sorted(self.tile_index.clear("t1")), sorted(ids[1500:]))
+
+    def test_replace_in_transaction(self):
+        self.tile_index.replace("t1", ["a", "b"])
+        conn = sqlite3.connect(self.fname)
+        conn.execute("BEGIN IMMEDIATE")
+        self.assertEqual(self.tile_index.replace("t1", ["b"], conn=conn), ["a"])
+        conn.execute("ROLLBACK")  # not committed by replace
+        conn.close()
+        self.assertEqual(self.tile_index.count_owner("a"), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
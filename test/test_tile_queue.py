@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+# Copyright (c) 2019 HERE Europe B.V.
+#
+# SPDX-License-Identifier: MIT
+#
+###############################################################################
+
+from test.utils import BaseTestAsync
+
+from qgis.testing import unittest
+from XYZHubConnector.xyz_qgis.layer.queue import ViewportTileQueue
+
+
+def make_params(level, cols, rows):
+    return [dict(tile_id="%s_%s_%s" % (level, c, r)) for c in cols for r in rows]
+
+
+def take_all(q):
+    lst = list()
+    while q.has_next():
+        lst.append(q.get_params()["tile_id"])
+    return lst
+
+
+class TestViewportTileQueue(BaseTestAsync):
+    def test_order_by_distance(self):
+        q = ViewportTileQueue()
+        q.set_params(make_params(5, range(3), range(3)))
+        lst = take_all(q)
+        self.assertEqual(lst[0], "5_1_1")  # view centre first
+        self.assertEqual(set(lst[1:5]), {"5_0_1", "5_2_1", "5_1_0", "5_1_2"})
+        self.assertEqual(len(lst), 9)
+
+    def test_update_view(self):
+        q = ViewportTileQueue()
+        q.set_params(make_params(5, range(3), range(1)))
+        self.assertEqual(q.get_params()["tile_id"], "5_1_0")
+        self.assertEqual(q.get_params()["tile_id"], "5_0_0")  # same distance, given order
+        q.set_done("5_1_0")
+
+        # pan right: 5_0_0 left the view, loaded 5_1_0 is skipped
+        lst_cancel = q.update_view(make_params(5, range(1, 4), range(1)))
+        self.assertEqual(lst_cancel, ["5_0_0"])
+        self.assertEqual(take_all(q), ["5_2_0", "5_3_0"])
+
+        # small pan: tiles in flight keep loading
+        self.assertEqual(q.update_view(make_params(5, range(2, 4), range(1))), [])
+        self.assertEqual(q.count_queued(), 0)
+
+        # zoom: all tiles in flight are canceled
+        lst_cancel = q.update_view(make_params(6, range(2), range(2)))
+        self.assertEqual(set(lst_cancel), {"5_2_0", "5_3_0"})
+        self.assertEqual(q.count_inflight(), 0)
+        self.assertEqual(q.count_queued(), 4)
+
+    def test_reload_loaded(self):
+        q = ViewportTileQueue(reload_loaded=True)
+        q.set_params(make_params(5, range(2), range(1)))
+        a = q.get_params()["tile_id"]
+        q.get_params()
+        q.set_done(a)
+        q.update_view(make_params(5, range(2), range(1)))
+        self.assertEqual(take_all(q), [a])  # b still in flight
+
+    def test_retry(self):
+        q = ViewportTileQueue()
+        q.set_params(make_params(5, range(2), range(1)))
+        a = q.get_params()["tile_id"]
+        q.retry_params()
+        self.assertEqual(q.get_params()["tile_id"], a)
+        q.set_failed(a)
+        self.assertEqual(q.count_inflight(), 0)
+        q.forget()
+        q.update_view(make_params(5, range(2), range(1)))
+        self.assertEqual(q.count_queued(), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+# Copyright (c) 2019 HERE Europe B.V.
+#
+# SPDX-License-Identifier: MIT
+#
+###############################################################################
+
+import mock
+
+from test.utils import BaseTestAsync
+
+from qgis.testing import unittest
+from qgis.PyQt.QtCore import QTimer
+from XYZHubConnector.xyz_qgis.layer import vlayer_scheduler
+from XYZHubConnector.xyz_qgis.layer.vlayer_scheduler import VLayerUpdateScheduler
+
+
+class FakeVLayer(object):
+    def __init__(self, name):
+        self.name = name
+        self.calls = list()
+        self.provider = mock.Mock()
+
+    def id(self):
+        return self.name
+
+    def dataProvider(self):
+        return self.provider
+
+    def updateFields(self):
+        self.calls.append("fields")
+
+    def updateExtents(self):
+        self.calls.append("extent")
+
+    def triggerRepaint(self):
+        self.calls.append("repaint")
+
+
+class TestVLayerUpdateScheduler(BaseTestAsync):
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(vlayer_scheduler, "iface")
+        self.iface = patcher.start()
+        self.iface.mapCanvas.return_value.isCachingEnabled.return_value = True
+        self.addCleanup(patcher.stop)
+
+    def _wait_scheduler(self, scheduler):
+        timer = QTimer()
+        timer.timeout.connect(lambda: scheduler.count_pending() or self._stop_async())
+        timer.start(10)
+        self._wait_async()
+        timer.stop()
+
+    def test_coalesce(self):
+        scheduler = VLayerUpdateScheduler(interval=50, budget=0)
+        lst_vlayer = [FakeVLayer(str(i)) for i in range(3)]
+        for _ in range(10):
+            for v in lst_vlayer:
+                scheduler.mark(v, scheduler.EXTENT | scheduler.REPAINT)
+        scheduler.mark(lst_vlayer[0], scheduler.FIELDS | scheduler.RELOAD)
+        self.assertEqual(scheduler.count_pending(), 3)
+        self._wait_scheduler(scheduler)
+
+        self.assertEqual(lst_vlayer[0].calls, ["fields", "extent", "repaint"])
+        self.assertEqual(lst_vlayer[0].provider.reloadData.call_count, 1)
+        for v in lst_vlayer[1:]:
+            self.assertEqual(v.calls, ["extent", "repaint"])
+            self.assertEqual(v.provider.reloadData.call_count, 0)
+
+    def test_canvas_refresh(self):
+        self.iface.mapCanvas.return_value.isCachingEnabled.return_value = False
+        scheduler = VLayerUpdateScheduler()
+        lst_vlayer = [FakeVLayer(str(i)) for i in range(3)]
+        for v in lst_vlayer:
+            scheduler.mark(v, scheduler.REPAINT)
+        scheduler.run_pending()
+        self.assertEqual(scheduler.count_pending(), 0)
+        # single canvas refresh instead of repaint of each vlayer
+        self.assertEqual(self.iface.mapCanvas.return_value.refresh.call_count, 1)
+        self.assertEqual([v.calls for v in lst_vlayer], [[], [], []])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+# Copyright (c) 2019 HERE Europe B.V.
+#
+# SPDX-License-Identifier: MIT
+#
+###############################################################################
+
+import json
+import struct
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from test.utils import BaseTestAsync, TestFolder, flatten
+
+from qgis.core import QgsWkbTypes
+from qgis.testing import unittest
+from XYZHubConnector.xyz_qgis.layer import parser, wkb_utils
+
+
+GEOMS = [
+    {"type": "Point", "coordinates": [13.4, 52.5]},
+    {"type": "Point", "coordinates": [13.4, 52.5, 30]},
+    {"type": "LineString", "coordinates": [[0, 0], [1.123456789012345, 2.5]]},
+    {"type": "LineString", "coordinates": [[0, 0], [1, 1, 5]]},  # mixed dim, promote to Z
+    {
+        "type": "Polygon",
+        "coordinates": [
+            [[0, 0], [10, 0], [10, 10], [0, 10], [0, 0]],
+            [[1, 1], [2, 1], [2, 2], [1, 1]],
+        ],
+    },
+    {"type": "MultiPoint", "coordinates": [[1, 2], [3, 4]]},
+    {"type": "MultiLineString", "coordinates": [[[1, 2], [3, 4]], [[5, 6], [7, 8]]]},
+    {
+        "type": "MultiPolygon",
+        "coordinates": [
+            [[[0, 0], [1, 0], [1, 1], [0, 0]]],
+            [[[5, 5, 1], [6, 5, 1], [6, 6, 1], [5, 5, 1]]],
+        ],
+    },
+    {"type": "LineString", "coordinates": [[0.1 * i, -0.2 * i] for i in range(500)]},
+]
+
+UNSUPPORTED_GEOMS = [
+    {"type": "GeometryCollection", "geometries": [{"type": "Point", "coordinates": [1, 2]}]},
+    {"type": "Point", "coordinates": []},
+    {"type": "Point", "coordinates": [1, None]},
+    {"type": "LineString", "coordinates": []},
+    {"type": "Polygon", "coordinates": [[]]},
+    {"type": "Point", "coordinates": [[1, 2]]},
+]
+
+
+class TestWkbUtils(BaseTestAsync):
+    def _assert_same_geometry(self, geom):
+        """assert fast path (wkb) and slow path (ogr) results in the same geometry"""
+        g1 = parser.make_geometry(geom)
+        g2 = parser.make_geometry_ogr(geom)
+        self.assertEqual(
+            QgsWkbTypes.displayString(g1.wkbType()), QgsWkbTypes.displayString(g2.wkbType())
+        )
+        c1 = flatten(json.loads(g1.asJson())["coordinates"])
+        c2 = flatten(json.loads(g2.asJson())["coordinates"])
+        self.assertEqual(len(c1), len(c2))
+        # ogr path is limited to 13 or 14 precision
+        err = max((abs(a - b) for a, b in zip(c1, c2)), default=0)
+        self.assertLess(err, 1e-13, "parsed geometry error > 1e-13")
+
+    def test_parity_simple(self):
+        for geom in GEOMS:
+            with self.subTest(geom=geom["type"]):
+                self.assertIsNotNone(wkb_utils.geojson_to_wkb(geom))
+                self._assert_same_geometry(geom)
+
+    def test_unsupported_fallback(self):
+        for geom in UNSUPPORTED_GEOMS:
+            with self.subTest(geom=geom):
+                self.assertIsNone(wkb_utils.geojson_to_wkb(geom))
+        geom = UNSUPPORTED_GEOMS[0]
+        self.assertEqual(
+            parser.make_geometry(geom).asWkt(), parser.make_geometry_ogr(geom).asWkt()
+        )
+
+    def test_batch(self):
+        points = [
+            {"type": "Point", "coordinates": [0.01 * i, -0.01 * i]}
+            for i in range(2 * wkb_utils.NUMPY_MIN_POINTS)
+        ]
+        lst_geom = GEOMS + points + UNSUPPORTED_GEOMS + [None]
+        self.assertEqual(
+            wkb_utils.geojson_to_wkb_batch(lst_geom),
+            [wkb_utils.geojson_to_wkb(g) for g in lst_geom],
+        )
+
+    @unittest.skipIf(np is None, "numpy is not available")
+    def test_numpy_path(self):
+        points = [[0.1 * i, -0.2 * i] for i in range(wkb_utils.NUMPY_MIN_POINTS)]
+        points_z = [p + [i] for i, p in enumerate(points)]
+        for lst, dim in [(points, 2), (points_z, 3), (points, 3)]:
+            with self.subTest(dim=dim, n=len(lst[0])):
+                flat = list()
+                for p in lst:
+                    flat.extend(p + [0.0] * (dim - len(p)))
+                self.assertEqual(
+                    wkb_utils._pack_points_numpy(lst, dim),
+                    struct.pack("<%dd" % len(flat), *flat),
+                )
+        self.assertIsNone(wkb_utils._pack_points_numpy([[1, None]] * 2, 2))
+
+    def test_parity_xyzjson(self):
+        folder = "xyzjson-small"
+        fnames = ["airport-xyz.geojson", "water-xyz.geojson", "mixed-xyz.geojson"]
+        for fname in fnames:
+            with self.subTest(folder=folder, fname=fname):
+                resource = TestFolder(folder)
+                obj = json.loads(resource.load(fname))
+                for ft in obj["features"]:
+                    if ft.get("geometry") is None:
+                        continue
+                    self._assert_same_geometry(ft["geometry"])
+
+
+if __name__ == "__main__":
+    unittest.main()
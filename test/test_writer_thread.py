@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+###############################################################################
+#
+# Copyright (c) 2019 HERE Europe B.V.
+#
+# SPDX-License-Identifier: MIT
+#
+###############################################################################
+
+import threading
+import time
+
+from test.utils import BaseTestAsync
+
+from qgis.testing import unittest
+from XYZHubConnector.xyz_qgis.layer.writer_thread import GpkgWriterThread
+
+
+class TestGpkgWriterThread(BaseTestAsync):
+    def test_serialized(self):
+        writer_thread = GpkgWriterThread("test.gpkg")
+        main_thread = threading.current_thread()
+        lst_job, lst_committed, lst_thread = list(), list(), list()
+
+        def job(i):
+            lst_thread.append(threading.current_thread())
+            time.sleep(0.01 * (i % 3))
+            lst_job.append(i)
+            return i
+
+        def on_committed(i):
+            self.assertIs(threading.current_thread(), main_thread)
+            lst_committed.append(i)
+
+        for i in range(10):
+            writer_thread.submit(job, i, on_committed=on_committed)
+        self.assertTrue(writer_thread.wait())
+
+        self.assertEqual(lst_job, list(range(10)))
+        self.assertEqual(lst_committed, list(range(10)))
+        self.assertEqual(len(set(lst_thread)), 1)
+        self.assertIsNot(lst_thread[0], main_thread)
+        self.assertEqual(writer_thread.count_pending(), 0)
+
+    def test_error(self):
+        writer_thread = GpkgWriterThread("test.gpkg")
+        lst_error, lst_committed = list(), list()
+        writer_thread.signal.error.connect(lst_error.append)
+
+        def job():
+            raise ValueError("fail")
+
+        writer_thread.submit(job, on_committed=lst_committed.append)
+        writer_thread.submit(lambda: 1, on_committed=lst_committed.append)
+        writer_thread.wait()
+
+        self.assertEqual(len(lst_error), 1)
+        self.assertIsInstance(lst_error[0], ValueError)
+        # next jobs still run
+        self.assertEqual(lst_committed, [1])
+
+    def test_barrier(self):
+        writer_thread = GpkgWriterThread("test.gpkg")
+        lst_job, lst_barrier = list(), list()
+
+        def job(i):
+            time.sleep(0.01)
+            lst_job.append(i)
+
+        writer_thread.submit(job, 1)
+        writer_thread.submit(job, 2)
+        # jobs submitted before the barrier are done
+        writer_thread.barrier(lambda: lst_barrier.append(list(lst_job)))
+        writer_thread.wait()
+        self.assertEqual(lst_barrier, [[1, 2]])
+        self.assertEqual(writer_thread.count_pending(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()